@@ -0,0 +1,263 @@
+"""
+Benchmarks of the influence matrix assembly, the solve, the coefficients,
+the polar sweeps, the dense and iterative solvers and the flow field
+evaluation, by direct sums and by the treecode, across geometries, panel
+counts and grid resolutions. Runs without a display, from the repository
+root:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --quick --output results.json
+    python -m benchmarks.run --compare baseline.json results.json
+
+Every entry records the best and median time of its repeats and the peak
+memory traced during one more run. The compare mode flags the entries
+that are slower or use more memory than the baseline by more than the
+threshold, and exits with status 1 when any regressed. Both modes also
+fail when the panel set is not faster than the per panel loop and the
+broadcast linear vortex in the same run.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import src
+from webapp.callbacks import ANGLE_RANGE, NUM_ANGLES
+from webapp.utils import compute_flow
+
+EXAMPLES = Path(__file__).resolve().parent.parent / 'examples'
+
+# NACA 4 digits geometries, as (m, p, t)
+NACA_GEOMETRIES = {'naca0012': (0, .4, .12), 'naca2412': (.02, .4, .12), 'naca4415': (.04, .4, .15)}
+
+GEOMETRIES = sorted(path.stem for path in EXAMPLES.glob('*.dat')) + list(NACA_GEOMETRIES)
+PANEL_COUNTS = (64, 256, 1024, 4096)
+RESOLUTIONS = (100, 200, 400)
+
+# Reduced sizes for a run of a few seconds
+QUICK_GEOMETRIES = ('2412', 'naca0012')
+QUICK_PANEL_COUNTS = (64, 256)
+QUICK_RESOLUTIONS = (50, 100)
+
+# Angle of attack of the single solves and flow fields, in degrees
+ANGLE = 5
+
+# Relative accuracy of the treecode flow fields, timed next to the direct
+# sums of the same fields
+TREECODE_TOLERANCE = 1e-6
+
+# Ways of evaluating the panel flow of an airfoil, the panel set must
+# beat the others at every resolution
+PANEL_STRATEGIES = ('per_panel', 'broadcast', 'panel_set')
+
+# Angles of the multiple right-hand side solves, in degrees, built and
+# solved by the dense and by the iterative solver
+SOLVE_ANGLES = np.arange(-4, 10, 2)
+ITERATIVE_TOLERANCE = 1e-8
+
+# Relative increase of time or memory flagged as a regression, time
+# differences below MIN_TIME_DIFFERENCE seconds are timer noise
+DEFAULT_THRESHOLD = .2
+MIN_TIME_DIFFERENCE = 1e-3
+
+def _load_geometry(name, nb_panels):
+    airfoil = src.geometry(nb_vertex=nb_panels + 1)
+    if name in NACA_GEOMETRIES:
+        airfoil.load_naca(*NACA_GEOMETRIES[name])
+    else:
+        airfoil.load_txt(EXAMPLES / f'{name}.dat')
+    return airfoil
+
+def _panel_flows(strategy, vertex, gammas):
+    # Closed contour of linear vortex panels, as one linear_vortex per
+    # panel, one broadcast linear_vortex or one panel_set
+    p1, p2 = vertex, np.roll(vertex, -1, axis=0)
+    gamma_a, gamma_b = gammas, np.roll(gammas, -1)
+    if strategy == 'per_panel':
+        return [src.flows.linear_vortex(*panel) for panel in zip(gamma_a, gamma_b, p1, p2)]
+    if strategy == 'broadcast':
+        return [src.flows.linear_vortex(gamma_a, gamma_b, p1, p2)]
+    return [src.flows.panel_set(p1, p2, gamma_a, gamma_b)]
+
+def _cases(geometries, panel_counts, resolutions, max_flow_panels):
+    # (parameters, function to time) of every benchmark, the setup of a
+    # case is never timed
+    alphas = np.deg2rad(np.linspace(*ANGLE_RANGE, NUM_ANGLES))
+    solve_alphas = np.deg2rad(SOLVE_ANGLES)
+    for name in geometries:
+        for nb_panels in panel_counts:
+            airfoil = _load_geometry(name, nb_panels)
+            solver = src.linear_vortex_solver(airfoil)
+            airfoil.set_angle_deg(-ANGLE)
+            alpha = -airfoil.angle
+            gammas = solver.solve(alpha)
+            case = {'geometry': name, 'panels': nb_panels}
+
+            def solve():
+                # Setting the matrix drops the LU factors
+                solver.RHS = solver.RHS
+                solver.solve(alpha)
+
+            yield dict(case, benchmark='assembly'), solver._create_RHS_matrix
+            yield dict(case, benchmark='solve'), solve
+            yield dict(case, benchmark='solve_factorized'), lambda: solver.solve(alpha)
+            yield dict(case, benchmark='coefficients'), lambda: src.compute_coefficients(airfoil, gammas)
+            yield (dict(case, benchmark='polar'),
+                   lambda: src.aerodynamic_polar(solver).coefficients(alphas))
+            yield (dict(case, benchmark='solve_many_dense'),
+                   lambda: src.linear_vortex_solver(airfoil).solve_many(solve_alphas))
+            yield (dict(case, benchmark='solve_many_iterative'),
+                   lambda: src.iterative_solver(airfoil, tolerance=ITERATIVE_TOLERANCE)
+                   .solve_many(solve_alphas))
+
+            if nb_panels > max_flow_panels:
+                continue
+            vertex = airfoil.get_rotated_vertex()
+            strategies = {strategy: _panel_flows(strategy, vertex, gammas)
+                          for strategy in PANEL_STRATEGIES}
+            for resolution in resolutions:
+                x_grid, y_grid = np.meshgrid(np.linspace(-.5, 1.5, resolution),
+                                             np.linspace(-1, 1, resolution))
+                for strategy, flows in strategies.items():
+                    yield (dict(case, benchmark=f'panels_{strategy}', resolution=resolution),
+                           lambda flows=flows, x_grid=x_grid, y_grid=y_grid:
+                           src.compute_fields(flows, x_grid, y_grid))
+                for mode in ('streamlines', 'velocities'):
+                    yield (dict(case, benchmark=f'flow_{mode}', resolution=resolution),
+                           lambda mode=mode, resolution=resolution:
+                           compute_flow(mode, gammas, vertex, resolution))
+                    yield (dict(case, benchmark=f'flow_{mode}_treecode', resolution=resolution),
+                           lambda mode=mode, resolution=resolution:
+                           compute_flow(mode, gammas, vertex, resolution,
+                                        tolerance=TREECODE_TOLERANCE))
+
+def _measure(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    # numpy reports its allocations to tracemalloc
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time': min(times), 'median_time': float(np.median(times)), 'peak_memory': peak}
+
+def _metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=EXAMPLES.parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'date': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'kernel_backend': src.flows.get_kernel_backend()}
+
+def run(geometries=GEOMETRIES, panel_counts=PANEL_COUNTS, resolutions=RESOLUTIONS,
+        repeat=3, max_flow_panels=1024):
+    """Run every benchmark, returns the metadata and the list of entries."""
+    results = []
+    for parameters, function in _cases(geometries, panel_counts, resolutions, max_flow_panels):
+        entry = dict(parameters, **_measure(function, repeat))
+        results.append(entry)
+        print(f"{_key(entry):<48} {entry['time'] * 1e3:10.2f} ms "
+              f"{entry['peak_memory'] / 2**20:10.2f} MB", flush=True)
+    return {'metadata': _metadata(), 'results': results}
+
+def _key(entry):
+    key = f"{entry['benchmark']} {entry['geometry']} {entry['panels']}"
+    if 'resolution' in entry:
+        key += f" {entry['resolution']}"
+    return key
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, min_time=MIN_TIME_DIFFERENCE):
+    """
+    Entries of current whose time or peak memory exceed the baseline by
+    more than threshold (and time by more than min_time seconds), as
+    (key, quantity, baseline, current) tuples.
+    """
+    reference = {_key(entry): entry for entry in baseline['results']}
+    regressions = []
+    for entry in current['results']:
+        key = _key(entry)
+        if key not in reference:
+            continue
+        for quantity in ('time', 'peak_memory'):
+            before, after = reference[key][quantity], entry[quantity]
+            if quantity == 'time' and after - before <= min_time:
+                continue
+            if after > before * (1 + threshold):
+                regressions.append((key, quantity, before, after))
+    return regressions
+
+def check_claims(current, min_time=MIN_TIME_DIFFERENCE):
+    """
+    Entries of current that are slower than the alternative they claim to
+    beat in the same run by more than min_time seconds, as (key, quantity,
+    alternative time, time) tuples: the panel set against the other
+    PANEL_STRATEGIES.
+    """
+    entries = {_key(entry): entry for entry in current['results']}
+    failures = []
+    for key, entry in entries.items():
+        if entry['benchmark'] != 'panels_panel_set':
+            continue
+        for strategy in PANEL_STRATEGIES[:-1]:
+            other = entries.get(key.replace('panels_panel_set', f'panels_{strategy}', 1))
+            if other is not None and entry['time'] - other['time'] > min_time:
+                failures.append((key, f'time vs {strategy}', other['time'], entry['time']))
+    return failures
+
+def _parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description='Run or compare the benchmarks of the solver.')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--quick', action='store_true', help='small sizes, for a smoke test')
+    parser.add_argument('--geometries', nargs='+')
+    parser.add_argument('--panels', nargs='+', type=int)
+    parser.add_argument('--resolutions', nargs='+', type=int)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-flow-panels', type=int, default=1024,
+                        help='largest panel count of the flow field benchmarks')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative increase flagged as a regression')
+    return parser.parse_args(arguments)
+
+def main(arguments=None):
+    arguments = _parse_arguments(arguments)
+    if arguments.compare:
+        baseline, current = (json.loads(Path(path).read_text()) for path in arguments.compare)
+        regressions = compare(baseline, current, arguments.threshold) + check_claims(current)
+        print(f"Baseline {baseline['metadata']['commit']}, current {current['metadata']['commit']}")
+        for key, quantity, before, after in regressions:
+            print(f'REGRESSION {key} {quantity}: {before:.4g} -> {after:.4g} ({after / before - 1:+.0%})')
+        if not regressions:
+            print('No regression')
+        return 1 if regressions else 0
+
+    quick = arguments.quick
+    results = run(geometries=arguments.geometries or (QUICK_GEOMETRIES if quick else GEOMETRIES),
+                  panel_counts=arguments.panels or (QUICK_PANEL_COUNTS if quick else PANEL_COUNTS),
+                  resolutions=arguments.resolutions or (QUICK_RESOLUTIONS if quick else RESOLUTIONS),
+                  repeat=arguments.repeat, max_flow_panels=arguments.max_flow_panels)
+    Path(arguments.output).write_text(json.dumps(results, indent=2))
+    print(f'Results written to {arguments.output}')
+    failures = check_claims(results)
+    for key, quantity, before, after in failures:
+        print(f'SLOWER {key} {quantity}: {before:.4g} -> {after:.4g}')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
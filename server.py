@@ -1,11 +1,14 @@
 import dash
 import numpy as np
 import plotly.graph_objs as go
-from src import geometry, linear_vortex_solver, compute_coefficients
+from src import geometry, linear_vortex_solver, aerodynamic_polar
 import webapp
 
 app = dash.Dash(__name__)
 
+# Memory allowed for the server-side geometry and solver cache
+SOLVER_CACHE_MEMORY = 512 * 2**20
+
 # Initialize default geometry and solver
 default_geometry = geometry(nb_vertex=256)
 default_geometry.load_txt('examples/0012.dat')
@@ -13,15 +16,10 @@ default_solver = linear_vortex_solver(default_geometry)
 
 # Precompute aerodynamic coefficients
 precomputed_angles = np.linspace(-15, 15, 61)
-cl_values, cd_values, cm_values = [], [], []
-
-for alpha_deg in precomputed_angles:
-    default_geometry.set_angle_deg(-alpha_deg)
-    gammas = default_solver.solve(-default_geometry.angle)
-    Cl, Cd, Cm = compute_coefficients(default_geometry, gammas)
-    cl_values.append(Cl)
-    cd_values.append(Cd)
-    cm_values.append(Cm)
+default_polar = aerodynamic_polar(default_solver)
+cl_values, cd_values, cm_values = default_polar.coefficients(
+    np.deg2rad(precomputed_angles)
+)
 
 # Create coefficient figures
 def create_coefficient_figure(x_data, y_data, title, y_label):
@@ -45,9 +43,16 @@ cm_figure = create_coefficient_figure(
     precomputed_angles, cm_values, 'Moment Coefficient vs Angle of Attack', 'Cm'
 )
 
+# Shared by the callbacks and the batch API
+solver_cache = webapp.solver_cache(max_memory=SOLVER_CACHE_MEMORY)
+# Background computations of the callbacks
+jobs = webapp.job_queue()
+
 webapp.app_layout(app, cl_figure, cd_figure, cm_figure)
-webapp.register_callbacks(app, default_geometry, default_solver)
+webapp.register_callbacks(app, default_geometry, default_solver, solver_cache, jobs)
 server = app.server
+webapp.register_profiling_route(server, solver_cache, jobs)
+webapp.register_batch_api(server, solver_cache)
 
 if __name__ == '__main__':
     app.run_server(debug=False)
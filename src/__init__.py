@@ -1,4 +1,5 @@
 from .core import *
 from .geometry import geometry
 from .utils import *
-from . import flows
\ No newline at end of file
+from . import flows
+from . import profiling
\ No newline at end of file
@@ -1,3 +1,9 @@
-from .compute_visuals import compute_streamlines, compute_velocities
+from .compute_visuals import compute_streamlines, compute_velocities, compute_fields, estimate_precision_error
 from .compute_coefficients import compute_coefficients
-from .linear_vortex_solver import linear_vortex_solver
\ No newline at end of file
+from .linear_vortex_solver import linear_vortex_solver
+from .iterative_solver import iterative_solver
+from .hmatrix_solver import hmatrix_solver
+from .aerodynamic_polar import aerodynamic_polar
+from .treecode import treecode
+from .adaptive_sampling import compute_adaptive_fields
+from .contours import extract_contours, trace_streamlines, simplify_polyline
\ No newline at end of file
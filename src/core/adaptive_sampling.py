@@ -0,0 +1,135 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from .compute_visuals import compute_fields
+from ..profiling import timed
+
+# Bilinear weights of the corners of a cell at its corners, edge
+# midpoints and center
+_HALVES = np.array(((1, 0), (.5, .5), (0, 1)))
+
+def _bilinear_weights(size):
+    # Weights of both ends at the size + 1 points of a cell side
+    t = np.arange(size + 1) / size
+    return np.column_stack((1 - t, t))
+
+class _raster:
+    # Field values on the sampling raster, evaluated or interpolated
+    def __init__(self, flows, x_points, y_points, quantities, mask, options):
+        self.flows = flows
+        self.mask = mask
+        self.x_points, self.y_points = x_points, y_points
+        self.quantities = quantities
+        self.options = options
+        shape = (len(y_points), len(x_points))
+        self.values = {name: np.zeros(shape) for name in quantities}
+        self.evaluated = np.zeros(shape, dtype=bool)
+        self.nb_evaluations = 0
+
+    def sample(self, rows, columns):
+        # Evaluate the points that were not evaluated yet, in a single call
+        index = np.unique(np.ravel_multi_index((rows.ravel(), columns.ravel()),
+                                               self.evaluated.shape))
+        index = index[~self.evaluated.flat[index]]
+        if len(index) == 0:
+            return
+        rows, columns = np.unravel_index(index, self.evaluated.shape)
+        mask = self.mask.flat[index] if self.mask is not None else None
+        fields = compute_fields(self.flows, self.x_points[columns], self.y_points[rows],
+                                self.quantities, mask=mask, **self.options)
+        for name in self.quantities:
+            self.values[name].flat[index] = np.ma.filled(fields[name], np.nan)
+        self.evaluated.flat[index] = True
+        self.nb_evaluations += len(index)
+
+    def fill(self, rows, columns, size):
+        # Bilinear interpolation inside cells whose corners are evaluated,
+        # the evaluated points are kept
+        weights = _bilinear_weights(size)
+        offsets = np.arange(size + 1)
+        block_rows = rows[:, np.newaxis, np.newaxis] + offsets[:, np.newaxis]
+        block_columns = columns[:, np.newaxis, np.newaxis] + offsets
+        keep = self.evaluated[block_rows, block_columns]
+        for name in self.quantities:
+            corners = self.values[name][block_rows[:, ::size, ::size], block_columns[:, ::size, ::size]]
+            block = np.einsum('ia,nab,jb->nij', weights, corners, weights)
+            current = self.values[name][block_rows, block_columns]
+            self.values[name][block_rows, block_columns] = np.where(keep, current, block)
+
+@timed('compute_adaptive_fields')
+def compute_adaptive_fields(flows, x_points, y_points, quantities=('psi',), threshold=1e-3,
+                            coarse_level=4, body=None, mask=None, **options):
+    """
+    Fields of compute_fields on the raster x_points * y_points (evenly
+    spaced), sampled by a quadtree instead of everywhere.
+
+    The raster is covered by cells of 2^coarse_level pixels whose corners
+    are evaluated. A cell is split in four while the field at its edge
+    midpoints and center differs by more than threshold from the bilinear
+    interpolation of its corners, or while it is closer to one of the body
+    points than its diagonal. The remaining pixels are interpolated from
+    the finest evaluated corners. options are passed to compute_fields.
+
+    Points where the (len(y_points), len(x_points)) mask is True are not
+    evaluated, cells that are only partly masked are refined to the pixel.
+    Returns the dict of grids, masked arrays when a mask is given, and the
+    number of evaluated points.
+    """
+    x_points, y_points = np.asarray(x_points, dtype=float), np.asarray(y_points, dtype=float)
+    nx, ny = len(x_points), len(y_points)
+    dx, dy = x_points[1] - x_points[0], y_points[1] - y_points[0]
+
+    # The sampling raster extends the output one so that it is tiled by
+    # coarse cells
+    size = 2**coarse_level
+    mx = -(-(nx - 1) // size) * size + 1
+    my = -(-(ny - 1) // size) * size + 1
+    if mask is not None:
+        mask = np.pad(np.asarray(mask, dtype=bool), ((0, my - ny), (0, mx - nx)), mode='edge')
+    raster = _raster(flows, x_points[0] + dx * np.arange(mx), y_points[0] + dy * np.arange(my),
+                     tuple(quantities), mask, options)
+
+    # Cells by their lower left pixel
+    rows, columns = np.meshgrid(np.arange(0, my - 1, size), np.arange(0, mx - 1, size),
+                                indexing='ij')
+    rows, columns = rows.ravel(), columns.ravel()
+    tree = cKDTree(np.asarray(body, dtype=float)) if body is not None else None
+
+    while size > 1 and len(rows):
+        half = size // 2
+        offsets = np.array((0, half, size))
+        cell_rows = rows[:, np.newaxis, np.newaxis] + offsets[:, np.newaxis]
+        cell_columns = columns[:, np.newaxis, np.newaxis] + offsets
+        cell_rows, cell_columns = np.broadcast_arrays(cell_rows, cell_columns)
+        raster.sample(cell_rows, cell_columns)
+
+        # Error of the bilinear interpolation at the new points
+        refine = np.zeros(len(rows), dtype=bool)
+        for name in raster.quantities:
+            values = raster.values[name][cell_rows, cell_columns]
+            interpolated = np.einsum('ia,nab,jb->nij', _HALVES, values[:, ::2, ::2], _HALVES)
+            error = np.max(np.abs(values - interpolated), axis=(1, 2))
+            # Masked points are NaN, only fully masked cells are accepted
+            masked = np.all(np.isnan(values), axis=(1, 2))
+            refine |= ~(error <= threshold) & ~masked
+
+        # Cells close to the body, where the field is the least regular
+        if tree is not None:
+            centers = np.column_stack((raster.x_points[columns + half], raster.y_points[rows + half]))
+            distance, _ = tree.query(centers)
+            refine |= distance < size * np.hypot(dx, dy)
+
+        # Accepted cells are interpolated from their four quarters
+        leaf_rows = (rows[~refine, np.newaxis] + (0, 0, half, half)).ravel()
+        leaf_columns = (columns[~refine, np.newaxis] + (0, half, 0, half)).ravel()
+        if half > 1 and len(leaf_rows):
+            raster.fill(leaf_rows, leaf_columns, half)
+
+        rows = (rows[refine, np.newaxis] + (0, 0, half, half)).ravel()
+        columns = (columns[refine, np.newaxis] + (0, half, 0, half)).ravel()
+        size = half
+
+    fields = {name: values[:ny, :nx] for name, values in raster.values.items()}
+    if mask is not None:
+        fields = {name: np.ma.masked_array(field, mask=mask[:ny, :nx])
+                  for name, field in fields.items()}
+    return fields, raster.nb_evaluations
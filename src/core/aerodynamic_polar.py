@@ -0,0 +1,81 @@
+import numpy as np
+from ..profiling import timed
+
+class aerodynamic_polar:
+    """
+    Angle of attack sweeps by superposition of two basis solutions.
+
+    The freestream right hand side is cos(alpha) * nx + sin(alpha) * ny, so
+    every solution of the linear system is cos(alpha) * gamma_c +
+    sin(alpha) * gamma_s. Both basis cases are solved once per geometry,
+    after which gammas, Cp and the force coefficients of any array of
+    angles are plain vectorized arithmetic. Angles are in radians, with the
+    same sign convention as linear_vortex_solver.solve.
+    """
+    @timed('polar_basis')
+    def __init__(self, solver):
+        self.geometry = solver.geometry
+        self.gamma_c, self.gamma_s = solver.solve_basis()
+        self._create_moments()
+
+    def _create_moments(self):
+        # Body frame panel data, rotated analytically for each angle
+        ds = self.geometry.ds
+        n_x, n_y = self.geometry.normal[:, 0], self.geometry.normal[:, 1]
+
+        # Panel midpoints relative to the rotation center (.5, 0)
+        d_x = self.geometry.center[:, 0] - .5
+        d_y = self.geometry.center[:, 1]
+
+        weights = np.column_stack((
+            ds * n_x,
+            ds * n_y,
+            ds * (d_x * n_x - d_y * n_y),
+            ds * (d_x * n_y + d_y * n_x)
+        ))
+
+        # Cp averaged over each panel is 1 - (c^2 A + 2cs B + s^2 C)
+        def panel_average(values):
+            return (values + np.roll(values, -1)) / 2
+
+        terms = np.vstack((
+            np.ones_like(ds),
+            panel_average(self.gamma_c**2),
+            panel_average(self.gamma_c * self.gamma_s),
+            panel_average(self.gamma_s**2)
+        ))
+
+        # moments[k, l] = sum over panels of terms[k] * weights[:, l]
+        self.moments = terms @ weights
+
+    def gammas(self, alphas, u_inf = 1):
+        """Vortex strengths, shape (len(alphas), N)."""
+        alphas = np.atleast_1d(np.asarray(alphas, dtype=float))
+        return u_inf * (np.cos(alphas)[:, np.newaxis] * self.gamma_c
+                        + np.sin(alphas)[:, np.newaxis] * self.gamma_s)
+
+    def cp(self, alphas):
+        """Pressure coefficient at the vertices, shape (len(alphas), N)."""
+        return 1 - self.gammas(alphas)**2
+
+    @timed('polar_coefficients')
+    def coefficients(self, alphas):
+        """
+        Lift, drag and quarter chord moment coefficients for every angle.
+        Matches compute_coefficients with the geometry set to -alpha.
+        """
+        alphas = np.atleast_1d(np.asarray(alphas, dtype=float))
+        c, s = np.cos(alphas), np.sin(alphas)
+
+        # Panel sums of Cp * ds * (nx, ny, P1, P2) in the body frame
+        factors = np.column_stack((np.ones_like(c), -c**2, -2 * c * s, -s**2))
+        f_x, f_y, f_1, f_2 = (factors @ self.moments).T
+
+        # The geometry is rotated by -alpha around (.5, 0)
+        cos_t, sin_t = c, -s
+        cd = cos_t * f_x - sin_t * f_y
+        cl = -(sin_t * f_x + cos_t * f_y)
+        cm = -(2 * sin_t * cos_t * f_1 + (cos_t**2 - sin_t**2) * f_2
+               + (sin_t * f_x + cos_t * f_y) / 4)
+
+        return cl, cd, cm
@@ -1,50 +1,53 @@
 import numpy as np
-import copy
+from ..profiling import timed
 
 def compute_lift(geometry, gammas):
     integrand = (gammas + np.roll(gammas, -1)) * geometry.ds / 2
     return 2 * np.sum(integrand)
 
-def compute_coefficients(geometry, gammas):
-        # Pressure coefficient distribution.
-    cp = 1 - gammas**2
-
-    # Initialize force and moment coefficients.
-    cd = 0  # drag (x-direction)
-    cl = 0  # lift (y-direction)
-    cm = 0  # moment
-
-    ds = geometry.ds
-
-    # Get the rotated vertices (points in physical space).
-    vertex = geometry.get_rotated_vertex()
-
-    # Create a copy to compute normals based on rotated vertices.
-    temp_geom = copy.deepcopy(geometry)
-    temp_geom.vertex = vertex
-    temp_geom._compute_parameters()
-    normals = temp_geom.normal
-
-    nx, ny = normals[:, 0], -normals[:, 1]
-
-    n_panels = len(cp)
-    for i, cp_val in enumerate(cp):
-        cp_next = cp[(i + 1) % n_panels]
-        cp_avg = (cp_val + cp_next) / 2
-
-        # Accumulate drag and lift from each panel.
-        cd += cp_avg * ds[i] * nx[i]
-        cl += cp_avg * ds[i] * ny[i]
-
-        # Compute the midpoint of the panel (assuming a closed geometry).
-        mid = (vertex[i] + vertex[(i + 1) % n_panels]) / 2
-
-        # Moment: r x F, where r is the midpoint.
-        # F = cp_avg * ds[i] * (nx[i], ny[i])
-        # So, moment contribution = cp_avg * ds[i] * (mid_x * ny[i] - mid_y * nx[i])
-        # Calculate the moment contribution about the quarter chord.
-        # Shift the x-coordinate by subtracting the quarter chord location.
-        quarter_chord_x = 1 / 4.0
-        cm += cp_avg * ds[i] * ((mid[0] - quarter_chord_x) * ny[i] - mid[1] * nx[i])
-
+@timed('compute_coefficients')
+def compute_coefficients(geometry, gammas, angle=None):
+    """
+    Lift, drag and quarter chord moment coefficients.
+
+    gammas is either one solution of shape (N,) or a stack of solutions
+    of shape (angles, N), in which case angle holds one geometry angle per
+    row and arrays of coefficients are returned. angle defaults to
+    geometry.angle.
+    """
+    gammas = np.asarray(gammas)
+    if angle is None:
+        angle = geometry.angle
+    single = gammas.ndim == 1 and np.ndim(angle) == 0
+
+    # Pressure coefficient distribution, one row per angle.
+    cp = 1 - np.atleast_2d(gammas)**2
+    cp_avg = (cp + np.roll(cp, -1, axis=-1)) / 2
+
+    # Rotate the body normals and panel midpoints around (.5, 0) instead
+    # of rebuilding the geometry from the rotated vertices.
+    angle = np.asarray(angle, dtype=float)[..., np.newaxis]
+    cos_a, sin_a = np.cos(angle), np.sin(angle)
+
+    normals = geometry.normal
+    nx = cos_a * normals[:, 0] - sin_a * normals[:, 1]
+    ny = -(sin_a * normals[:, 0] + cos_a * normals[:, 1])
+
+    offset = geometry.center - np.array((.5, 0))
+    mid_x = cos_a * offset[:, 0] - sin_a * offset[:, 1] + .5
+    mid_y = sin_a * offset[:, 0] + cos_a * offset[:, 1]
+
+    # Force on each panel
+    force = cp_avg * geometry.ds
+
+    # Drag and lift from each panel.
+    cd = np.sum(force * nx, axis=-1)
+    cl = np.sum(force * ny, axis=-1)
+
+    # Moment: r x F about the quarter chord, r being the panel midpoint.
+    quarter_chord_x = 1 / 4.0
+    cm = np.sum(force * ((mid_x - quarter_chord_x) * ny - mid_y * nx), axis=-1)
+
+    if single:
+        return cl[0], cd[0], cm[0]
     return cl, cd, cm
@@ -1,18 +1,276 @@
+import warnings
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from .treecode import treecode
+from ..flows import linear_vortex, constant_source, vortex, panel_set
+from ..profiling import timed
 
-def compute_streamlines(flows, x_grid, y_grid):
-    # Iterate over the grid and compute the influence of each source
-    result_grid = np.array(sum([flow.streamline(x_grid, y_grid) for flow in flows]))
-            
-    return result_grid
+# Bytes allowed for the (points, panels) temporaries of a single tile,
+# shared between the workers of a parallel evaluation
+DEFAULT_MEMORY_BUDGET = 64 * 2**20
 
-def compute_velocities(flows, x_grid, y_grid):
-    u_grid, v_grid = flows[0].velocity(x_grid, y_grid)
+# Number of (points, panels) arrays a flow kernel keeps alive at once
+_KERNEL_TEMPORARIES = 12
 
-    # Iterate over the grid and compute the influence of each source
-    for flow in flows[1:]:
-        u, v = np.sum(flow.velocity(x_grid, y_grid), axis=-1)
-        u_grid += u
-        v_grid += v
+# The largest error on a sample of the points understates the largest
+# error on the whole grid, measured up to about 2.4x on 400 x 400 grids
+# for a sample of 256 points, estimates are scaled by this margin
+PRECISION_SAFETY_FACTOR = 4
 
-    return u_grid, v_grid
\ No newline at end of file
+# Flows the tree code knows how to expand
+_EXPANDABLE = (linear_vortex, constant_source, vortex, panel_set)
+
+def _nb_elements(flow):
+    # Panels or point singularities broadcast against every query point,
+    # a tree code only ever integrates one leaf at a time
+    if isinstance(flow, treecode):
+        return flow.leaf_size
+    if isinstance(flow, panel_set):
+        return flow.panels_per_block
+    if hasattr(flow, 'length'):
+        return np.size(flow.length)
+    return np.size(getattr(flow, 'x', 1))
+
+def _tiles(flows, nb_points, memory_budget, itemsize=8):
+    # Split the flattened query points so that one tile of every flow
+    # fits in the memory budget
+    nb_elements = max(_nb_elements(flow) for flow in flows)
+    tile_size = max(1, int(memory_budget // (_KERNEL_TEMPORARIES * itemsize * nb_elements)))
+
+    for start in range(0, nb_points, tile_size):
+        yield slice(start, min(start + tile_size, nb_points))
+
+def _expand_flows(flows, tolerance):
+    # Gather every flow the tree code can expand into a single tree
+    if tolerance is None:
+        return flows
+    expandable = [flow for flow in flows if isinstance(flow, _EXPANDABLE)]
+    if not expandable:
+        return flows
+    others = [flow for flow in flows if not isinstance(flow, _EXPANDABLE)]
+    return others + [treecode(expandable, tolerance=tolerance)]
+
+def _cast_flows(flows, dtype):
+    # Flows that can be evaluated in another precision, the others and the
+    # tree code stay in float64
+    return [flow.astype(dtype) if hasattr(flow, 'astype') and flow.dtype != dtype else flow
+            for flow in flows]
+
+def _summed_velocity(flow, x, y):
+    # Panel flows return one velocity per panel, point flows the total
+    u, v = flow.velocity(x, y)
+    if np.ndim(u) > np.ndim(x):
+        u, v = np.sum(u, axis=-1), np.sum(v, axis=-1)
+    return u, v
+
+def _evaluate(flow, x, y, velocity, streamline):
+    # Fused kernels share their intermediates, the other flows are
+    # evaluated once per quantity
+    if hasattr(flow, 'evaluate'):
+        return flow.evaluate(x, y, velocity=velocity, streamline=streamline)
+    u = v = psi = None
+    if velocity:
+        u, v = _summed_velocity(flow, x, y)
+    if streamline:
+        psi = flow.streamline(x, y)
+    return u, v, psi
+
+def _evaluate_tile(flows, x, y, velocity, streamline):
+    # Sum of every flow on one tile of query points, in their precision
+    u = np.zeros(len(x), dtype=x.dtype) if velocity else None
+    v = np.zeros(len(x), dtype=x.dtype) if velocity else None
+    psi = np.zeros(len(x), dtype=x.dtype) if streamline else None
+    for flow in flows:
+        u_flow, v_flow, psi_flow = _evaluate(flow, x, y, velocity, streamline)
+        if velocity:
+            u += u_flow
+            v += v_flow
+        if streamline:
+            psi += psi_flow
+    return u, v, psi
+
+# Flows of a process pool worker, sent once when it starts
+_worker_flows = None
+
+def _set_worker_flows(flows):
+    global _worker_flows
+    _worker_flows = flows
+
+def _evaluate_worker_tile(x, y, velocity, streamline):
+    return _evaluate_tile(_worker_flows, x, y, velocity, streamline)
+
+def _evaluate_points(flows, x_points, y_points, velocity, streamline,
+                     memory_budget, workers, executor):
+    # Flattened velocity and streamfunction, None when not requested
+    u_points = np.zeros(x_points.shape, dtype=x_points.dtype) if velocity else None
+    v_points = np.zeros(x_points.shape, dtype=x_points.dtype) if velocity else None
+    psi_points = np.zeros(x_points.shape, dtype=x_points.dtype) if streamline else None
+
+    def store(tile, result):
+        u, v, psi = result
+        if velocity:
+            u_points[tile] = u
+            v_points[tile] = v
+        if streamline:
+            psi_points[tile] = psi
+
+    workers = workers or 1
+    if workers == 1:
+        # Iterate over the grid in tiles and accumulate the influence of each flow
+        for tile in _tiles(flows, len(x_points), memory_budget, x_points.itemsize):
+            store(tile, _evaluate_tile(flows, x_points[tile], y_points[tile], velocity, streamline))
+        return u_points, v_points, psi_points
+
+    # Every worker holds one tile at a time, and there are enough tiles
+    # to keep all of them busy until the end
+    tiles = list(_tiles(flows, len(x_points), memory_budget / workers, x_points.itemsize))
+    if len(tiles) < 4 * workers:
+        tile_size = max(1, -(-len(x_points) // (4 * workers)))
+        tiles = [slice(start, min(start + tile_size, len(x_points)))
+                 for start in range(0, len(x_points), tile_size)]
+
+    if executor == 'thread':
+        # The kernels release the GIL, the tiles are written in place
+        with ThreadPoolExecutor(workers) as pool:
+            futures = {pool.submit(_evaluate_tile, flows, x_points[tile], y_points[tile],
+                                   velocity, streamline): tile for tile in tiles}
+            for future in as_completed(futures):
+                store(futures[future], future.result())
+    elif executor == 'process':
+        with ProcessPoolExecutor(workers, initializer=_set_worker_flows,
+                                 initargs=(flows,)) as pool:
+            futures = {pool.submit(_evaluate_worker_tile, x_points[tile], y_points[tile],
+                                   velocity, streamline): tile for tile in tiles}
+            for future in as_completed(futures):
+                store(futures[future], future.result())
+    else:
+        raise ValueError(f"executor must be 'thread' or 'process', not {executor!r}")
+    return u_points, v_points, psi_points
+
+def _flatten(x_grid, y_grid, mask, dtype=np.float64):
+    x_grid, y_grid = np.broadcast_arrays(np.asarray(x_grid, dtype=dtype),
+                                         np.asarray(y_grid, dtype=dtype))
+    if mask is not None:
+        mask = np.broadcast_to(np.asarray(mask, dtype=bool), x_grid.shape).ravel()
+    return x_grid.shape, x_grid.ravel(), y_grid.ravel(), mask
+
+def _evaluate_unmasked(flows, x_points, y_points, mask, velocity, streamline,
+                       memory_budget, workers, executor):
+    # Only the points that are not masked are evaluated, the others are 0
+    if mask is None:
+        return _evaluate_points(flows, x_points, y_points, velocity, streamline,
+                                memory_budget, workers, executor)
+    selected = ~mask
+    results = _evaluate_points(flows, x_points[selected], y_points[selected], velocity,
+                               streamline, memory_budget, workers, executor)
+    fields = []
+    for result in results:
+        if result is not None:
+            field = np.zeros(x_points.shape, dtype=result.dtype)
+            field[selected] = result
+            result = field
+        fields.append(result)
+    return fields
+
+def _reshape(field, shape, mask):
+    # Masked arrays when a mask was given
+    if mask is None:
+        return field.reshape(shape)
+    return np.ma.masked_array(field.reshape(shape), mask=mask.reshape(shape))
+
+@timed('compute_fields')
+def compute_fields(flows, x_grid, y_grid, quantities=('u', 'v', 'psi'), u_inf=1,
+                   memory_budget=DEFAULT_MEMORY_BUDGET, tolerance=None,
+                   workers=None, executor='thread', mask=None, dtype=np.float64,
+                   max_precision_error=None):
+    """
+    Any subset of the velocity components 'u' and 'v', the streamfunction
+    'psi', the speed 'speed' and the pressure coefficient 'cp' (relative
+    to u_inf), in one pass over the flows. Returns a dict of grids.
+
+    Points where mask is True (e.g. geometry.contains) are skipped and the
+    grids are then masked arrays.
+
+    The panel flows are evaluated in dtype, float32 halves the memory
+    traffic of the kernels. With max_precision_error, the error of dtype
+    is first estimated on a sample of the points (estimate_precision_error)
+    and the fields fall back to float64, with a warning, above it.
+    """
+    unknown = set(quantities) - {'u', 'v', 'psi', 'speed', 'cp'}
+    if unknown:
+        raise ValueError(f'Unknown quantities {sorted(unknown)}')
+    velocity = bool(set(quantities) & {'u', 'v', 'speed', 'cp'})
+    streamline = 'psi' in quantities
+
+    dtype = np.dtype(dtype)
+    if max_precision_error is not None and dtype != np.float64:
+        errors = estimate_precision_error(flows, x_grid, y_grid, dtype, quantities, u_inf,
+                                          mask=mask, tolerance=tolerance)
+        error = max(errors.values(), default=0)
+        if error > max_precision_error:
+            warnings.warn(f'{dtype} fields are off by up to {error:.2e} of their largest '
+                          f'magnitude, evaluated in float64 instead', RuntimeWarning, stacklevel=2)
+            dtype = np.dtype(np.float64)
+
+    # A tolerance switches the panel and vortex flows to the tree code
+    flows = _cast_flows(_expand_flows(flows, tolerance), dtype)
+    shape, x_points, y_points, mask = _flatten(x_grid, y_grid, mask, dtype)
+    u_grid, v_grid, psi_grid = _evaluate_unmasked(flows, x_points, y_points, mask, velocity,
+                                                  streamline, memory_budget, workers, executor)
+
+    fields = {'u': u_grid, 'v': v_grid, 'psi': psi_grid}
+    if {'speed', 'cp'} & set(quantities):
+        fields['speed'] = np.hypot(u_grid, v_grid)
+    if 'cp' in quantities:
+        fields['cp'] = 1 - (fields['speed'] / u_inf)**2
+    return {name: _reshape(fields[name], shape, mask) for name in quantities}
+
+def estimate_precision_error(flows, x_grid, y_grid, dtype, quantities=('u', 'v', 'psi'),
+                             u_inf=1, sample_size=256, mask=None, tolerance=None, seed=0):
+    """
+    Largest difference between the quantities of compute_fields evaluated
+    in dtype and in float64, on sample_size random points of the grid that
+    are not masked, relative to the largest float64 value and scaled by
+    PRECISION_SAFETY_FACTOR to bound the error on every point. Returns a
+    dict of relative errors.
+    """
+    _, x_points, y_points, mask = _flatten(x_grid, y_grid, mask)
+    candidates = np.arange(len(x_points)) if mask is None else np.flatnonzero(~mask)
+    if len(candidates) == 0:
+        return {name: 0.0 for name in quantities}
+    sample = np.random.default_rng(seed).choice(candidates, min(sample_size, len(candidates)),
+                                                replace=False)
+
+    reference = compute_fields(flows, x_points[sample], y_points[sample], quantities, u_inf,
+                               tolerance=tolerance)
+    reduced = compute_fields(flows, x_points[sample], y_points[sample], quantities, u_inf,
+                             tolerance=tolerance, dtype=dtype)
+    errors = {}
+    for name in quantities:
+        scale = np.max(np.abs(reference[name]))
+        difference = np.max(np.abs(reduced[name] - reference[name]))
+        error = difference / scale if scale > 0 else difference
+        errors[name] = float(PRECISION_SAFETY_FACTOR * error)
+    return errors
+
+@timed('compute_streamlines')
+def compute_streamlines(flows, x_grid, y_grid, memory_budget=DEFAULT_MEMORY_BUDGET,
+                        tolerance=None, workers=None, executor='thread', mask=None,
+                        dtype=np.float64):
+    # A tolerance switches the panel and vortex flows to the tree code
+    flows = _cast_flows(_expand_flows(flows, tolerance), np.dtype(dtype))
+    shape, x_points, y_points, mask = _flatten(x_grid, y_grid, mask, dtype)
+    _, _, result_grid = _evaluate_unmasked(flows, x_points, y_points, mask, False, True,
+                                           memory_budget, workers, executor)
+    return _reshape(result_grid, shape, mask)
+
+@timed('compute_velocities')
+def compute_velocities(flows, x_grid, y_grid, memory_budget=DEFAULT_MEMORY_BUDGET,
+                       tolerance=None, workers=None, executor='thread', mask=None,
+                       dtype=np.float64):
+    # A tolerance switches the panel and vortex flows to the tree code
+    flows = _cast_flows(_expand_flows(flows, tolerance), np.dtype(dtype))
+    shape, x_points, y_points, mask = _flatten(x_grid, y_grid, mask, dtype)
+    u_grid, v_grid, _ = _evaluate_unmasked(flows, x_points, y_points, mask, True, False,
+                                           memory_budget, workers, executor)
+    return _reshape(u_grid, shape, mask), _reshape(v_grid, shape, mask)
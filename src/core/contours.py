@@ -0,0 +1,200 @@
+import numpy as np
+from .compute_visuals import compute_fields
+from ..utils import create_mask_poly
+from ..profiling import timed
+
+# Segments of every marching squares case, as pairs of cell edges. The
+# corners are numbered from the lower left, counterclockwise, and the
+# case sets bit k when corner k is above the level. Edges are 0 bottom,
+# 1 right, 2 top and 3 left. The saddles 5 and 10 are split by the
+# value at the cell center, see _SADDLES
+_SEGMENTS = {1: ((3, 0),), 2: ((0, 1),), 3: ((3, 1),), 4: ((1, 2),), 6: ((0, 2),),
+             7: ((2, 3),), 8: ((2, 3),), 9: ((0, 2),), 11: ((1, 2),), 12: ((3, 1),),
+             13: ((0, 1),), 14: ((3, 0),)}
+
+# Segments of the saddles when the center is (above, below) the level
+_SADDLES = {5: (((0, 1), (2, 3)), ((3, 0), (1, 2))),
+            10: (((3, 0), (1, 2)), ((0, 1), (2, 3)))}
+
+# Speed below which a traced streamline has reached a stagnation point
+STAGNATION_SPEED = 1e-9
+
+def _edge_ids(rows, columns, nx, ny):
+    # Ids of the four edges of the cells, horizontal edges first
+    nb_horizontal = ny * (nx - 1)
+    return np.stack((rows * (nx - 1) + columns,
+                     nb_horizontal + rows * nx + columns + 1,
+                     (rows + 1) * (nx - 1) + columns,
+                     nb_horizontal + rows * nx + columns))
+
+def _crossings(edges, x_points, y_points, field, level):
+    # Point of every edge where the bilinear field equals level
+    nx, ny = len(x_points), len(y_points)
+    nb_horizontal = ny * (nx - 1)
+    horizontal = edges < nb_horizontal
+    rows = np.where(horizontal, edges // (nx - 1), (edges - nb_horizontal) // nx)
+    columns = np.where(horizontal, edges % (nx - 1), (edges - nb_horizontal) % nx)
+    end_rows = rows + ~horizontal
+    end_columns = columns + horizontal
+    start, end = field[rows, columns], field[end_rows, end_columns]
+    t = (level - start) / (end - start)
+    x = x_points[columns] + t * (x_points[end_columns] - x_points[columns])
+    y = y_points[rows] + t * (y_points[end_rows] - y_points[rows])
+    return np.column_stack((x, y))
+
+def _join(segments):
+    # Chain segments sharing an edge into polylines of edge ids
+    ends = {}
+    for index, (first, second) in enumerate(segments):
+        ends.setdefault(first, []).append(index)
+        ends.setdefault(second, []).append(index)
+
+    used = np.zeros(len(segments), dtype=bool)
+    lines = []
+    for start in range(len(segments)):
+        if used[start]:
+            continue
+        used[start] = True
+        line = list(segments[start])
+        # Extend the line from its last edge, then from its first one
+        for _ in range(2):
+            while True:
+                following = [index for index in ends[line[-1]] if not used[index]]
+                if not following:
+                    break
+                used[following[0]] = True
+                first, second = segments[following[0]]
+                line.append(second if first == line[-1] else first)
+            line.reverse()
+        lines.append(line)
+    return lines
+
+@timed('extract_contours')
+def extract_contours(x_points, y_points, field, levels, tolerance=None):
+    """
+    Iso-lines of the (len(y_points), len(x_points)) field, e.g. the
+    streamfunction, by marching squares. Cells with a NaN corner have no
+    line. Returns a dict of the (n, 2) polylines of every level, closed
+    lines end with their first point. With a tolerance, the polylines are
+    simplified (simplify_polyline) so that their size depends on their
+    shape rather than on the grid resolution.
+    """
+    x_points, y_points = np.asarray(x_points, dtype=float), np.asarray(y_points, dtype=float)
+    field = np.asarray(field, dtype=float)
+    ny, nx = field.shape
+    corners = np.stack((field[:-1, :-1], field[:-1, 1:], field[1:, 1:], field[1:, :-1]))
+    valid = ~np.any(np.isnan(corners), axis=0)
+    center = np.mean(corners, axis=0)
+
+    contours = {}
+    for level in levels:
+        above = corners > level
+        cases = np.where(valid, np.tensordot(1 << np.arange(4), above, axes=1), 0)
+        rows, columns = np.nonzero((cases > 0) & (cases < 15))
+        cases = cases[rows, columns]
+        edges = _edge_ids(rows, columns, nx, ny)
+
+        segments = []
+        for case in np.unique(cases):
+            selected = cases == case
+            if case in _SADDLES:
+                high = center[rows[selected], columns[selected]] > level
+                groups = zip(_SADDLES[case], (high, ~high))
+            else:
+                groups = ((_SEGMENTS[case], slice(None)),)
+            for pairs, mask in groups:
+                for first, second in pairs:
+                    segments.append(np.column_stack((edges[first][selected][mask],
+                                                     edges[second][selected][mask])))
+        if not segments:
+            contours[level] = []
+            continue
+
+        segments = np.concatenate(segments)
+        # Every crossing is computed once, the lines index into them
+        crossed = np.unique(segments)
+        points = _crossings(crossed, x_points, y_points, field, level)
+        contours[level] = [points[np.searchsorted(crossed, line)]
+                           for line in _join(segments.tolist())]
+        if tolerance is not None:
+            contours[level] = [simplify_polyline(line, tolerance) for line in contours[level]]
+    return contours
+
+def simplify_polyline(points, tolerance):
+    """
+    Douglas-Peucker simplification of an (n, 2) polyline: the kept points
+    are within tolerance of every dropped one, the ends are always kept.
+    """
+    points = np.asarray(points)
+    if len(points) < 3:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        # Distance of the points in between to the chord, or to its first
+        # end when the chord is a point (closed lines)
+        chord = points[last] - points[first]
+        offsets = points[first + 1:last] - points[first]
+        length = np.hypot(*chord)
+        if length > 0:
+            distance = np.abs(chord[0] * offsets[:, 1] - chord[1] * offsets[:, 0]) / length
+        else:
+            distance = np.hypot(offsets[:, 0], offsets[:, 1])
+        farthest = np.argmax(distance)
+        if distance[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack += [(first, middle), (middle, last)]
+    return points[keep]
+
+@timed('trace_streamlines')
+def trace_streamlines(flows, seeds, step, nb_steps=1000, bounds=None, body=None, **options):
+    """
+    Streamlines from the (n, 2) seed points, integrated downstream by a
+    fourth order Runge-Kutta scheme along the velocity direction of the
+    flows, with a fixed arc length step. A streamline stops after
+    nb_steps, when it leaves bounds ((x_min, x_max), (y_min, y_max)),
+    enters the body polygon, or at a stagnation point. The velocities of
+    all the active streamlines are evaluated together, options are passed
+    to compute_fields. Returns a list of (n, 2) polylines.
+    """
+    seeds = np.atleast_2d(np.asarray(seeds, dtype=float))
+    points = np.full((nb_steps + 1,) + seeds.shape, np.nan)
+    points[0] = seeds
+    lengths = np.ones(len(seeds), dtype=int)
+    active = np.arange(len(seeds))
+
+    def direction(position):
+        fields = compute_fields(flows, position[:, 0], position[:, 1], ('u', 'v'), **options)
+        velocity = np.column_stack((fields['u'], fields['v']))
+        speed = np.hypot(velocity[:, 0], velocity[:, 1])
+        return velocity / np.maximum(speed, STAGNATION_SPEED)[:, np.newaxis], speed
+
+    for iteration in range(nb_steps):
+        if len(active) == 0:
+            break
+        position = points[iteration, active]
+        k1, speed = direction(position)
+        k2, _ = direction(position + .5 * step * k1)
+        k3, _ = direction(position + .5 * step * k2)
+        k4, _ = direction(position + step * k3)
+        position = position + step / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+        # The direction flips across a stagnation point
+        stop = (speed < STAGNATION_SPEED) | (np.sum(k1 * k4, axis=1) < 0)
+        if bounds is not None:
+            (x_min, x_max), (y_min, y_max) = bounds
+            stop |= ((position[:, 0] < x_min) | (position[:, 0] > x_max)
+                     | (position[:, 1] < y_min) | (position[:, 1] > y_max))
+        if body is not None:
+            stop |= create_mask_poly(np.asarray(body), position[:, 0], position[:, 1])
+
+        points[iteration + 1, active[~stop]] = position[~stop]
+        lengths[active[~stop]] += 1
+        active = active[~stop]
+
+    return [points[:length, index] for index, length in enumerate(lengths)]
@@ -0,0 +1,170 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import splu
+from .iterative_solver import iterative_solver
+
+class _cluster:
+    def __init__(self, start, stop, points):
+        # A contiguous range of indices along the contour and its bounding box
+        self.start, self.stop = start, stop
+        self.low, self.high = points.min(axis=0), points.max(axis=0)
+        self.diameter = np.hypot(*(self.high - self.low))
+        self.children = []
+
+    @property
+    def indices(self):
+        return np.arange(self.start, self.stop)
+
+    def distance(self, other):
+        gap = np.maximum(0, np.maximum(self.low - other.high, other.low - self.high))
+        return np.hypot(*gap)
+
+class hmatrix_solver(iterative_solver):
+    """
+    Hierarchical matrix version of linear_vortex_solver for large panel counts.
+
+    Rows (collocation points) and columns (vertices) are split into trees
+    of contiguous clusters along the contour. Blocks between well separated
+    clusters (min diameter <= eta * distance) are compressed to low rank by
+    adaptive cross approximation, the others are stored densely. Only the
+    entries sampled by the approximation are ever computed, so memory and
+    assembly grow almost linearly with the number of panels. The system is
+    solved by the GMRES loop of iterative_solver, preconditioned by a
+    sparse LU of the dense near field.
+
+    tolerance is both the relative accuracy of the compressed blocks and
+    the GMRES stopping criterion.
+    """
+    def __init__(self, geometry, tolerance=1e-8, leaf_size=32, eta=1.0, warm_start=True):
+        self.geometry = geometry
+        self.tolerance = tolerance
+        self.leaf_size = leaf_size
+        self.eta = eta
+        self.warm_start = warm_start
+        self._create_normals()
+        self._create_panel_frames()
+
+        self.dense_blocks, self.low_rank_blocks = [], []
+        self._partition(self._row_tree(0, len(self.xc)), self._column_tree(0, len(self.xc) + 1))
+        self._create_preconditioner()
+        self.iterations, self.residuals = [], []
+        self._previous = None
+
+    def _row_tree(self, start, stop):
+        points = np.column_stack((self.xc[start:stop], self.yc[start:stop]))
+        cluster = _cluster(start, stop, points)
+        if stop - start > self.leaf_size:
+            middle = (start + stop) // 2
+            cluster.children = [self._row_tree(start, middle), self._row_tree(middle, stop)]
+        return cluster
+
+    def _column_tree(self, start, stop):
+        # Vertex j carries the panels j - 1 and j, both bound the cluster
+        vertex = self.geometry.vertex
+        cluster = _cluster(start, stop, vertex[max(start - 1, 0):min(stop + 1, len(vertex))])
+        if stop - start > self.leaf_size:
+            middle = (start + stop) // 2
+            cluster.children = [self._column_tree(start, middle), self._column_tree(middle, stop)]
+        return cluster
+
+    def _partition(self, rows, columns):
+        distance = rows.distance(columns)
+        if distance > 0 and min(rows.diameter, columns.diameter) <= self.eta * distance:
+            factors = self._cross_approximation(rows.indices, columns.indices)
+            if factors is not None:
+                self.low_rank_blocks.append((rows.indices, columns.indices) + factors)
+                return
+
+        if not rows.children or not columns.children:
+            block = self._entries(rows.indices, columns.indices)
+            self.dense_blocks.append((rows.indices, columns.indices, block))
+            return
+
+        for row_child in rows.children:
+            for column_child in columns.children:
+                self._partition(row_child, column_child)
+
+    def _entries(self, rows, columns):
+        # Entries of the influence matrix: vertex j is the right end of
+        # panel j - 1 and the left end of panel j
+        n = len(self.xc)
+        panels = np.unique(np.concatenate((columns[columns < n], columns[columns > 0] - 1)))
+        left, right = self._influence_coefficients(rows, panels)
+
+        block = np.zeros((len(rows), len(columns)))
+        has_right = columns < n
+        block[:, has_right] += right[:, np.searchsorted(panels, columns[has_right])]
+        has_left = columns > 0
+        block[:, has_left] += left[:, np.searchsorted(panels, columns[has_left] - 1)]
+        return block
+
+    def _cross_approximation(self, rows, columns):
+        # Adaptive cross approximation with partial pivoting, block ~ U @ V.
+        # Returns None when the block is not worth compressing
+        max_rank = min(len(rows), len(columns)) // 2
+        U = np.zeros((len(rows), max_rank))
+        V = np.zeros((max_rank, len(columns)))
+        used = np.zeros(len(rows), dtype=bool)
+        norm_sq, rank, i = 0.0, 0, 0
+
+        while rank < max_rank:
+            used[i] = True
+            row = self._entries(rows[i:i + 1], columns)[0] - U[i, :rank] @ V[:rank]
+            j = np.argmax(np.abs(row))
+            if row[j] == 0:
+                # This row is already reproduced, try one that was not used
+                remaining = np.flatnonzero(~used)
+                if len(remaining) == 0:
+                    break
+                i = remaining[0]
+                continue
+
+            u = self._entries(rows, columns[j:j + 1])[:, 0] - U[:, :rank] @ V[:rank, j]
+            v = row / row[j]
+
+            # Frobenius norm of the approximation, updated incrementally
+            norm_sq += 2 * np.sum((U[:, :rank].T @ u) * (V[:rank] @ v)) + (u @ u) * (v @ v)
+            U[:, rank], V[rank] = u, v
+            rank += 1
+
+            if np.linalg.norm(u) * np.linalg.norm(v) <= self.tolerance * np.sqrt(norm_sq):
+                return U[:, :rank], V[:rank]
+
+            i = np.argmax(np.where(used, -1, np.abs(u)))
+            if used[i]:
+                break
+        return None
+
+    def _create_preconditioner(self):
+        # Sparse LU of the dense near field plus the Kutta condition
+        N = len(self.xc) + 1
+        rows, columns, values = [[N - 1, N - 1]], [[0, N - 1]], [[1.0, 1.0]]
+        for block_rows, block_columns, block in self.dense_blocks:
+            grid_rows, grid_columns = np.meshgrid(block_rows, block_columns, indexing='ij')
+            rows.append(grid_rows.ravel())
+            columns.append(grid_columns.ravel())
+            values.append(block.ravel())
+
+        near_field = coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                shape=(N, N)).tocsc()
+        self._near_field = splu(near_field)
+
+    def _precondition(self, residual):
+        return self._near_field.solve(residual)
+
+    @property
+    def memory(self):
+        """Bytes held by the compressed matrix."""
+        return (sum(block.nbytes for _, _, block in self.dense_blocks)
+                + sum(U.nbytes + V.nbytes for _, _, U, V in self.low_rank_blocks))
+
+    def matvec(self, gammas):
+        result = np.zeros(len(gammas))
+        for rows, columns, block in self.dense_blocks:
+            result[rows] += block @ gammas[columns]
+        for rows, columns, U, V in self.low_rank_blocks:
+            result[rows] += U @ (V @ gammas[columns])
+
+        # Kutta condition
+        result[-1] = gammas[0] + gammas[-1]
+        return result
@@ -0,0 +1,159 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import LinearOperator, gmres, splu
+from .linear_vortex_solver import linear_vortex_solver
+from .treecode import treecode
+from ..flows import linear_vortex
+from ..geometry import geometry as panel_geometry
+from ..geometry._interpolate import _interpolate
+from ..profiling import timed
+
+def _arc_length(points):
+    # Normalized arc length of every point along the contour
+    distance = np.insert(np.cumsum(np.hypot(*np.diff(points, axis=0).T)), 0, 0)
+    return distance / distance[-1]
+
+class iterative_solver(linear_vortex_solver):
+    """
+    Matrix-free GMRES version of linear_vortex_solver.
+
+    The influence matrix is never stored: the influences between
+    neighboring panels, the ones the treecode integrates exactly, are
+    assembled as a sparse matrix, and every product adds the far field of
+    the treecode, built once for the panels and only given their new
+    strengths. The preconditioner is a two level cycle on a coarse
+    panelization of the same contour (coarse_vertex vertices, re-sampled
+    with the geometry spline): the residual is interpolated to the coarse
+    collocation points, solved there with the dense solver, interpolated
+    back to the fine vertices and smoothed by a sparse LU of the near
+    field. Any number of angles costs two solves, see _solve_RHS.
+
+    It is faster than linear_vortex_solver from about 4000 panels, where
+    building and factorizing the dense matrix dominate, and its memory
+    grows almost linearly with the number of panels. Below, use the dense
+    solver.
+
+    tolerance is both the GMRES stopping criterion and the treecode
+    accuracy. The iteration count and final relative residual of every
+    basis right hand side of the last solve are kept in `iterations` and
+    `residuals`. With warm_start, each solve starts from the previous
+    solutions, which suits polar sweeps over ordered angles.
+    """
+    def __init__(self, geometry, tolerance=1e-8, coarse_vertex=None, warm_start=True):
+        self.geometry = geometry
+        self.tolerance = tolerance
+        self.warm_start = warm_start
+        self._create_normals()
+        self._create_panel_frames()
+
+        # The tree only depends on the panels, every product updates the
+        # strengths of its elements
+        vertex = geometry.vertex
+        strengths = np.zeros(len(vertex) - 1)
+        self._tree = treecode([linear_vortex(strengths, strengths, vertex[:-1], vertex[1:])],
+                              tolerance=tolerance)
+        self._create_near_field()
+        self._create_preconditioner(coarse_vertex)
+        self.iterations, self.residuals = [], []
+        self._previous = None
+
+    def _create_near_field(self):
+        # Sparse LU of the influences the treecode integrates exactly,
+        # every collocation point with the panels of its near leaves, plus
+        # the Kutta condition
+        N = len(self.xc) + 1
+        rows, columns, values = [[N - 1, N - 1]], [[0, N - 1]], [[1.0, 1.0]]
+        _, near = self._tree.interactions(self.xc + 1j * self.yc)
+        for leaf, targets in near:
+            panels = leaf.indices
+            left, right = self._influence_coefficients(targets, panels)
+            grid_rows = np.repeat(targets, len(panels))
+            rows += [grid_rows, grid_rows]
+            columns += [np.tile(panels + 1, len(targets)), np.tile(panels, len(targets))]
+            values += [left.ravel(), right.ravel()]
+
+        near_field = coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                shape=(N, N))
+        self._near_matrix = near_field.tocsr()
+        self._near_field = splu(near_field.tocsc())
+
+    def _create_preconditioner(self, coarse_vertex):
+        vertex = self.geometry.vertex
+        coarse_vertex = coarse_vertex or max(4, min(len(vertex) // 4, 2048))
+
+        coarse = panel_geometry(nb_vertex=coarse_vertex)
+        coarse.vertex = _interpolate(vertex, coarse_vertex)
+        coarse._compute_parameters()
+        self.coarse_solver = linear_vortex_solver(coarse)
+
+        # Transfers between both panelizations, by arc length
+        self._fine_vertex = _arc_length(vertex)
+        self._coarse_vertex = _arc_length(coarse.vertex)
+        self._fine_center = (self._fine_vertex[:-1] + self._fine_vertex[1:]) / 2
+        self._coarse_center = (self._coarse_vertex[:-1] + self._coarse_vertex[1:]) / 2
+
+    @property
+    def RHS(self):
+        """The influence matrix as a LinearOperator, it is never stored."""
+        N = len(self.xc) + 1
+        return LinearOperator((N, N), matvec=self.matvec, dtype=float)
+
+    @RHS.setter
+    def RHS(self, matrix):
+        raise AttributeError(f'{type(self).__name__} does not store an influence matrix to replace')
+
+    def matvec(self, gammas):
+        vertex = self.geometry.vertex
+        self._tree.update([linear_vortex(gammas[:-1], gammas[1:], vertex[:-1], vertex[1:])])
+        # The near field, with the Kutta condition, is assembled, the
+        # treecode only adds the expansions of the far clusters
+        u, v = self._tree.velocity(self.xc, self.yc, near=False)
+        result = self._near_matrix @ gammas
+        result[:-1] += u * self.nx + v * self.ny
+        return result
+
+    def _precondition(self, residual):
+        coarse_residual = np.empty(len(self._coarse_vertex))
+        coarse_residual[:-1] = np.interp(self._coarse_center, self._fine_center, residual[:-1])
+        coarse_residual[-1] = residual[-1]
+
+        coarse_gammas = self.coarse_solver._solve_RHS(coarse_residual)
+        correction = np.interp(self._fine_vertex, self._coarse_vertex, coarse_gammas)
+        return correction + self._near_field.solve(residual - self.matvec(correction))
+
+    @timed('solve')
+    def _solve_RHS(self, B):
+        N = len(B)
+        operator = self.RHS
+        preconditioner = LinearOperator((N, N), matvec=self._precondition)
+
+        # The freestream right hand sides of any number of angles span two
+        # directions: only an orthonormal basis of the span of B is solved,
+        # every column is then a weighted sum of its solutions
+        basis, singular, weights = np.linalg.svd(B, full_matrices=False)
+        rank = max(1, np.sum(singular > singular[0] * N * np.finfo(float).eps))
+        basis, weights = basis[:, :rank], singular[:rank, np.newaxis] * weights[:rank]
+
+        solutions = np.zeros_like(basis)
+        self.iterations, self.residuals = [], []
+        for k in range(rank):
+            count = [0]
+            def callback(residual):
+                count[0] += 1
+
+            # Consecutive solves have close right hand sides, the previous
+            # solutions give the part of this one in their span
+            x0 = None
+            if self.warm_start and self._previous is not None:
+                previous_basis, previous_solutions = self._previous
+                x0 = previous_solutions @ (previous_basis.T @ basis[:, k])
+            solutions[:, k], info = gmres(operator, basis[:, k], x0=x0, M=preconditioner,
+                                          rtol=self.tolerance, restart=50, maxiter=N // 50 + 1,
+                                          callback=callback, callback_type='pr_norm')
+            residual = np.linalg.norm(basis[:, k] - self.matvec(solutions[:, k]))
+            if info > 0:
+                raise np.linalg.LinAlgError(f'GMRES did not converge, relative residual {residual:.2e}')
+            self.iterations.append(count[0])
+            self.residuals.append(residual)
+        self._previous = basis, solutions
+        return solutions @ weights
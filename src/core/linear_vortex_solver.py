@@ -1,56 +1,188 @@
 import numpy as np
-from ..flows import linear_vortex
+from scipy.linalg import lu_factor, lu_solve
+from ..flows._kernels import get_kernel
+from ..profiling import timed
 
 class linear_vortex_solver:
-    def __init__(self, geometry):
+    def __init__(self, geometry, assembly_memory=32 * 2**20):
         self.geometry = geometry
+        self.assembly_memory = assembly_memory
         self._create_normals()
+        self._create_panel_frames()
         self.RHS = self._create_RHS_matrix()
 
+    @property
+    def RHS(self):
+        return self._RHS
+
+    @RHS.setter
+    def RHS(self, matrix):
+        # The LU factors belong to one matrix, so replacing it
+        # (the webapp restores it from the session store) drops them
+        self._RHS = matrix
+        self._lu = None
+
     def _create_normals(self):
         normals = self.geometry.normal
         n_x, n_y = normals[:-1, 0], normals[:-1, 1]
         self.nx = n_x
         self.ny = n_y
 
-    def _create_RHS_matrix(self):
+    def _create_panel_frames(self):
         vertex = self.geometry.vertex
-        centers = self.geometry.center
 
-        N = len(vertex)
-        A = np.zeros((N, N))
+        # Panel frames, shared by the left and right influences
+        self.x1, self.y1 = vertex[:-1, 0], vertex[:-1, 1]
+        dx, dy = vertex[1:, 0] - self.x1, vertex[1:, 1] - self.y1
+        self.length = np.hypot(dx, dy)
+        alpha_panel = np.arctan2(dy, dx)
+        self.cos_a, self.sin_a = np.cos(-alpha_panel), np.sin(-alpha_panel)
+
+        # Panel centers, the collocation points
+        self.xc, self.yc = self.geometry.center[:-1, 0], self.geometry.center[:-1, 1]
+
+    def _influence_coefficients(self, rows, panels, buffers=None):
+        """
+        Normal velocity induced at the collocation points `rows` by the
+        `panels` for a unit strength at their left (gamma_a = 0,
+        gamma_b = 1) and right (gamma_a = 1, gamma_b = 0) end. Both are
+        computed in place in `buffers`, an (8, rows, panels) scratch array,
+        or by the loop kernel of the current backend.
+        """
+        x, y = self.xc[rows, np.newaxis], self.yc[rows, np.newaxis]
+        n_x, n_y = self.nx[rows, np.newaxis], self.ny[rows, np.newaxis]
+        x1, y1, length = self.x1[panels], self.y1[panels], self.length[panels]
+        cos_a, sin_a = self.cos_a[panels], self.sin_a[panels]
+
+        if buffers is None:
+            buffers = np.empty((8, len(x), len(x1)))
 
-        # Panel endpoints
-        p1, p2 = vertex[:-1], vertex[1:]
+        kernel = get_kernel('influence_coefficients')
+        if kernel is not None:
+            left, right = buffers[:2, :len(x), :len(x1)]
+            kernel(x[:, 0], y[:, 0], n_x[:, 0], n_y[:, 0], x1, y1, cos_a, sin_a, length, left, right)
+            return left, right
 
-        # Panel centers
-        x, y = centers[:-1, 0], centers[:-1, 1]
+        x_p, y_p, a, b, c, d, t_n, n_n = buffers[:, :len(x), :len(x1)]
 
-        # Right influence (gamma_a = 1, gamma_b = 0)
-        right_panels = linear_vortex(np.ones(N - 1), np.zeros(N - 1), p1, p2)
-        u_vec, v_vec = right_panels.velocity(x, y)
-        A_right = u_vec * self.nx[:, np.newaxis] + v_vec * self.ny[:, np.newaxis]
-        A[:-1, :-1] += A_right
+        # Collocation points in every panel frame
+        np.subtract(x, x1, out=a)
+        np.subtract(y, y1, out=b)
+        np.multiply(a, cos_a, out=x_p)
+        x_p -= np.multiply(b, sin_a, out=c)
+        np.multiply(a, sin_a, out=y_p)
+        y_p += np.multiply(b, cos_a, out=c)
 
-        # Left influence (gamma_a = 0, gamma_b = 1)
-        left_panels = linear_vortex(np.zeros(N - 1), np.ones(N - 1), p1, p2)
-        u_vec, v_vec = left_panels.velocity(x, y)
-        A_left = u_vec * self.nx[:, np.newaxis] + v_vec * self.ny[:, np.newaxis]
-        A[:-1, 1:] += A_left
+        # Angle difference (theta2 - theta1) and log(r1^2 / r2^2)
+        np.subtract(x_p, length, out=a)
+        np.arctan2(y_p, a, out=b)
+        b -= np.arctan2(y_p, x_p, out=c)
+        np.multiply(y_p, y_p, out=c)
+        a *= a
+        a += c
+        np.multiply(x_p, x_p, out=d)
+        d += c
+        d /= a
+        np.log(d, out=d)
+
+        # Panel tangent and normal components of the collocation normal
+        np.multiply(n_x, cos_a, out=t_n)
+        t_n -= np.multiply(n_y, sin_a, out=c)
+        np.multiply(n_x, sin_a, out=n_n)
+        n_n += np.multiply(n_y, cos_a, out=c)
+
+        # Linear part per unit gamma1, u1 * t_n + v1 * n_n
+        np.multiply(y_p, d, out=a)
+        a -= np.multiply(x_p, b, out=c)
+        a -= c
+        a *= t_n
+        a *= -1 / (4 * np.pi)
+        np.multiply(x_p, d, out=c)
+        c *= .5
+        c -= length
+        c += np.multiply(y_p, b, out=y_p)
+        c *= n_n
+        c *= -1 / (2 * np.pi)
+        a += c
+
+        # Left influence: gamma1 = 1 / length
+        a /= length
+
+        # Right influence: the constant part minus the left influence
+        b *= t_n
+        b *= 1 / (2 * np.pi)
+        d *= n_n
+        d *= -1 / (4 * np.pi)
+        b += d
+        b -= a
+        return a, b
+
+    @timed('assembly')
+    def _create_RHS_matrix(self):
+        N = len(self.geometry.vertex)
+        A = np.zeros((N, N))
+
+        # Rows are assembled in blocks so that the temporaries never
+        # exceed assembly_memory, whatever the number of panels
+        block = max(1, int(self.assembly_memory // (8 * (N - 1) * 8)))
+        buffers = np.empty((8, min(block, N - 1), N - 1))
+
+        for start in range(0, N - 1, block):
+            rows = slice(start, min(start + block, N - 1))
+            left, right = self._influence_coefficients(rows, slice(None), buffers)
+            A[rows, 1:] += left
+            A[rows, :-1] += right
 
         # Kutta condition
         A[-1, 0] = 1.0
         A[-1, -1] = 1.0
         return A
-    
-    def solve(self, alpha, u_inf = 1):
-        B = np.zeros(len(self.RHS))
+
+    @timed('factorize')
+    def _factorize(self):
+        # The influence matrix only depends on the geometry, so it is
+        # factorized once and every angle is a back substitution
+        if self._lu is None:
+            self._lu = lu_factor(self.RHS)
+        return self._lu
+
+    @timed('solve')
+    def _solve_RHS(self, B):
+        # One solution per column of B
+        return lu_solve(self._factorize(), B)
+
+    def _freestream_RHS(self, alphas, u_inf):
+        B = np.zeros((len(self.nx) + 1, len(alphas)))
 
         # Normal vectors definition
-        n_x, n_y = self.nx, self.ny
+        n_x, n_y = self.nx[:, np.newaxis], self.ny[:, np.newaxis]
+
+        # Freestream contribution, one column per angle
+        B[:-1] = -(u_inf * np.cos(alphas) * n_x + u_inf * np.sin(alphas) * n_y)
+        return B
+
+    def solve_many(self, alphas, u_inf = 1):
+        """
+        Solve for the vortex strengths at several angles of attack at once.
+        Returns an array of shape (len(alphas), N), one row per angle.
+        """
+        alphas = np.atleast_1d(np.asarray(alphas, dtype=float))
+        B = self._freestream_RHS(alphas, u_inf)
 
-        # Freestream contribution
-        B[:-1] = -(u_inf * np.cos(alpha) * n_x + u_inf * np.sin(alpha) * n_y)
+        gammas = self._solve_RHS(B)
+        return gammas.T
 
-        gammas = np.linalg.solve(self.RHS, B)
-        return gammas
+    def solve_basis(self):
+        """
+        Solutions for a unit freestream along x and along y, in body axes.
+        Any angle is cos(alpha) * gamma_c + sin(alpha) * gamma_s.
+        """
+        B = np.zeros((len(self.nx) + 1, 2))
+        B[:-1, 0] = -self.nx
+        B[:-1, 1] = -self.ny
+
+        gamma_c, gamma_s = self._solve_RHS(B).T
+        return gamma_c, gamma_s
+
+    def solve(self, alpha, u_inf = 1):
+        return self.solve_many(alpha, u_inf)[0]
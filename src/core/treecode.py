@@ -0,0 +1,270 @@
+import numpy as np
+from scipy.special import comb
+from ..flows import linear_vortex, constant_source, vortex, panel_set
+from ..flows._multipoles import (gauss_points, panel_points, panel_strengths, vortex_offsets, powers,
+                                 far_velocity, far_streamline)
+
+class _node:
+    def __init__(self, indices):
+        self.indices = indices
+        self.children = []
+
+class treecode:
+    """
+    Barnes-Hut evaluation of linear_vortex, constant_source, panel_set and
+    vortex flows.
+
+    The elements are sorted in a binary tree of clusters. A cluster whose
+    radius is small compared to its distance to a query point (radius <
+    theta * distance) is evaluated through a complex multipole expansion,
+    otherwise its children are visited, down to leaves of at most
+    leaf_size elements that are integrated exactly with the flows' own
+    kernels. The expansion order follows from tolerance, a bound on the
+    error of each accepted cluster relative to its total strength over
+    distance.
+
+    Only the vortex elements have a single valued streamfunction, so the
+    streamfunction of constant_source panels is always evaluated directly,
+    leaf_size panels at a time to bound the memory as the leaves do.
+
+    update gives new strengths to the same elements, e.g. at every
+    product of an iterative solver: the tree, the powers of the Gauss
+    points and the translations are kept, only the moments are computed
+    again. The near and far interactions of the last query points are
+    kept as well.
+    """
+    def __init__(self, flows, tolerance=1e-6, leaf_size=32, theta=.5):
+        self.tolerance = tolerance
+        self.leaf_size = leaf_size
+        self.theta = theta
+
+        # Truncation error of an accepted cluster is below theta^(p+1) / (1 - theta)
+        self.order = max(1, int(np.ceil(np.log(tolerance * (1 - theta)) / np.log(theta))) - 1)
+
+        self._binomial = comb(*np.indices((self.order + 1, self.order + 1)))
+        self._collect_elements(flows)
+        self.root = _node(np.arange(len(self.center)))
+        self._build(self.root)
+        self._targets = None
+
+    def update(self, flows):
+        """Replace the strengths of the elements by the ones of flows, same elements."""
+        center = self.center
+        self._collect_elements(flows)
+        if not np.array_equal(self.center, center):
+            raise ValueError('update needs the elements of the tree, create a new treecode instead')
+        self._compute_moments(self.root)
+
+    def _collect_elements(self, flows):
+        # Every element is described by its endpoints, its strengths and,
+        # for the expansions, by Gauss points carrying complex strengths q
+        # so that its complex potential is sum(q * log(z - zeta))
+        columns = {name: [] for name in ('z1', 'z2', 'kind', 'gamma_a', 'gamma_b',
+                                         'lambda_', 'points', 'strengths', 'offsets')}
+
+        nodes, weights = gauss_points(self.order)
+
+        # Panel sets are expanded as their linear vortex and source panels
+        flows = [panel for flow in flows
+                 for panel in (flow.panels() if isinstance(flow, panel_set) else [flow])]
+
+        for flow in flows:
+            if isinstance(flow, (linear_vortex, constant_source)):
+                p1 = flow.x1 + 1j * flow.y1
+                p2 = flow.x2 + 1j * flow.y2
+                n = len(p1)
+                if isinstance(flow, linear_vortex):
+                    gamma_a = np.broadcast_to(flow.gamma_a, n)
+                    gamma_b = np.broadcast_to(flow.gamma_b, n)
+                    lambda_ = np.zeros(n)
+                    offset = vortex_offsets(flow.length, gamma_a, gamma_b)
+                    kind = 'vortex'
+                else:
+                    gamma_a = gamma_b = np.zeros(n)
+                    lambda_ = np.broadcast_to(flow.lambda_, n)
+                    offset = np.zeros(n)
+                    kind = 'source'
+                points = panel_points(p1, p2, nodes)
+                vortex_strengths, source_strengths = panel_strengths(flow.length, gamma_a, gamma_b,
+                                                                     lambda_, nodes, weights)
+                strengths = vortex_strengths + source_strengths
+            elif isinstance(flow, vortex):
+                gamma, x, y = np.broadcast_arrays(flow.gamma, flow.x, flow.y)
+                p1 = p2 = (x + 1j * y).ravel()
+                n = len(p1)
+                gamma_a = gamma_b = gamma.ravel()
+                lambda_ = offset = np.zeros(n)
+                kind = 'point'
+                # A single point, padded with empty Gauss points
+                points = np.repeat(p1[:, np.newaxis], len(nodes), axis=1)
+                strengths = np.zeros((n, len(nodes)), dtype=complex)
+                strengths[:, 0] = 1j * gamma_a / (2 * np.pi)
+            else:
+                raise TypeError(f'treecode cannot expand {type(flow).__name__} flows')
+
+            for name, value in (('z1', p1), ('z2', p2), ('kind', np.full(n, kind)),
+                                ('gamma_a', gamma_a), ('gamma_b', gamma_b),
+                                ('lambda_', lambda_), ('points', points),
+                                ('strengths', strengths), ('offsets', offset)):
+                columns[name].append(value)
+
+        for name, values in columns.items():
+            setattr(self, name, np.concatenate(values))
+        self.center = (self.z1 + self.z2) / 2
+
+    def _build(self, node):
+        indices = node.indices
+        box = np.concatenate((self.z1[indices], self.z2[indices]))
+        low = box.real.min() + 1j * box.imag.min()
+        high = box.real.max() + 1j * box.imag.max()
+        node.center = (low + high) / 2
+        node.radius = np.max(np.abs(box - node.center))
+
+        if len(indices) <= self.leaf_size:
+            # Powers of the Gauss points, shared by every set of strengths
+            node.powers = powers(self.points[indices], node.center, self.order)
+            node.is_vortex = np.repeat(self.kind[indices] != 'source', self.points.shape[1])
+            self._compute_moments(node)
+            return
+
+        # Split at the median along the longest side of the bounding box
+        size = high - low
+        keys = self.center[indices].real if size.real >= size.imag else self.center[indices].imag
+        order = np.argsort(keys, kind='stable')
+        half = len(indices) // 2
+        node.children = [_node(indices[order[:half]]), _node(indices[order[half:]])]
+        for child in node.children:
+            self._build(child)
+        node.translations = [self._translation(child.center - node.center)
+                             for child in node.children]
+        self._compute_moments(node, children=False)
+
+    def _compute_moments(self, node, children=True):
+        # mu_k = sum(q * (zeta - zc)^k), for every element and for the
+        # vortex elements alone (the streamfunction), from the leaves up
+        node.offset = np.sum(self.offsets[node.indices])
+        if not node.children:
+            q = self.strengths[node.indices].ravel()
+            node.moments = q @ node.powers
+            node.vortex_moments = q[node.is_vortex] @ node.powers[node.is_vortex]
+            return
+
+        if children:
+            for child in node.children:
+                self._compute_moments(child)
+        # Shift the children moments to this center
+        node.moments = sum(translation @ child.moments
+                           for translation, child in zip(node.translations, node.children))
+        node.vortex_moments = sum(translation @ child.vortex_moments
+                                  for translation, child in zip(node.translations, node.children))
+
+    def _translation(self, d):
+        # (zeta - zp)^l = sum over k of C(l, k) * (zc - zp)^(l - k) * (zeta - zc)^k
+        powers = d ** np.arange(self.order + 1)
+        l, k = np.tril_indices(self.order + 1)
+        translation = np.zeros((self.order + 1, self.order + 1), dtype=complex)
+        translation[l, k] = self._binomial[l, k] * powers[l - k]
+        return translation
+
+    def _leaf_flows(self, indices):
+        # Exact kernels for the elements of a leaf
+        flows = {}
+        for kind in ('vortex', 'source', 'point'):
+            selected = indices[self.kind[indices] == kind]
+            if len(selected) == 0:
+                continue
+            p1 = np.column_stack((self.z1[selected].real, self.z1[selected].imag))
+            p2 = np.column_stack((self.z2[selected].real, self.z2[selected].imag))
+            if kind == 'vortex':
+                flows[kind] = linear_vortex(self.gamma_a[selected], self.gamma_b[selected], p1, p2)
+            elif kind == 'source':
+                flows[kind] = constant_source(self.lambda_[selected], p1, p2)
+            else:
+                flows[kind] = vortex(self.gamma_a[selected], p1[:, 0], p1[:, 1])
+        return flows
+
+    def interactions(self, z):
+        """
+        (node, indices of the query points z) pairs of the expanded
+        clusters and of the leaves integrated exactly.
+        """
+        if self._targets is not None and np.array_equal(self._targets, z):
+            return self._far, self._near
+
+        # Visit the tree with the indices of the query points still
+        # too close to be expanded
+        far, near_leaves = [], []
+        stack = [(self.root, np.arange(len(z)))]
+        while stack:
+            node, targets = stack.pop()
+            is_far = np.abs(z[targets] - node.center) * self.theta > node.radius
+            if np.any(is_far):
+                far.append((node, targets[is_far]))
+
+            near = targets[~is_far]
+            if len(near) == 0:
+                continue
+            if node.children:
+                stack.extend((child, near) for child in node.children)
+            else:
+                near_leaves.append((node, near))
+
+        self._targets, self._far, self._near = z.copy(), far, near_leaves
+        return far, near_leaves
+
+    def _traverse(self, z, far_field, near_field):
+        far, near = self.interactions(z)
+        for node, targets in far:
+            far_field(node, targets)
+        if near_field is not None:
+            for node, targets in near:
+                near_field(node, targets)
+
+    def velocity(self, x, y, near=True):
+        """
+        Velocity (u, v) of the flows at the points (x, y). near=False
+        leaves out the leaves integrated exactly, e.g. when their
+        influence is already assembled as a matrix.
+        """
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        z = (x + 1j * y).ravel()
+        w = np.zeros(len(z), dtype=complex)
+
+        def far_field(node, targets):
+            w[targets] += far_velocity(node.moments, 1 / (z[targets] - node.center))
+
+        def near_field(node, targets):
+            for flow in self._leaf_flows(node.indices).values():
+                u, v = flow.velocity(x.ravel()[targets], y.ravel()[targets])
+                if np.ndim(u) > 1:
+                    u, v = np.sum(u, axis=-1), np.sum(v, axis=-1)
+                w[targets] += u - 1j * v
+
+        self._traverse(z, far_field, near_field if near else None)
+        return w.real.reshape(x.shape), -w.imag.reshape(x.shape)
+
+    def streamline(self, x, y):
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        z = (x + 1j * y).ravel()
+        psi = np.zeros(len(z))
+
+        def far_field(node, targets):
+            psi[targets] += far_streamline(node.vortex_moments, 1 / (z[targets] - node.center),
+                                           node.offset)
+
+        def near_field(node, targets):
+            flows = self._leaf_flows(node.indices)
+            for kind in ('vortex', 'point'):
+                if kind in flows:
+                    psi[targets] += flows[kind].streamline(x.ravel()[targets], y.ravel()[targets])
+
+        self._traverse(z, far_field, near_field)
+
+        # Sources have no single valued expansion of their streamfunction,
+        # they are summed in blocks of leaf_size panels
+        sources = np.flatnonzero(self.kind == 'source')
+        for start in range(0, len(sources), self.leaf_size):
+            block = self._leaf_flows(sources[start:start + self.leaf_size])['source']
+            psi += block.streamline(x.ravel(), y.ravel())
+
+        return psi.reshape(x.shape)
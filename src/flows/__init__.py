@@ -1,3 +1,5 @@
 from .potential_flows import  *
 from .linear_flows import *
-from .constant_flows import *
\ No newline at end of file
+from .constant_flows import *
+from .panel_sets import *
+from ._kernels import set_kernel_backend, get_kernel_backend, JIT_AVAILABLE
\ No newline at end of file
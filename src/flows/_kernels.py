@@ -0,0 +1,206 @@
+import math
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# The loops run in parallel over the query points once compiled
+prange = numba.prange if numba is not None else range
+
+JIT_AVAILABLE = numba is not None
+
+# name: (python loops, compiled loops or None)
+_KERNELS = {}
+
+_backend = 'jit' if JIT_AVAILABLE else 'numpy'
+
+def set_kernel_backend(backend):
+    """
+    Select how the panel kernels are evaluated: 'numpy' (vectorized
+    expressions), 'jit' (fused loops compiled by numba), 'auto' (the JIT
+    when numba is installed, numpy otherwise) or 'python' (the same loops,
+    interpreted, only meant to test them without numba).
+    """
+    global _backend
+    if backend == 'auto':
+        backend = 'jit' if JIT_AVAILABLE else 'numpy'
+    if backend not in ('numpy', 'jit', 'python'):
+        raise ValueError(f"backend must be 'numpy', 'jit', 'auto' or 'python', not {backend!r}")
+    if backend == 'jit' and not JIT_AVAILABLE:
+        raise ImportError('The jit backend requires numba')
+    _backend = backend
+
+def get_kernel_backend():
+    return _backend
+
+def get_kernel(name):
+    """Loop kernel of the current backend, None for numpy."""
+    if _backend == 'numpy':
+        return None
+    python, compiled = _KERNELS[name]
+    return compiled if _backend == 'jit' else python
+
+def _kernel(function):
+    # Register the loops, compiled lazily (on first call) when possible
+    compiled = numba.njit(parallel=True, cache=True)(function) if numba is not None else None
+    _KERNELS[function.__name__] = (function, compiled)
+    return function
+
+@_kernel
+def linear_vortex_fields(x, y, x1, y1, cos_a, sin_a, length, gamma0, gamma1,
+                         u, v, psi, velocity, streamline):
+    # Velocity and streamfunction of linear vortex panels, summed in place
+    # without any (points, panels) temporary
+    for i in prange(len(x)):
+        u_sum = v_sum = psi_sum = 0.0
+        for j in range(len(x1)):
+            x_t = x[i] - x1[j]
+            y_t = y[i] - y1[j]
+            x_p = x_t * cos_a[j] - y_t * sin_a[j]
+            y_p = x_t * sin_a[j] + y_t * cos_a[j]
+            x_2 = x_p - length[j]
+
+            d_theta = math.atan2(y_p, x_2) - math.atan2(y_p, x_p)
+            y_sq = y_p * y_p
+            log_r1 = math.log(x_p * x_p + y_sq)
+            log_r2 = math.log(x_2 * x_2 + y_sq)
+            log_ratio = log_r1 - log_r2
+            g0 = gamma0[j] / (4 * math.pi)
+            g1 = gamma1[j] / (4 * math.pi)
+
+            if streamline:
+                linear = (.5 * (x_p * x_p - y_sq) * log_ratio + .5 * length[j]**2 * log_r2
+                          + 2 * x_p * y_p * d_theta - x_p * length[j])
+                constant = x_p * log_ratio + length[j] * log_r2 + 2 * y_p * d_theta
+                psi_sum += g1 * linear + g0 * constant
+
+            if velocity:
+                u_p = -g1 * (y_p * log_ratio - 2 * x_p * d_theta) + 2 * g0 * d_theta
+                v_p = -2 * g1 * (.5 * x_p * log_ratio - length[j] + y_p * d_theta) - g0 * log_ratio
+                u_sum += u_p * cos_a[j] + v_p * sin_a[j]
+                v_sum += v_p * cos_a[j] - u_p * sin_a[j]
+
+        if velocity:
+            u[i] += u_sum
+            v[i] += v_sum
+        if streamline:
+            psi[i] += psi_sum
+
+@_kernel
+def constant_source_fields(x, y, x1, y1, cos_a, sin_a, length, lambda_,
+                           u, v, psi, velocity, streamline):
+    # Velocity and streamfunction of constant source panels, summed in place
+    for i in prange(len(x)):
+        u_sum = v_sum = psi_sum = 0.0
+        for j in range(len(x1)):
+            x_t = x[i] - x1[j]
+            y_t = y[i] - y1[j]
+            x_p = x_t * cos_a[j] - y_t * sin_a[j]
+            y_p = x_t * sin_a[j] + y_t * cos_a[j]
+            x_2 = x_p - length[j]
+
+            theta1 = math.atan2(y_p, x_p)
+            theta2 = math.atan2(y_p, x_2)
+            y_sq = y_p * y_p
+            log_ratio = math.log(x_p * x_p + y_sq) - math.log(x_2 * x_2 + y_sq)
+
+            if streamline:
+                psi_sum -= (x_p * theta1 - x_2 * theta2 + .5 * y_p * log_ratio) * (lambda_[j] / (2 * math.pi))
+
+            if velocity:
+                u_p = log_ratio * (lambda_[j] / (4 * math.pi))
+                v_p = (theta2 - theta1) * (lambda_[j] / (2 * math.pi))
+                u_sum += u_p * cos_a[j] + v_p * sin_a[j]
+                v_sum += v_p * cos_a[j] - u_p * sin_a[j]
+
+        if velocity:
+            u[i] += u_sum
+            v[i] += v_sum
+        if streamline:
+            psi[i] += psi_sum
+
+@_kernel
+def influence_coefficients(x, y, n_x, n_y, x1, y1, cos_a, sin_a, length, left, right):
+    # Normal velocity at (x, y) along (n_x, n_y) of unit linear vortex
+    # densities at both ends of every panel, see linear_vortex_solver
+    for i in prange(len(x)):
+        for j in range(len(x1)):
+            x_t = x[i] - x1[j]
+            y_t = y[i] - y1[j]
+            x_p = x_t * cos_a[j] - y_t * sin_a[j]
+            y_p = x_t * sin_a[j] + y_t * cos_a[j]
+            x_2 = x_p - length[j]
+
+            d_theta = math.atan2(y_p, x_2) - math.atan2(y_p, x_p)
+            y_sq = y_p * y_p
+            log_ratio = math.log((x_p * x_p + y_sq) / (x_2 * x_2 + y_sq))
+
+            # Panel tangent and normal components of the normal
+            t_n = n_x[i] * cos_a[j] - n_y[i] * sin_a[j]
+            n_n = n_x[i] * sin_a[j] + n_y[i] * cos_a[j]
+
+            linear = ((y_p * log_ratio - 2 * x_p * d_theta) * t_n * (-1 / (4 * math.pi))
+                      + (.5 * x_p * log_ratio - length[j] + y_p * d_theta) * n_n * (-1 / (2 * math.pi)))
+            left[i, j] = linear / length[j]
+            right[i, j] = (d_theta * t_n * (1 / (2 * math.pi))
+                           + log_ratio * n_n * (-1 / (4 * math.pi)) - left[i, j])
+
+@_kernel
+def panel_set_fields(x, y, vertex_x, vertex_y, i1, i2, alpha, cos_a, sin_a, length,
+                     gamma0, gamma1, lambda_, u, v, psi, velocity, streamline):
+    # Velocity and streamfunction of a panel_set, summed in place. The angle
+    # and the log of the distance of a vertex are reused by the next panel
+    # when it starts where the previous one ended, as along a contour
+    for i in prange(len(x)):
+        u_sum = v_sum = psi_sum = 0.0
+        previous = -1
+        phi2 = log_r2 = 0.0
+        for j in range(len(i1)):
+            if i1[j] == previous:
+                phi1, log_r1 = phi2, log_r2
+            else:
+                dx = x[i] - vertex_x[i1[j]]
+                dy = y[i] - vertex_y[i1[j]]
+                phi1 = math.atan2(dy, dx)
+                log_r1 = math.log(dx * dx + dy * dy)
+            dx = x[i] - vertex_x[i2[j]]
+            dy = y[i] - vertex_y[i2[j]]
+            phi2 = math.atan2(dy, dx)
+            log_r2 = math.log(dx * dx + dy * dy)
+            previous = i2[j]
+
+            # Query point in the panel frame, from the first vertex
+            x_t = x[i] - vertex_x[i1[j]]
+            y_t = y[i] - vertex_y[i1[j]]
+            x_p = x_t * cos_a[j] - y_t * sin_a[j]
+            y_p = x_t * sin_a[j] + y_t * cos_a[j]
+
+            d_theta = phi2 - phi1
+            d_theta -= 2 * math.pi * round(d_theta / (2 * math.pi))
+            log_ratio = log_r1 - log_r2
+            g0 = gamma0[j] / (4 * math.pi)
+            g1 = gamma1[j] / (4 * math.pi)
+            s = lambda_[j] / (4 * math.pi)
+
+            if streamline:
+                psi_sum += g1 * (.5 * (x_p * x_p - y_p * y_p) * log_ratio + .5 * length[j]**2 * log_r2
+                                 + 2 * x_p * y_p * d_theta - x_p * length[j])
+                psi_sum += g0 * (x_p * log_ratio + length[j] * log_r2 + 2 * y_p * d_theta)
+                if s != 0:
+                    theta2 = phi2 - alpha[j]
+                    theta2 -= 2 * math.pi * round(theta2 / (2 * math.pi))
+                    psi_sum += s * (2 * x_p * d_theta - 2 * length[j] * theta2 - y_p * log_ratio)
+
+            if velocity:
+                u_p = -g1 * (y_p * log_ratio - 2 * x_p * d_theta) + 2 * g0 * d_theta + s * log_ratio
+                v_p = (-2 * g1 * (.5 * x_p * log_ratio - length[j] + y_p * d_theta) - g0 * log_ratio
+                       + 2 * s * d_theta)
+                u_sum += u_p * cos_a[j] + v_p * sin_a[j]
+                v_sum += v_p * cos_a[j] - u_p * sin_a[j]
+
+        if velocity:
+            u[i] += u_sum
+            v[i] += v_sum
+        if streamline:
+            psi[i] += psi_sum
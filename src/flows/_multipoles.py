@@ -0,0 +1,56 @@
+import numpy as np
+
+# Complex multipole expansions of linear vortex and constant source
+# panels, shared by panel_set and the treecode. Every panel is replaced by
+# Gauss points carrying complex strengths q, so that its complex potential
+# is sum(q * log(z - zeta)), and a cluster of them by its moments
+# mu_k = sum(q * (zeta - zc)^k) around a center zc
+
+def gauss_points(order):
+    """Gauss nodes and weights on [0, 1], exact for the moments of linear densities up to order."""
+    nodes, weights = np.polynomial.legendre.leggauss(order // 2 + 2)
+    return (nodes + 1) / 2, weights / 2
+
+def panel_points(z1, z2, nodes):
+    """(panels, nodes) complex Gauss points of the panels from z1 to z2."""
+    return z1[:, np.newaxis] + (z2 - z1)[:, np.newaxis] * nodes
+
+def panel_strengths(length, gamma_a, gamma_b, lambda_, nodes, weights):
+    """
+    (panels, nodes) complex strengths of the Gauss points of the vortex
+    part and of the source part of the panels.
+    """
+    gamma = gamma_a[:, np.newaxis] + (gamma_b - gamma_a)[:, np.newaxis] * nodes
+    scale = weights * length[:, np.newaxis] / (2 * np.pi)
+    return 1j * gamma * scale, lambda_[:, np.newaxis] * scale
+
+def vortex_offsets(length, gamma_a, gamma_b):
+    """
+    Constant by which the streamfunction of every linear vortex panel
+    differs from the integral of its point vortices.
+    """
+    return length * (3 * gamma_a + gamma_b) / (8 * np.pi)
+
+def powers(points, center, order):
+    """(points, order + 1) powers (zeta - zc)^k, the moments are strengths @ powers."""
+    return np.vander((np.ravel(points) - center), order + 1, increasing=True)
+
+def far_velocity(moments, inverse):
+    """Conjugate velocity sum(mu_k / (z - zc)^(k+1)), inverse being 1 / (z - zc)."""
+    result = np.full(len(inverse), moments[-1])
+    for moment in moments[-2::-1]:
+        result = result * inverse + moment
+    return result * inverse
+
+def far_streamline(vortex_moments, inverse, offset=0):
+    """
+    Streamfunction of the vortex moments, the imaginary part of
+    mu_0 log(z - zc) - sum(mu_k / k / (z - zc)^k), plus the offset of
+    their panels (vortex_offsets).
+    """
+    moments = vortex_moments / np.maximum(np.arange(len(vortex_moments)), 1)
+    result = np.full(len(inverse), -moments[-1])
+    for moment in moments[-2:0:-1]:
+        result = result * inverse - moment
+    result = result * inverse
+    return -moments[0].imag * np.log(np.abs(inverse)) + result.imag + offset
@@ -0,0 +1,121 @@
+import numpy as np
+from ._kernels import get_kernel
+
+class _panel:
+    """
+    Geometry shared by the panel flows: endpoints, lengths and the rotation
+    into every panel frame, computed once at construction.
+
+    Every array is stored, and every field evaluated, in dtype. Summed
+    fields go through the loop kernel _kernel_name when a loop backend is
+    selected (see set_kernel_backend).
+    """
+    def __init__(self, p1, p2, dtype=np.float64):
+        # Convert inputs to numpy arrays
+        self.dtype = np.dtype(dtype)
+        p1 = np.asarray(p1, dtype=self.dtype)
+        p2 = np.asarray(p2, dtype=self.dtype)
+
+        # Ensure inputs are 2D arrays for multi-panel handling
+        # This step allows us to use numpy's vectorization
+        # so we don't loop over each panel twice when solving
+        if p1.ndim == 1:
+            p1 = p1.reshape(1, -1)
+        if p2.ndim == 1:
+            p2 = p2.reshape(1, -1)
+
+        # Geometric vertex data (arrays)
+        self.x1 = p1[:, 0]
+        self.y1 = p1[:, 1]
+        self.x2 = p2[:, 0]
+        self.y2 = p2[:, 1]
+
+        # Geometric panel data
+        dx = self.x2 - self.x1
+        dy = self.y2 - self.y1
+        self.length = np.hypot(dx, dy)
+        self.alpha_panel = np.arctan2(dy, dx)
+
+        # Rotation by -alpha_panel, into the panel frames
+        self.cos_a = np.cos(-self.alpha_panel)
+        self.sin_a = np.sin(-self.alpha_panel)
+
+    def _transform_coordinates(self, x, y):
+        # Translate and rotate coordinates for all panels
+        x_trans = np.asarray(x, dtype=self.dtype)[..., np.newaxis] - self.x1
+        y_trans = np.asarray(y, dtype=self.dtype)[..., np.newaxis] - self.y1
+
+        x_p = x_trans * self.cos_a
+        x_p -= y_trans * self.sin_a
+        y_p = np.multiply(x_trans, self.sin_a, out=x_trans)
+        y_p += np.multiply(y_trans, self.cos_a, out=y_trans)
+        return x_p, y_p
+
+    def _panel_terms(self, x, y):
+        # Coordinates in every panel frame with the angles and the log of
+        # the squared distances to both ends, shared by every kernel
+        x_p, y_p = self._transform_coordinates(x, y)
+        x_2 = x_p - self.length
+
+        theta1 = np.arctan2(y_p, x_p)
+        theta2 = np.arctan2(y_p, x_2)
+
+        y_sq = y_p * y_p
+        log_r1 = np.multiply(x_p, x_p)
+        log_r1 += y_sq
+        np.log(log_r1, out=log_r1)
+        log_r2 = np.multiply(x_2, x_2, out=x_2)
+        log_r2 += y_sq
+        np.log(log_r2, out=log_r2)
+        return x_p, y_p, theta1, theta2, log_r1, log_r2
+
+    def _to_global(self, u_p, v_p):
+        # Rotate panel frame velocities back, in place
+        u_global = u_p * self.cos_a
+        u_global += v_p * self.sin_a
+        v_p *= self.cos_a
+        v_p -= np.multiply(u_p, self.sin_a, out=u_p)
+        return u_global, v_p
+
+    def _endpoints(self):
+        return np.column_stack((self.x1, self.y1)), np.column_stack((self.x2, self.y2))
+
+    def velocity(self, x, y):
+        u, v, _ = self._fields(x, y, velocity=True, streamline=False)
+        return u, v
+
+    def streamline(self, x, y):
+        _, _, psi = self.evaluate(x, y, velocity=False, streamline=True)
+        return psi
+
+    def _loop_fields(self, x, y, velocity, streamline):
+        # Summed fields through the loop kernel of the current backend,
+        # None when the numpy expressions are used
+        kernel = get_kernel(self._kernel_name)
+        if kernel is None:
+            return None
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=self.dtype), np.asarray(y, dtype=self.dtype))
+        shape = x.shape
+        x, y = x.ravel(), y.ravel()
+        requested = (velocity, velocity, streamline)
+        fields = [np.zeros(len(x) if flag else 0, dtype=self.dtype) for flag in requested]
+        strengths = [np.broadcast_to(strength, self.length.shape) for strength in self._kernel_strengths()]
+        kernel(x, y, self.x1, self.y1, self.cos_a, self.sin_a, self.length, *strengths,
+               *fields, velocity, streamline)
+        return tuple(field.reshape(shape) if flag else None for field, flag in zip(fields, requested))
+
+    def evaluate(self, x, y, velocity=True, streamline=True):
+        """
+        Velocity and streamfunction summed over the panels, in a single pass
+        over the terms they share. Quantities that are not requested are None.
+        """
+        fields = self._loop_fields(x, y, velocity, streamline)
+        if fields is not None:
+            return fields
+
+        u, v, psi = self._fields(x, y, velocity, streamline)
+        if velocity:
+            u, v = np.sum(u, axis=-1), np.sum(v, axis=-1)
+        if streamline:
+            psi = np.sum(psi, axis=-1)
+        return u, v, psi
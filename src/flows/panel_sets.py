@@ -0,0 +1,313 @@
+import numpy as np
+from .linear_flows import linear_vortex
+from .constant_flows import constant_source
+from ._kernels import get_kernel
+from ._multipoles import (gauss_points, panel_points, panel_strengths, vortex_offsets, powers,
+                          far_velocity, far_streamline)
+
+class panel_set:
+    """
+    Linear vortex and constant source panels stored contiguously and
+    evaluated as a single flow.
+
+    Panels usually share their endpoints, so the angles and the log of the
+    distances from a query point, the costly part of every panel kernel,
+    are computed once per distinct vertex instead of twice per panel. The
+    panels are split in blocks of panels_per_block, and query points in
+    tiles, so that the (panels, points) temporaries of a block stay in the
+    processor caches. Every quantity is then a weighted sum over the
+    panels of a few shared terms, with weights fixed at construction.
+
+    velocity, streamline and evaluate return fields summed over the panels.
+
+    With a tolerance, the whole set is also expanded in complex multipoles
+    of the given order around its center. Points farther than
+    far_distance, chosen so that the truncation error stays below
+    tolerance times the total strength over the distance, use the
+    expansion instead of the panels. The streamfunction of sources has no
+    single valued expansion and is always integrated exactly.
+
+    The panels are described in float64, the near field is evaluated in
+    dtype and the expansion always in complex128. With a loop backend (see
+    set_kernel_backend) the near field goes through the fused panel loops
+    instead of the blocks.
+    """
+    def __init__(self, p1, p2, gamma_a=0, gamma_b=0, lambda_=0,
+                 panels_per_block=64, block_elements=2**15, tolerance=None, order=8,
+                 dtype=np.float64):
+        p1 = np.atleast_2d(np.asarray(p1, dtype=float))
+        p2 = np.atleast_2d(np.asarray(p2, dtype=float))
+        n = len(p1)
+        self.gamma_a = np.broadcast_to(np.asarray(gamma_a, dtype=float), n)
+        self.gamma_b = np.broadcast_to(np.asarray(gamma_b, dtype=float), n)
+        self.lambda_ = np.broadcast_to(np.asarray(lambda_, dtype=float), n)
+        self.panels_per_block = panels_per_block
+        self.block_elements = block_elements
+        self.dtype = np.dtype(dtype)
+
+        # Geometric vertex data (arrays)
+        self.x1, self.y1 = p1[:, 0], p1[:, 1]
+        self.x2, self.y2 = p2[:, 0], p2[:, 1]
+
+        # Geometric panel data
+        dx = self.x2 - self.x1
+        dy = self.y2 - self.y1
+        self.length = np.hypot(dx, dy)
+        self.alpha_panel = np.arctan2(dy, dx)
+
+        # Distinct vertices, and both ends of every panel among them
+        self.vertex, ends = np.unique(np.vstack((p1, p2)), axis=0, return_inverse=True)
+        ends = ends.reshape(2, n)
+        self._ends = ends
+
+        self._blocks = [self._create_block(slice(start, min(start + panels_per_block, n)), ends)
+                        for start in range(0, n, panels_per_block)]
+
+        self.tolerance = tolerance
+        self.order = order
+        if tolerance is not None:
+            self._create_moments()
+
+    def _create_moments(self):
+        # Complex strengths of Gauss points exact for the moments up to order
+        nodes, weights = gauss_points(self.order)
+        z1, z2 = self.x1 + 1j * self.y1, self.x2 + 1j * self.y2
+        vortex_strengths, source_strengths = panel_strengths(self.length, self.gamma_a, self.gamma_b,
+                                                             self.lambda_, nodes, weights)
+        vortex_strengths = vortex_strengths.ravel()
+        strengths = vortex_strengths + source_strengths.ravel()
+
+        box = np.concatenate((z1, z2))
+        self.center = (box.real.min() + box.real.max()) / 2 + 1j * (box.imag.min() + box.imag.max()) / 2
+        self.radius = np.max(np.abs(box - self.center))
+
+        # Moments of every element and of the vortices alone (the streamfunction)
+        point_powers = powers(panel_points(z1, z2, nodes), self.center, self.order)
+        self.moments = strengths @ point_powers
+        self.vortex_moments = vortex_strengths @ point_powers
+        self.offset = np.sum(vortex_offsets(self.length, self.gamma_a, self.gamma_b))
+
+        # Truncation error below r^(p+1) / (1 - r), r = radius / distance
+        ratio = .5
+        for _ in range(100):
+            ratio = (self.tolerance * (1 - ratio))**(1 / (self.order + 1))
+        self.far_distance = self.radius / ratio
+
+        if np.any(self.lambda_ != 0):
+            self._sources = panel_set(np.column_stack((self.x1, self.y1)),
+                                      np.column_stack((self.x2, self.y2)),
+                                      lambda_=self.lambda_,
+                                      panels_per_block=self.panels_per_block,
+                                      block_elements=self.block_elements, dtype=self.dtype)
+        else:
+            self._sources = None
+
+    def _far_field(self, x, y, velocity, streamline):
+        # Multipole expansion around the center of the set
+        inverse = 1 / (x + 1j * y - self.center)
+        u = v = psi = None
+        if velocity:
+            w = far_velocity(self.moments, inverse)
+            u, v = w.real, -w.imag
+        if streamline:
+            psi = far_streamline(self.vortex_moments, inverse, self.offset)
+            if self._sources is not None:
+                psi += self._sources.streamline(x, y)
+        return u, v, psi
+
+    def _create_block(self, panels, ends):
+        block = {}
+        # Vertices of the block in order of first appearance, so that the
+        # panels of a contour index them with slices instead of copies
+        interleaved = ends[:, panels].T.ravel()
+        vertices, first, local = np.unique(interleaved, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        vertices, local = vertices[order], rank[local].reshape(-1, 2).T
+        block['x'], block['y'] = self.vertex[vertices, 0, np.newaxis], self.vertex[vertices, 1, np.newaxis]
+
+        nb_panels = local.shape[1]
+        if (np.array_equal(local[0], np.arange(nb_panels))
+                and np.array_equal(local[1], np.arange(1, nb_panels + 1))):
+            block['i1'], block['i2'] = slice(0, nb_panels), slice(1, nb_panels + 1)
+        else:
+            block['i1'], block['i2'] = local
+
+        length, alpha = self.length[panels], self.alpha_panel[panels]
+        cos_a, sin_a = np.cos(-alpha)[:, np.newaxis], np.sin(-alpha)[:, np.newaxis]
+        block['cos_a'], block['sin_a'], block['alpha'] = cos_a, sin_a, alpha[:, np.newaxis]
+
+        # Strengths over 4 pi, gamma0 + gamma1 * s along every panel
+        g0 = self.gamma_a[panels] / (4 * np.pi)
+        g1 = (self.gamma_b[panels] - self.gamma_a[panels]) / length / (4 * np.pi)
+        s = self.lambda_[panels] / (4 * np.pi)
+
+        # Panel frame velocity as weights of the shared terms, with
+        # lr = log(r1^2 / r2^2) and dt = theta2 - theta1
+        u_p = {'y_lr': -g1, 'x_dt': 2 * g1, 'dt': 2 * g0, 'lr': s}
+        v_p = {'x_lr': -g1, 'y_dt': -2 * g1, 'lr': -g0, 'dt': 2 * s}
+        block['has_sources'] = np.any(s != 0)
+
+        # Rotated to global coordinates, v_p also has a constant part
+        names = ('y_lr', 'x_dt', 'dt', 'lr', 'x_lr', 'y_dt')
+        zero = np.zeros_like(g0)
+        c, sn = cos_a[:, 0], sin_a[:, 0]
+        block['u'] = np.array([c * u_p.get(name, zero) + sn * v_p.get(name, zero) for name in names])
+        block['v'] = np.array([-sn * u_p.get(name, zero) + c * v_p.get(name, zero) for name in names])
+        block['u_constant'] = float(np.sum(sn * 2 * g1 * length))
+        block['v_constant'] = float(np.sum(c * 2 * g1 * length))
+
+        # Streamfunction, with h_lr = (x^2 - y^2) / 2 * lr
+        block['psi'] = np.array((g1, .5 * g1 * length**2 + g0 * length, 2 * g1, -g1 * length,
+                                 g0, 2 * g0, 2 * s, -2 * s * length, -s))
+
+        # Weights and vertices are computed in float64, stored in dtype
+        for name in ('x', 'y', 'cos_a', 'sin_a', 'alpha', 'u', 'v', 'psi'):
+            block[name] = block[name].astype(self.dtype)
+        return block
+
+    def _block_terms(self, block, x, y, velocity, streamline):
+        # Vertex terms, once for the panels that share them
+        dx = x - block['x']
+        dy = y - block['y']
+        phi = np.arctan2(dy, dx)
+        log_r = np.multiply(dx, dx)
+        log_r += np.multiply(dy, dy)
+        np.log(log_r, out=log_r)
+
+        # Query points in every panel frame
+        i1, i2 = block['i1'], block['i2']
+        cos_a, sin_a = block['cos_a'], block['sin_a']
+        x_1, y_1 = dx[i1], dy[i1]
+        x_p = x_1 * cos_a
+        x_p -= y_1 * sin_a
+        y_p = np.multiply(x_1, sin_a, out=x_1)
+        y_p += np.multiply(y_1, cos_a, out=y_1)
+
+        # theta2 - theta1, the angle under which the panel is seen
+        d_theta = phi[i2] - phi[i1]
+        d_theta -= 2 * np.pi * np.rint(d_theta / (2 * np.pi))
+        log_ratio = log_r[i1] - log_r[i2]
+
+        terms = {'y_lr': y_p * log_ratio, 'x_dt': x_p * d_theta,
+                 'x_lr': x_p * log_ratio, 'y_dt': y_p * d_theta}
+        if velocity:
+            terms['dt'], terms['lr'] = d_theta, log_ratio
+        if streamline:
+            half_sq = x_p * x_p
+            half_sq -= y_p * y_p
+            half_sq *= .5
+            terms['h_lr'] = np.multiply(half_sq, log_ratio, out=half_sq)
+            terms['lr2'] = log_r[i2]
+            terms['xy_dt'] = x_p * terms['y_dt']
+            terms['x'] = x_p
+            if block['has_sources']:
+                # theta2 in the panel frame, for the source streamfunction
+                theta2 = phi[i2] - block['alpha']
+                theta2 -= 2 * np.pi * np.rint(theta2 / (2 * np.pi))
+                terms['theta2'] = theta2
+        return terms
+
+    def _tiles(self, nb_points):
+        tile_size = max(1, self.block_elements // self.panels_per_block)
+        for start in range(0, nb_points, tile_size):
+            yield slice(start, min(start + tile_size, nb_points))
+
+    def _loop_arrays(self):
+        # Vertices, panel frames and strengths in dtype, the arguments of
+        # the loop kernel
+        if not hasattr(self, '_loop_inputs'):
+            gamma1 = (self.gamma_b - self.gamma_a) / self.length
+            alpha = self.alpha_panel
+            arrays = (self.vertex[:, 0], self.vertex[:, 1], self._ends[0], self._ends[1],
+                      alpha, np.cos(-alpha), np.sin(-alpha), self.length,
+                      self.gamma_a, gamma1, self.lambda_)
+            self._loop_inputs = tuple(np.ascontiguousarray(array, dtype=self.dtype)
+                                      if array.dtype.kind == 'f' else np.ascontiguousarray(array)
+                                      for array in arrays)
+        return self._loop_inputs
+
+    def _loop_near_field(self, x, y, velocity, streamline):
+        # Every panel integrated exactly by the loop kernel
+        requested = (velocity, velocity, streamline)
+        fields = [np.zeros(len(x) if flag else 0, dtype=self.dtype) for flag in requested]
+        get_kernel('panel_set_fields')(x, y, *self._loop_arrays(), *fields, velocity, streamline)
+        return tuple(field if flag else None for field, flag in zip(fields, requested))
+
+    def _near_field(self, x, y, velocity, streamline):
+        if get_kernel('panel_set_fields') is not None:
+            return self._loop_near_field(x, y, velocity, streamline)
+
+        # Every panel integrated exactly, block by block
+        u = np.zeros(len(x), dtype=self.dtype) if velocity else None
+        v = np.zeros(len(x), dtype=self.dtype) if velocity else None
+        psi = np.zeros(len(x), dtype=self.dtype) if streamline else None
+
+        velocity_names = ('y_lr', 'x_dt', 'dt', 'lr', 'x_lr', 'y_dt')
+        psi_names = ('h_lr', 'lr2', 'xy_dt', 'x', 'x_lr', 'y_dt', 'x_dt', 'theta2', 'y_lr')
+        for tile in self._tiles(len(x)):
+            for block in self._blocks:
+                terms = self._block_terms(block, x[tile], y[tile], velocity, streamline)
+                if velocity:
+                    for name, u_weights, v_weights in zip(velocity_names, block['u'], block['v']):
+                        u[tile] += u_weights @ terms[name]
+                        v[tile] += v_weights @ terms[name]
+                    u[tile] += block['u_constant']
+                    v[tile] += block['v_constant']
+                if streamline:
+                    for name, weights in zip(psi_names, block['psi']):
+                        if name in terms:
+                            psi[tile] += weights @ terms[name]
+        return u, v, psi
+
+    def evaluate(self, x, y, velocity=True, streamline=True):
+        """
+        Velocity and streamfunction summed over the panels, in a single pass
+        over the terms they share. Quantities that are not requested are None.
+        """
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=self.dtype), np.asarray(y, dtype=self.dtype))
+        shape = x.shape
+        x, y = x.ravel(), y.ravel()
+
+        if self.tolerance is None:
+            fields = self._near_field(x, y, velocity, streamline)
+        else:
+            far = np.abs(x + 1j * y - self.center) > self.far_distance
+            fields = []
+            near_fields = self._near_field(x[~far], y[~far], velocity, streamline)
+            far_fields = self._far_field(x[far], y[far], velocity, streamline)
+            for near_field, far_field in zip(near_fields, far_fields):
+                field = None
+                if near_field is not None:
+                    field = np.empty(len(x), dtype=self.dtype)
+                    field[~far], field[far] = near_field, far_field
+                fields.append(field)
+
+        return tuple(None if field is None else field.reshape(shape) for field in fields)
+
+    def velocity(self, x, y):
+        u, v, _ = self.evaluate(x, y, velocity=True, streamline=False)
+        return u, v
+
+    def streamline(self, x, y):
+        _, _, psi = self.evaluate(x, y, velocity=False, streamline=True)
+        return psi
+
+    def astype(self, dtype):
+        """The same panel set, evaluated in dtype."""
+        return panel_set(np.column_stack((self.x1, self.y1)), np.column_stack((self.x2, self.y2)),
+                         self.gamma_a, self.gamma_b, self.lambda_, self.panels_per_block,
+                         self.block_elements, self.tolerance, self.order, dtype)
+
+    def panels(self):
+        """The same panels as linear_vortex and constant_source flows."""
+        p1 = np.column_stack((self.x1, self.y1))
+        p2 = np.column_stack((self.x2, self.y2))
+        flows = []
+        if np.any(self.gamma_a != 0) or np.any(self.gamma_b != 0):
+            flows.append(linear_vortex(np.array(self.gamma_a), np.array(self.gamma_b), p1, p2,
+                                       dtype=self.dtype))
+        if np.any(self.lambda_ != 0):
+            flows.append(constant_source(np.array(self.lambda_), p1, p2, dtype=self.dtype))
+        return flows
@@ -0,0 +1,36 @@
+import numpy as np
+
+def _points_in_polygon(polygon, x, y):
+    # Even-odd rule, the polygon is closed between its last and first
+    # points. Points are sorted by height once, so every edge only
+    # visits the points in its height range instead of all of them
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    shape = x.shape
+    x, y = x.ravel(), y.ravel()
+    inside = np.zeros(len(x), dtype=bool)
+
+    polygon = np.asarray(polygon, dtype=float)
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+    # Only the points in the bounding box can be inside
+    low, high = polygon.min(axis=0), polygon.max(axis=0)
+    candidates = np.flatnonzero((x >= low[0]) & (x <= high[0]) & (y >= low[1]) & (y <= high[1]))
+    order = candidates[np.argsort(y[candidates], kind='stable')]
+    y_sorted = y[order]
+
+    # Points with min(y1, y2) <= y < max(y1, y2) for every edge,
+    # horizontal edges never cross
+    starts = np.searchsorted(y_sorted, np.minimum(y1, y2), side='left')
+    stops = np.searchsorted(y_sorted, np.maximum(y1, y2), side='left')
+    counts = stops - starts
+    edges = np.repeat(np.arange(len(x1)), counts)
+    offsets = np.arange(len(edges)) - np.repeat(np.cumsum(counts) - counts, counts)
+    points = order[starts[edges] + offsets]
+
+    # A crossing when the edge passes on the right of the point
+    x_a, y_a = x1[edges], y1[edges]
+    slope = (x2[edges] - x_a) / (y2[edges] - y_a)
+    crossing = x[points] < x_a + (y[points] - y_a) * slope
+    inside[np.bincount(points[crossing], minlength=len(x)) % 2 == 1] = True
+    return inside.reshape(shape)
@@ -2,6 +2,7 @@ import numpy as np
 from ._interpolate import _interpolate
 from ._transformations import _normalize_and_center, _rotate_around_ahalf
 from ._naca import _naca4
+from ._polygon import _points_in_polygon
 
 class geometry:
     def __init__(self, nb_vertex=256, angle=0):
@@ -56,3 +57,7 @@ class geometry:
     def update_nbpoints(self, new_nb):
         self.nb_vertex = new_nb
         self._initialize()
+
+    def contains(self, x, y):
+        """Boolean array, True for the points inside the rotated geometry."""
+        return _points_in_polygon(self.get_rotated_vertex(), x, y)
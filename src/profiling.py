@@ -0,0 +1,139 @@
+"""
+Lightweight timing spans for the solver and the webapp callbacks.
+
+Spans nest: a span opened inside another one is recorded under the path
+'outer/inner', so every stage is attributed to the callback or the call
+that ran it. Each path aggregates a latency histogram (see stats), and
+every closed span is also logged as a JSON record on the 'src.profiling'
+logger, at INFO for the outermost spans and DEBUG for the others.
+Other quantities, e.g. payload sizes, are aggregated by record.
+
+Profiling is off unless enable() is called or the FLOW_SOLVER_PROFILING
+environment variable is set to 1. A disabled span costs a global lookup
+and a shared no-op context manager.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, float('inf'))
+
+# Upper bounds of the buckets of recorded sizes, in bytes
+SIZE_BUCKETS = (1e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6, 1e7, float('inf'))
+
+_enabled = os.environ.get('FLOW_SOLVER_PROFILING') == '1'
+_lock = threading.Lock()
+_histograms = {}
+_local = threading.local()
+
+class _histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def summary(self):
+        return {'count': self.count, 'total': self.total, 'mean': self.total / self.count,
+                'max': self.max,
+                'buckets': {str(bound): count for bound, count in zip(self.buckets, self.counts)}}
+
+class _null_span:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+_NULL_SPAN = _null_span()
+
+class _span:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = f'{stack[-1]}/{self.name}' if stack else self.name
+        stack.append(self.path)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        seconds = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+        with _lock:
+            if self.path not in _histograms:
+                _histograms[self.path] = _histogram()
+            _histograms[self.path].add(seconds)
+
+        level = logging.DEBUG if stack else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps({'span': self.path, 'seconds': seconds,
+                                          'error': exception[0] is not None}))
+        return False
+
+def span(name):
+    """Context manager timing the enclosed block under name."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _span(name)
+
+def timed(name):
+    """Decorator timing every call of a function under name."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(name, value, buckets=SIZE_BUCKETS):
+    """Aggregate a value, e.g. a size in bytes, under name when enabled."""
+    if not _enabled:
+        return
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = _histogram(buckets)
+        _histograms[name].add(value)
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def stats():
+    """Histogram and totals of every span path and recorded name."""
+    with _lock:
+        return {path: histogram.summary() for path, histogram in sorted(_histograms.items())}
+
+def reset():
+    with _lock:
+        _histograms.clear()
@@ -1,17 +1,10 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.path
+from .geometry._polygon import _points_in_polygon
 
 def create_mask_poly(foil, x_grid, y_grid):
-    # Flatten grid coordinates into (N, 2) array of points
-    points = np.column_stack((x_grid.ravel(), y_grid.ravel()))
-    
-    # Create Path object and check containment
-    path = matplotlib.path.Path(foil)
-    mask = path.contains_points(points)
-    
-    # Reshape mask back to original grid shape
-    return mask.reshape(x_grid.shape)
+    # True for the grid points inside the foil
+    return _points_in_polygon(foil, x_grid, y_grid)
 
 
 def plot_heightmap(result, x_grid, y_grid, foil=None, levels=None):
@@ -0,0 +1,36 @@
+import src
+import numpy as np
+from time import time
+
+# Streamfunction and speed around a solved airfoil on a 600 x 600 raster,
+# evaluated everywhere and sampled by the adaptive quadtree
+n = 256
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/2412.dat')
+solver = src.linear_vortex_solver(geometry)
+geometry.set_angle_deg(-6)
+gammas = solver.solve(-geometry.angle)
+
+rotated_vertex = geometry.get_rotated_vertex()
+flows = [src.flows.freestream(1),
+         src.flows.panel_set(rotated_vertex, np.roll(rotated_vertex, -1, axis=0),
+                             gammas, np.roll(gammas, -1))]
+x_points, y_points = np.linspace(-0.5, 1.5, 600), np.linspace(-1, 1, 600)
+x_grid, y_grid = np.meshgrid(x_points, y_points)
+mask = geometry.contains(x_grid, y_grid)
+
+start = time()
+uniform = src.compute_fields(flows, x_grid, y_grid, ('psi', 'speed'), mask=mask)
+print(f'Uniform grid : {np.count_nonzero(~mask)} evaluations, took {time() - start} seconds')
+
+for threshold in (1e-2, 1e-3, 1e-4):
+    start = time()
+    adaptive, nb_evaluations = src.compute_adaptive_fields(flows, x_points, y_points, ('psi', 'speed'),
+                                                           threshold=threshold, body=rotated_vertex,
+                                                           mask=mask)
+    print(f'Threshold {threshold} : {nb_evaluations} evaluations '
+          f'({nb_evaluations / np.count_nonzero(~mask):.1%}), took {time() - start} seconds')
+    for name in ('psi', 'speed'):
+        error = np.max(np.abs(adaptive[name] - uniform[name]))
+        print(f'  {name} max error : {error}')
+        assert error < 4 * threshold
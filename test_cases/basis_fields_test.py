@@ -0,0 +1,43 @@
+import src
+import numpy as np
+from time import time
+from webapp import utils
+from webapp.utils import basis_fields, compute_flow, get_basis_fields
+
+# Flow plots of the angle slider, interpolated from the two basis fields
+# in the body frame, against the fields of the rotated airfoil. Exterior
+# points next to the surface must not pick up the interior samples
+geometry = src.geometry(nb_vertex=256)
+geometry.load_txt('examples/2412.dat')
+solver = src.linear_vortex_solver(geometry)
+fields = basis_fields(geometry.vertex, *solver.solve_basis(), resolution=200)
+
+# The largest errors are left at a few points next to the surface, a
+# broken interpolation would show in the bulk of the points
+for mode, max_error in (('velocities', 3.5e-2), ('streamlines', 5e-3)):
+    for angle in (-3, 8):
+        geometry.set_angle_deg(-angle)
+        gammas = solver.solve(-geometry.angle)
+        start = time()
+        _, _, interpolated = fields.evaluate(mode, -geometry.angle)
+        elapsed = time() - start
+        _, _, direct = compute_flow(mode, gammas, geometry.get_rotated_vertex(), 200)
+
+        assert np.array_equal(np.ma.getmaskarray(interpolated), np.ma.getmaskarray(direct))
+        errors = np.abs(interpolated - direct).compressed()
+        error, bulk_error = np.max(errors), np.percentile(errors, 99)
+        print(f'{mode} at {angle} degrees : error {error:.2e}, 99th percentile '
+              f'{bulk_error:.2e}, took {elapsed} seconds')
+        assert error < max_error, (mode, angle, error)
+        assert bulk_error < 1e-3, (mode, angle, bulk_error)
+
+# The cache evicts the least recently used fields beyond its memory
+# budget, counting the fields evaluated after their entry was cached
+utils.BASIS_CACHE_MEMORY = fields.nbytes
+utils._basis_cache.clear()
+for resolution in (200, 150, 100):
+    get_basis_fields(geometry.vertex, resolution, lambda: solver).evaluate('velocities', 0)
+get_basis_fields(geometry.vertex, 100, lambda: solver)
+memory = sum(cached.nbytes for cached in utils._basis_cache.values())
+print(f'{len(utils._basis_cache)} cached basis fields, {memory / 2**20:.1f} MB')
+assert len(utils._basis_cache) < 3 and memory <= utils.BASIS_CACHE_MEMORY
@@ -0,0 +1,71 @@
+import json
+import src
+import numpy as np
+from time import time
+from flask import Flask
+from webapp import solver_cache, register_batch_api
+from webapp.api import MAX_CASES, MAX_PANEL_COUNTS, MAX_PANELS, MIN_PANELS
+
+# Batch NDJSON API: one line per case and panel count, streamed as they
+# are solved, error lines for the invalid cases, limits per request
+server = Flask(__name__)
+cache = solver_cache()
+register_batch_api(server, cache)
+client = server.test_client()
+
+def post(cases):
+    response = client.post('/api/solve', json={'cases': cases})
+    assert response.status_code != 200 or response.is_streamed
+    lines = [json.loads(line) for line in response.data.decode().splitlines()] \
+        if response.mimetype == 'application/x-ndjson' else None
+    return response.status_code, lines
+
+cases = [{'id': 'naca', 'naca': '2412', 'panels': [64, 255], 'angles': [-5, 0, 5]},
+         {'id': 'dat', 'dat': open('examples/2412.dat').read(), 'angles': [5],
+          'outputs': ['cl', 'gammas']},
+         {'id': 'single output', 'naca': '0012', 'outputs': 'cl'},
+         {'id': 'no panels', 'naca': '0012', 'panels': []},
+         {'id': 'too many panel counts', 'naca': '0012',
+          'panels': list(range(3, 4 + MAX_PANEL_COUNTS))},
+         {'id': 'text panels', 'naca': '0012', 'panels': 'many'},
+         {'id': 'unknown output', 'naca': '0012', 'outputs': ['lift']},
+         {'id': 'two geometries', 'naca': '0012', 'vertices': [[0, 0], [1, 0], [0, 1]]},
+         {'id': 'one column dat', 'dat': '1\n2\n3\n'},
+         {'id': 'too few panels', 'naca': '0012', 'panels': MIN_PANELS - 1},
+         {'id': 'fewest panels', 'naca': '0012', 'panels': MIN_PANELS},
+         'not a case']
+start = time()
+status, lines = post(cases)
+print(f'{len(lines)} lines, took {time() - start} seconds')
+assert status == 200
+assert [line['index'] for line in lines] == [0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
+by_id = {}
+for line in lines:
+    by_id.setdefault(line.get('id'), []).append(line)
+
+# The solved cases, against the solver
+assert [line['panels'] for line in by_id['naca']] == [64, 255]
+assert len(by_id['naca'][1]['cl']) == 3
+geometry = src.geometry(nb_vertex=256)
+geometry.load_txt('examples/2412.dat')
+geometry.set_angle_deg(-5)
+gammas = src.linear_vortex_solver(geometry).solve(-geometry.angle)
+line = by_id['dat'][0]
+assert set(line) == {'index', 'id', 'panels', 'angles', 'key', 'cl', 'gammas'}
+assert np.isclose(line['cl'][0], src.compute_coefficients(geometry, gammas)[0])
+assert np.allclose(line['gammas'][0], gammas)
+assert set(by_id['single output'][0]) == {'index', 'id', 'panels', 'angles', 'key', 'cl'}
+assert 'cl' in by_id['fewest panels'][0]
+
+# One error line per invalid case, the other cases are still solved
+for name in ('no panels', 'too many panel counts', 'text panels', 'unknown output',
+             'two geometries', 'one column dat', 'too few panels'):
+    assert len(by_id[name]) == 1 and 'error' in by_id[name][0], by_id[name]
+    print(f"{name} : {by_id[name][0]['error']}")
+assert 'error' in by_id[None][0]
+
+# Limits of a whole request
+assert post([{'naca': '0012'}] * (MAX_CASES + 1))[0] == 413
+assert post([{'naca': '0012', 'panels': [MAX_PANELS] * MAX_PANEL_COUNTS}])[0] == 413
+assert client.post('/api/solve', data='not json').status_code == 400
+assert client.post('/api/solve', json={'cases': {}}).status_code == 400
@@ -0,0 +1,46 @@
+import src
+import numpy as np
+from time import time
+
+# Streamlines around a solved airfoil, as iso-lines of the streamfunction
+# extracted on a 400 x 400 grid and traced from upstream by RK4
+n = 256
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/2412.dat')
+solver = src.linear_vortex_solver(geometry)
+geometry.set_angle_deg(-6)
+gammas = solver.solve(-geometry.angle)
+
+rotated_vertex = geometry.get_rotated_vertex()
+flows = [src.flows.freestream(1),
+         src.flows.panel_set(rotated_vertex, np.roll(rotated_vertex, -1, axis=0),
+                             gammas, np.roll(gammas, -1))]
+x_points, y_points = np.linspace(-0.5, 1.5, 400), np.linspace(-1, 1, 400)
+x_grid, y_grid = np.meshgrid(x_points, y_points)
+mask = geometry.contains(x_grid, y_grid)
+psi = src.compute_fields(flows, x_grid, y_grid, ('psi',), mask=mask)['psi'].filled(np.nan)
+levels = np.round(np.arange(-.8, .85, .2), 10)
+
+for tolerance in (None, 1e-3):
+    start = time()
+    contours = src.extract_contours(x_points, y_points, psi, levels, tolerance=tolerance)
+    nb_points = sum(len(line) for lines in contours.values() for line in lines)
+    print(f'Contours, tolerance {tolerance} : {nb_points} points, took {time() - start} seconds')
+    for level, lines in contours.items():
+        assert lines
+        points = np.concatenate(lines)
+        error = np.max(np.abs(src.compute_fields(flows, points[:, 0], points[:, 1], ('psi',))['psi'] - level))
+        assert error < 1e-2, (level, error)
+
+# Seeds on the upstream edge, on the same streamfunction levels
+seeds = np.column_stack((np.full(len(levels), x_points[0]), np.interp(levels, psi[:, 0], y_points)))
+start = time()
+lines = src.trace_streamlines(flows, seeds, step=5e-3, nb_steps=1600,
+                              bounds=((-0.5, 1.5), (-1, 1)), body=rotated_vertex)
+print(f'Traced {len(lines)} streamlines, took {time() - start} seconds')
+for level, line in zip(levels, lines):
+    psi_line = src.compute_fields(flows, line[:, 0], line[:, 1], ('psi',))['psi']
+    print(f'  psi = {level} : {len(line)} points, max error {np.max(np.abs(psi_line - level))}')
+    assert np.max(np.abs(psi_line - level)) < 1e-4
+    # Every streamline reaches the downstream edge
+    assert line[-1, 0] > 1.49
@@ -0,0 +1,42 @@
+import src
+import numpy as np
+from time import time
+
+# Field tiles evaluated on a thread or a process pool give the same
+# fields as the serial evaluation of the same tiles, with and without the
+# tree code and the interior mask. Every worker gets a share of the
+# memory budget, so its tiles are smaller than the serial ones, which
+# only changes the rounding of the sums
+n = 256
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/2412.dat')
+solver = src.linear_vortex_solver(geometry)
+geometry.set_angle_deg(-5)
+gammas = solver.solve(-geometry.angle)
+
+vertex = geometry.get_rotated_vertex()
+flows = [src.flows.freestream(1),
+         src.flows.panel_set(vertex, np.roll(vertex, -1, axis=0), gammas, np.roll(gammas, -1))]
+x_grid, y_grid = np.meshgrid(np.linspace(-.5, 1.5, 300), np.linspace(-1, 1, 300))
+quantities = ('u', 'v', 'psi', 'speed')
+
+if __name__ == '__main__':
+    workers, memory_budget = 4, 2**20
+    for tolerance, mask in ((None, None), (1e-6, geometry.contains(x_grid, y_grid))):
+        options = dict(tolerance=tolerance, mask=mask)
+        serial = src.compute_fields(flows, x_grid, y_grid, quantities,
+                                    memory_budget=memory_budget, **options)
+        same_tiles = src.compute_fields(flows, x_grid, y_grid, quantities,
+                                        memory_budget=memory_budget / workers, **options)
+        for executor in ('thread', 'process'):
+            start = time()
+            parallel = src.compute_fields(flows, x_grid, y_grid, quantities, workers=workers,
+                                          executor=executor, memory_budget=memory_budget,
+                                          **options)
+            print(f'{executor} pool, tolerance {tolerance} : took {time() - start} seconds')
+            for name in quantities:
+                assert np.array_equal(np.ma.getmaskarray(parallel[name]),
+                                      np.ma.getmaskarray(serial[name])), (executor, name)
+                assert np.ma.allequal(parallel[name], same_tiles[name]), (executor, name)
+                error = np.max(np.abs(parallel[name] - serial[name]))
+                assert error < 1e-14 * np.max(np.abs(serial[name])), (executor, name, error)
@@ -0,0 +1,33 @@
+import src
+import numpy as np
+from time import time
+
+# Velocity and streamfunction of a solved airfoil on a +-10 chords domain,
+# integrated exactly and through the far field multipole expansion
+n = 256
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/2412.dat')
+solver = src.linear_vortex_solver(geometry)
+gammas = solver.solve(np.deg2rad(6))
+
+p1, p2 = geometry.vertex, np.roll(geometry.vertex, -1, axis=0)
+x_grid, y_grid = np.meshgrid(np.linspace(-10, 10, 400), np.linspace(-10, 10, 400))
+
+start = time()
+exact = src.flows.panel_set(p1, p2, gammas, np.roll(gammas, -1)).evaluate(x_grid, y_grid)
+print(f'Exact evaluation took {time() - start} seconds')
+
+for tolerance in (1e-3, 1e-6, 1e-9):
+    flow = src.flows.panel_set(p1, p2, gammas, np.roll(gammas, -1), tolerance=tolerance)
+    start = time()
+    expanded = flow.evaluate(x_grid, y_grid)
+    print(f'Tolerance {tolerance} : far field past {flow.far_distance:.2f} chords, '
+          f'took {time() - start} seconds')
+
+    # The error bound is relative to the total strength over the distance
+    distance = np.abs(x_grid + 1j * y_grid - flow.center)
+    strength = np.sum(np.abs(gammas[:-1] + gammas[1:]) / 2 * flow.length[:-1]) / (2 * np.pi)
+    for name, exact_field, expanded_field in zip(('u', 'v', 'psi'), exact, expanded):
+        error = np.max(np.abs(expanded_field - exact_field) * distance / strength)
+        print(f'  {name} relative error : {error}')
+        assert error < tolerance
@@ -0,0 +1,35 @@
+import src
+import numpy as np
+from time import time
+
+n = 4096
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/cut0012.dat')
+alphas = np.deg2rad(np.array((-5, 0, 5, 10)))
+
+start = time()
+dense_solver = src.linear_vortex_solver(geometry)
+dense_gammas = dense_solver.solve_many(alphas)
+print(f'Dense solver took {time() - start} seconds')
+
+start = time()
+compressed_solver = src.hmatrix_solver(geometry, tolerance=1e-8)
+compressed_gammas = compressed_solver.solve_many(alphas)
+print(f'Compressed solver took {time() - start} seconds')
+print(f'GMRES iterations : {compressed_solver.iterations}')
+print(f'Final residuals : {compressed_solver.residuals}')
+
+product = compressed_solver.RHS @ dense_gammas[0]
+assert np.allclose(product, dense_solver.RHS @ dense_gammas[0], atol=1e-6)
+
+memory_ratio = compressed_solver.memory / dense_solver.RHS.nbytes
+print(f'Compressed matrix uses {100 * memory_ratio:.1f}% of the dense memory')
+
+error = np.max(np.abs(compressed_gammas - dense_gammas)) / np.max(np.abs(dense_gammas))
+print(f'Maximum relative gamma error : {error}')
+assert error < 1e-6
+
+dense_cl = src.compute_coefficients(geometry, dense_gammas, -alphas)[0]
+compressed_cl = src.compute_coefficients(geometry, compressed_gammas, -alphas)[0]
+print(f'Maximum Cl error : {np.max(np.abs(compressed_cl - dense_cl))}')
+assert np.allclose(compressed_cl, dense_cl, atol=1e-6)
@@ -28,21 +28,10 @@ print(f'Cl is : {cl}')
 print(f'Expected Cl for cylinder is {4 * np.pi * np.sin(alpha * np.pi / 180)}')
 print(f'Expected Cl for thin foil is {2 * np.pi * alpha * np.pi / 180}')
 
-flows = [src.flows.freestream(1)]
-# flows.append(src.flows.linear_vortex(gammas[:-1], 
-#                                  gammas[1:], 
-#                                  rotated_vertex[:-1], 
-#                                  rotated_vertex[1:]))
-
-# Doing it like this is faster. Probably because we have less broadcasting
-N = len(gammas)
-for i in range(N):
-    p1 = rotated_vertex[i]
-    p2 = rotated_vertex[(i + 1) % N]
-
-    gamma0 = gammas[i]
-    gamma1 = gammas[(i+1) % N]
-    flows.append(src.flows.linear_vortex(gamma0, gamma1, p1, p2))
+# All the panels as one panel set, the last one closing the contour
+flows = [src.flows.freestream(1),
+         src.flows.panel_set(rotated_vertex, np.roll(rotated_vertex, -1, axis=0),
+                             gammas, np.roll(gammas, -1))]
 
 nx, ny = (300, 300)
 x = np.linspace(-.5, 1.5, nx)
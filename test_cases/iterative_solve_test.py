@@ -0,0 +1,51 @@
+import src
+import numpy as np
+from time import time
+
+n = 1024
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/plate.dat')
+alphas = np.deg2rad(np.arange(-4, 10, 2))
+
+start = time()
+dense_solver = src.linear_vortex_solver(geometry)
+dense_gammas = dense_solver.solve_many(alphas)
+print(f'Dense solver took {time() - start} seconds')
+
+start = time()
+iterative_solver = src.iterative_solver(geometry, tolerance=1e-8)
+iterative_gammas = iterative_solver.solve_many(alphas)
+print(f'Iterative solver took {time() - start} seconds')
+print(f'GMRES iterations : {iterative_solver.iterations}')
+print(f'Final residuals : {iterative_solver.residuals}')
+
+error = np.max(np.abs(iterative_gammas - dense_gammas)) / np.max(np.abs(dense_gammas))
+print(f'Maximum relative gamma error : {error}')
+assert error < 1e-6
+
+dense_cl = src.compute_coefficients(geometry, dense_gammas, -alphas)[0]
+iterative_cl = src.compute_coefficients(geometry, iterative_gammas, -alphas)[0]
+print(f'Maximum Cl error : {np.max(np.abs(iterative_cl - dense_cl))}')
+assert np.allclose(iterative_cl, dense_cl, atol=1e-6)
+assert max(iterative_solver.iterations) < 25
+
+# The matrix-free operator stands for the influence matrix
+product = iterative_solver.RHS @ dense_gammas[0]
+assert np.allclose(product, dense_solver.RHS @ dense_gammas[0], atol=1e-6)
+
+# Same solution above about 4000 panels, where the iterative solver beats
+# building and factorizing the dense matrix. The timings are only printed,
+# benchmarks/run.py records them
+n = 8192
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/2412.dat')
+
+start = time()
+dense_gammas = src.linear_vortex_solver(geometry).solve_many(alphas)
+dense_time = time() - start
+
+start = time()
+iterative_gammas = src.iterative_solver(geometry, tolerance=1e-8).solve_many(alphas)
+iterative_time = time() - start
+print(f'{n} panels : dense solver took {dense_time} seconds, iterative solver {iterative_time} seconds')
+assert np.max(np.abs(iterative_gammas - dense_gammas)) < 1e-6 * np.max(np.abs(dense_gammas))
@@ -0,0 +1,101 @@
+import threading
+import src
+from time import sleep
+from webapp.jobs import job_queue, job_cancelled, checkpoint
+from webapp.utils import basis_fields
+
+# Jobs of the flow callbacks: identical requests share one job, a newer
+# request of a session cancels its previous one, and so does cancel
+queue = job_queue(workers=1)
+calls = []
+
+def slow(value):
+    calls.append(value)
+    for _ in range(20):
+        sleep(.01)
+        checkpoint()
+    return value
+
+results = {}
+def request(name, session, key, delay):
+    sleep(delay)
+    try:
+        results[name] = queue.run(session, key, slow, key)
+    except job_cancelled:
+        results[name] = 'cancelled'
+
+def run_requests(*requests):
+    threads = [threading.Thread(target=request, args=arguments) for arguments in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+# B coalesces with the first job of A, which stays alive for B once A
+# moves on, A's second job is superseded by its third before it starts
+run_requests(('a1', 'A', 1, 0), ('b1', 'B', 1, .02), ('a2', 'A', 2, .05), ('a3', 'A', 3, .06))
+print(results, calls, queue.stats)
+assert results == {'a1': 'cancelled', 'b1': 1, 'a2': 'cancelled', 'a3': 3}
+assert calls == [1, 3]
+assert queue.stats == {'submitted': 3, 'coalesced': 1, 'cancelled': 1, 'in_flight': 0}
+
+# A request without a session is never superseded
+results.clear()
+run_requests(('n1', None, 4, 0), ('n2', None, 5, .02))
+assert results == {'n1': 4, 'n2': 5}
+
+# cancel stops the running job of a session at its next checkpoint
+results.clear()
+calls.clear()
+thread = threading.Thread(target=request, args=('c1', 'C', 6, 0))
+thread.start()
+sleep(.05)
+queue.cancel('C')
+thread.join()
+print(results, queue.stats)
+assert results == {'c1': 'cancelled'}
+assert calls == [6]
+assert queue.stats['cancelled'] == 2 and queue.stats['in_flight'] == 0
+
+# Cancelling a session without a request in flight does nothing
+queue.cancel('C')
+assert queue.run('C', 7, slow, 7) == 7
+
+# A request without a session that shares the job of a session keeps it
+# alive when the session moves on or cancels
+for supersede in (False, True):
+    results.clear()
+    calls.clear()
+    requests = [('d1', 'D', 8, 0), ('n3', None, 8, .02)]
+    if supersede:
+        requests.append(('d2', 'D', 9, .05))
+    threads = [threading.Thread(target=request, args=arguments) for arguments in requests]
+    for thread in threads:
+        thread.start()
+    if not supersede:
+        sleep(.05)
+        queue.cancel('D')
+    for thread in threads:
+        thread.join()
+    print(results, calls)
+    assert results['d1'] == 'cancelled' and results['n3'] == 8
+    assert calls[0] == 8 and results.get('d2', 9) == 9
+assert queue.stats['in_flight'] == 0
+
+# A superseded basis field evaluation stops between its bands of rows
+geometry = src.geometry(nb_vertex=256)
+geometry.load_txt('examples/2412.dat')
+fields = basis_fields(geometry.vertex, *src.linear_vortex_solver(geometry).solve_basis(),
+                      resolution=400)
+results.clear()
+def evaluate():
+    try:
+        results['e1'] = queue.run('E', 'basis', fields.evaluate, 'velocities', 0)
+    except job_cancelled:
+        results['e1'] = 'cancelled'
+thread = threading.Thread(target=evaluate)
+thread.start()
+sleep(.1)
+queue.cancel('E')
+thread.join()
+assert results == {'e1': 'cancelled'} and 'velocities' not in fields._fields
@@ -0,0 +1,50 @@
+import src
+import numpy as np
+from time import time
+
+# Loop kernels against the numpy expressions of the panel classes and of
+# the solver. Without numba the loops are interpreted, on a small problem.
+# Both only differ by the order of the operations and the math library
+backend = 'jit' if src.flows.JIT_AVAILABLE else 'python'
+n, nb_points = (256, 200) if backend == 'jit' else (32, 12)
+print(f'Testing the {backend} backend')
+
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/2412.dat')
+vertex = geometry.vertex
+p1, p2 = vertex, np.roll(vertex, -1, axis=0)
+rng = np.random.default_rng(0)
+gamma_a, gamma_b, lambda_ = rng.normal(size=(3, n))
+x_grid, y_grid = np.meshgrid(np.linspace(-.5, 1.5, nb_points), np.linspace(-1, 1, nb_points))
+
+flows = {'linear_vortex': src.flows.linear_vortex(gamma_a, gamma_b, p1, p2),
+         'constant_source': src.flows.constant_source(lambda_, p1, p2),
+         'panel_set': src.flows.panel_set(p1, p2, gamma_a, gamma_b, lambda_)}
+
+def evaluate(backend):
+    src.flows.set_kernel_backend(backend)
+    fields = {}
+    for name, flow in flows.items():
+        # The first call compiles the jit kernels
+        flow.evaluate(x_grid[:2, :2], y_grid[:2, :2])
+        start = time()
+        fields[name] = flow.evaluate(x_grid, y_grid)
+        print(f'  {backend} {name} took {time() - start} seconds')
+    src.linear_vortex_solver(geometry)
+    start = time()
+    fields['influence'] = src.linear_vortex_solver(geometry).RHS
+    print(f'  {backend} influence matrix took {time() - start} seconds')
+    return fields
+
+reference = evaluate('numpy')
+loops = evaluate(backend)
+src.flows.set_kernel_backend('auto')
+
+for name in flows:
+    for quantity, expected, result in zip(('u', 'v', 'psi'), reference[name], loops[name]):
+        error = np.max(np.abs(result - expected)) / np.max(np.abs(expected))
+        print(f'{name} {quantity} relative error : {error}')
+        assert error < 1e-10
+error = np.max(np.abs(loops['influence'] - reference['influence'])) / np.max(np.abs(reference['influence']))
+print(f'Influence matrix relative error : {error}')
+assert error < 1e-10
@@ -0,0 +1,41 @@
+import src
+import numpy as np
+from time import perf_counter
+
+# Streamfunction and velocity of a 256 panels airfoil, evaluated as one
+# linear_vortex per panel, as a single broadcast linear_vortex and as a
+# panel_set, at several grid resolutions. The timings are only printed,
+# benchmarks/run.py records them and checks that the panel set is faster
+n = 256
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/0012.dat')
+solver = src.linear_vortex_solver(geometry)
+gammas = solver.solve(np.deg2rad(5))
+
+p1, p2 = geometry.vertex, np.roll(geometry.vertex, -1, axis=0)
+gamma_a, gamma_b = gammas, np.roll(gammas, -1)
+REPEAT = 5
+strategies = {
+    'per panel': [src.flows.linear_vortex(gamma_a[i], gamma_b[i], p1[i], p2[i]) for i in range(n)],
+    'broadcast': [src.flows.linear_vortex(gamma_a, gamma_b, p1, p2)],
+    'panel set': [src.flows.panel_set(p1, p2, gamma_a, gamma_b)],
+}
+
+for resolution in (50, 100, 200, 400):
+    x_grid, y_grid = np.meshgrid(np.linspace(-.5, 1.5, resolution), np.linspace(-1, 1, resolution))
+    timings, results = {}, {}
+    for name, flows in strategies.items():
+        times = []
+        for _ in range(REPEAT):
+            start = perf_counter()
+            results[name] = src.compute_fields(flows, x_grid, y_grid)
+            times.append(perf_counter() - start)
+        timings[name] = min(times)
+
+    print(f'Resolution {resolution} : ' + ', '.join(f'{name} {timing:.3f}s'
+                                                    for name, timing in timings.items()))
+    for quantity in ('u', 'v', 'psi'):
+        error = np.max(np.abs(results['panel set'][quantity] - results['per panel'][quantity]))
+        assert error < 1e-10, f'{quantity} differs by {error}'
+    print(f'Panel set speedup : {timings["per panel"] / timings["panel set"]:.2f}x over per panel, '
+          f'{timings["broadcast"] / timings["panel set"]:.2f}x over broadcast')
@@ -0,0 +1,46 @@
+import src
+import numpy as np
+from time import time
+from matplotlib.path import Path
+from src.geometry._polygon import _points_in_polygon
+
+# Even-odd point in polygon test against matplotlib, away from and next to
+# the airfoil contour
+geometry = src.geometry(nb_vertex=256)
+geometry.load_txt('examples/2412.dat')
+geometry.set_angle_deg(-8)
+vertex = geometry.get_rotated_vertex()
+path = Path(vertex)
+
+x_grid, y_grid = np.meshgrid(np.linspace(-.5, 1.5, 1000), np.linspace(-1, 1, 1000))
+start = time()
+inside = _points_in_polygon(vertex, x_grid, y_grid)
+print(f'1000 x 1000 grid took {time() - start} seconds, {np.sum(inside)} points inside')
+start = time()
+expected = path.contains_points(np.column_stack((x_grid.ravel(), y_grid.ravel()))).reshape(x_grid.shape)
+print(f'matplotlib took {time() - start} seconds')
+assert np.array_equal(inside, expected)
+
+# Points a hair inside and outside the middle of every panel
+middle = (vertex[:-1] + vertex[1:]) / 2
+tangent = np.diff(vertex, axis=0)
+normal = np.column_stack((tangent[:, 1], -tangent[:, 0])) / np.hypot(*tangent.T)[:, np.newaxis]
+sides = []
+for side in (-1, 1):
+    points = middle + side * 1e-9 * normal
+    sides.append(_points_in_polygon(vertex, points[:, 0], points[:, 1]))
+    assert np.array_equal(sides[-1], path.contains_points(points)), side
+assert np.all(sides[0] == sides[0][0]) and np.all(sides[0] != sides[1])
+
+# Points exactly on the boundary: a square tiled by triangles, every point
+# of a shared edge or vertex belongs to exactly one of them. matplotlib
+# leaves the boundary unspecified and counts some of them in up to 4
+cells = []
+for i in range(4):
+    for j in range(4):
+        a, b, c, d = (i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1)
+        cells += [np.array((a, b, c)), np.array((a, c, d))] if (i + j) % 2 \
+            else [np.array((a, b, d)), np.array((b, c, d))]
+x_points, y_points = np.meshgrid(np.arange(.5, 4, .5), np.arange(.5, 4, .5))
+counts = sum(_points_in_polygon(cell, x_points, y_points).astype(int) for cell in cells)
+assert np.all(counts == 1), counts
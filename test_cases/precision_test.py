@@ -0,0 +1,45 @@
+import src
+import numpy as np
+import warnings
+from time import time
+
+# Fields of a solved airfoil evaluated in float64 and float32, the solver
+# and the coefficients stay in float64
+n = 256
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/2412.dat')
+solver = src.linear_vortex_solver(geometry)
+geometry.set_angle_deg(-6)
+gammas = solver.solve(-geometry.angle)
+
+rotated_vertex = geometry.get_rotated_vertex()
+flows = [src.flows.freestream(1),
+         src.flows.panel_set(rotated_vertex, np.roll(rotated_vertex, -1, axis=0),
+                             gammas, np.roll(gammas, -1))]
+x_grid, y_grid = np.meshgrid(np.linspace(-.5, 1.5, 400), np.linspace(-1, 1, 400))
+mask = geometry.contains(x_grid, y_grid)
+
+fields = {}
+for dtype in (np.float64, np.float32):
+    start = time()
+    fields[dtype] = src.compute_fields(flows, x_grid, y_grid, mask=mask, dtype=dtype)
+    print(f'{dtype.__name__} took {time() - start} seconds')
+
+estimate = src.estimate_precision_error(flows, x_grid, y_grid, np.float32, mask=mask)
+for name in ('u', 'v', 'psi'):
+    error = np.max(np.abs(fields[np.float32][name] - fields[np.float64][name]))
+    relative_error = error / np.max(np.abs(fields[np.float64][name]))
+    print(f'{name} : float32 error {error}, relative {relative_error}, '
+          f'estimated {estimate[name]}')
+    assert fields[np.float32][name].dtype == np.float32
+    assert error < 1e-3
+    # The estimate bounds the error of every point, not only the sampled ones
+    assert relative_error <= estimate[name], (name, relative_error, estimate[name])
+
+# The guarded mode falls back to float64 when the estimate is too large
+with warnings.catch_warnings(record=True) as caught:
+    warnings.simplefilter('always')
+    guarded = src.compute_fields(flows, x_grid, y_grid, ('psi',), mask=mask, dtype=np.float32,
+                                 max_precision_error=1e-12)
+assert guarded['psi'].dtype == np.float64 and len(caught) == 1
+print(caught[0].message)
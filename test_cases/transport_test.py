@@ -0,0 +1,30 @@
+import src
+import numpy as np
+import plotly.graph_objs as go
+import plotly.io
+from webapp.callbacks import VELOCITY_CODES, velocity_heatmap
+from webapp.utils import compute_flow
+
+# Velocity heatmap of the default resolution, sent as uint8 codes and a
+# grid origin and step, against the float64 field and grid arrays
+geometry = src.geometry(nb_vertex=256)
+geometry.load_txt('examples/2412.dat')
+geometry.set_angle_deg(-5)
+gammas = src.linear_vortex_solver(geometry).solve(-geometry.angle)
+x_grid, y_grid, speed = compute_flow('velocities', gammas, geometry.get_rotated_vertex(), 200)
+speed = speed.filled(np.nan)
+
+full = go.Heatmap(x=x_grid[0], y=y_grid[:, 0], z=speed, zmin=0, zmax=2, colorscale='Viridis',
+                  colorbar=dict(title="Velocity Magnitude", x=1.05))
+sizes = [len(plotly.io.to_json(go.Figure(data=[trace]), validate=False))
+         for trace in (full, velocity_heatmap(x_grid, y_grid, speed))]
+print(f'Heatmap figure : {sizes[0]} bytes as float64, {sizes[1]} bytes as codes, '
+      f'{sizes[0] / sizes[1]:.1f}x smaller')
+assert sizes[0] >= 5 * sizes[1]
+
+# The codes are within half a code of the field, NaN are kept
+codes = VELOCITY_CODES.encode(speed)
+decoded = VELOCITY_CODES.vmin + codes / VELOCITY_CODES.scale
+inside = np.isnan(speed)
+assert np.array_equal(codes == VELOCITY_CODES.nan_code, inside)
+assert np.max(np.abs(decoded - np.clip(speed, 0, 2))[~inside]) <= .5 / VELOCITY_CODES.scale + 1e-12
@@ -0,0 +1,57 @@
+import src
+import numpy as np
+import tracemalloc
+from time import time
+
+# Treecode against the direct sums over every panel, on a 1000 x 1000
+# grid around a solved airfoil, with a source panel wake and point vortices.
+# The timings are only printed, benchmarks/run.py records them
+n = 256
+geometry = src.geometry(nb_vertex=n)
+geometry.load_txt('examples/2412.dat')
+solver = src.linear_vortex_solver(geometry)
+geometry.set_angle_deg(-5)
+gammas = solver.solve(-geometry.angle)
+
+vertex = geometry.get_rotated_vertex()
+wake = np.column_stack((np.linspace(1.1, 1.4, 17), np.full(17, -.05)))
+flows = [src.flows.freestream(1),
+         src.flows.linear_vortex(gammas[:-1], gammas[1:], vertex[:-1], vertex[1:]),
+         src.flows.constant_source(np.linspace(.1, .02, 16), wake[:-1], wake[1:]),
+         src.flows.vortex(np.array((.05, -.05)), np.array((-.3, 1.3)), np.array((.4, -.6)))]
+
+x_grid, y_grid = np.meshgrid(np.linspace(-.5, 1.5, 1000), np.linspace(-1, 1, 1000))
+mask = geometry.contains(x_grid, y_grid)
+quantities = ('u', 'v', 'psi')
+
+start = time()
+direct = src.compute_fields(flows, x_grid, y_grid, quantities, mask=mask)
+direct_time = time() - start
+print(f'Direct sums took {direct_time} seconds')
+
+for tolerance in (1e-3, 1e-6, 1e-9):
+    start = time()
+    expanded = src.compute_fields(flows, x_grid, y_grid, quantities, mask=mask, tolerance=tolerance)
+    elapsed = time() - start
+    print(f'Tolerance {tolerance} : took {elapsed} seconds')
+    for name in quantities:
+        error = np.max(np.abs(expanded[name] - direct[name])) / np.max(np.abs(direct[name]))
+        print(f'  {name} relative error : {error}')
+        assert error < tolerance, (tolerance, name, error)
+
+# The streamfunction of many source panels is summed a leaf at a time,
+# within the memory budget of the tiles instead of every (point, source)
+# pair at once
+nb_sources = 4096
+line = np.column_stack((np.linspace(-.4, 1.4, nb_sources + 1), np.full(nb_sources + 1, -.8)))
+sources = [src.flows.constant_source(np.full(nb_sources, .01), line[:-1], line[1:])]
+x_grid, y_grid = np.meshgrid(np.linspace(-.5, 1.5, 200), np.linspace(-1, 1, 200))
+direct = src.compute_fields(sources, x_grid, y_grid, ('psi',))['psi']
+tracemalloc.start()
+expanded = src.compute_fields(sources, x_grid, y_grid, ('psi',), tolerance=1e-6)['psi']
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+error = np.max(np.abs(expanded - direct)) / np.max(np.abs(direct))
+print(f'{nb_sources} sources : psi relative error {error}, peak memory {peak / 2**20:.1f} MB')
+assert error < 1e-10
+assert peak < 2 * src.core.compute_visuals.DEFAULT_MEMORY_BUDGET
@@ -1,2 +1,6 @@
 from .layout import app_layout
-from .callbacks import register_callbacks
\ No newline at end of file
+from .callbacks import register_callbacks
+from .cache import solver_cache
+from .monitoring import register_profiling_route
+from .jobs import job_queue, job_cancelled
+from .api import register_batch_api
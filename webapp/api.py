@@ -0,0 +1,189 @@
+import io
+import json
+
+import numpy as np
+from flask import Response, abort, request, stream_with_context
+from src import geometry, aerodynamic_polar
+from src.profiling import timed
+
+BATCH_ROUTE = '/api/solve'
+
+# Panels of the cases that do not give any, as the default geometry
+DEFAULT_PANELS = 255
+
+# Limits of a single request
+MAX_CASES = 256
+# The cubic spline of a geometry needs at least 4 points, a NACA profile
+# of 5 panels is sampled at 5
+MIN_PANELS = 5
+MIN_POINTS = 4
+MAX_PANELS = 4096
+MAX_PANEL_COUNTS = 16
+MAX_ANGLES = 10000
+# Work of a request, the panels**3 of its factorizations plus the
+# panels * angles of its outputs, 4 of the largest geometries
+MAX_WORK = 4 * MAX_PANELS**3
+
+OUTPUTS = ('cl', 'cd', 'cm', 'gammas', 'cp')
+DEFAULT_OUTPUTS = ('cl', 'cd', 'cm')
+
+# Camber position of symmetric profiles, where it has no effect but
+# must not be 0
+SYMMETRIC_CAMBER_POSITION = .4
+
+def _naca_parameters(naca):
+    # (m, p, t) as fractions of the chord, from 4 digits or the fractions
+    if isinstance(naca, str):
+        if len(naca) != 4 or not naca.isdigit():
+            raise ValueError(f'NACA designation must have 4 digits, not {naca!r}')
+        m, p, t = int(naca[0]) / 100, int(naca[1]) / 10, int(naca[2:]) / 100
+    else:
+        m, p, t = (float(value) for value in naca)
+    if m == 0:
+        p = p or SYMMETRIC_CAMBER_POSITION
+    if not 0 < p < 1 or t <= 0:
+        raise ValueError('NACA profiles need 0 < p < 1 and t > 0, unless symmetric (m = 0)')
+    return m, p, t
+
+def _vertex(points, name):
+    # (n, 2) array of the points of a geometry
+    vertex = np.asarray(points, dtype=float)
+    if vertex.ndim != 2 or vertex.shape[1] != 2 or len(vertex) < MIN_POINTS:
+        raise ValueError(f'{name} must have at least {MIN_POINTS} points of 2 coordinates')
+    return vertex
+
+def _load_geometry(case, nb_panels):
+    # Geometry of a case, interpolated to nb_panels panels
+    sources = [name for name in ('vertices', 'dat', 'naca') if name in case]
+    if len(sources) != 1:
+        raise ValueError("A case needs exactly one of 'vertices', 'dat' or 'naca'")
+
+    airfoil = geometry(nb_vertex=nb_panels + 1)
+    if 'naca' in case:
+        airfoil.load_naca(*_naca_parameters(case['naca']))
+    else:
+        if 'dat' in case:
+            vertex = _vertex(np.loadtxt(io.StringIO(case['dat']), ndmin=2), 'dat')
+        else:
+            vertex = _vertex(case['vertices'], 'vertices')
+        airfoil.vertex = vertex
+        airfoil._initialize()
+    return airfoil
+
+def _panel_counts(case):
+    counts = np.atleast_1d(case.get('panels', DEFAULT_PANELS))
+    if counts.ndim != 1 or not 0 < len(counts) <= MAX_PANEL_COUNTS:
+        raise ValueError(f'panels must be a count or a list of 1 to {MAX_PANEL_COUNTS} counts')
+    if not np.issubdtype(counts.dtype, np.number) or not np.all(np.mod(counts, 1) == 0) \
+            or np.any(counts < MIN_PANELS) or np.any(counts > MAX_PANELS):
+        raise ValueError(f'panels must be integers between {MIN_PANELS} and {MAX_PANELS}')
+    return [int(count) for count in counts]
+
+def _angles(case):
+    angles = np.atleast_1d(np.asarray(case.get('angles', 0), dtype=float))
+    if angles.ndim != 1 or len(angles) > MAX_ANGLES or not np.all(np.isfinite(angles)):
+        raise ValueError(f'angles must be a list of at most {MAX_ANGLES} numbers')
+    return angles
+
+def _outputs(case):
+    outputs = case.get('outputs', DEFAULT_OUTPUTS)
+    if isinstance(outputs, str):
+        # A single output, not its letters
+        outputs = (outputs,)
+    unknown = set(outputs) - set(OUTPUTS)
+    if unknown:
+        raise ValueError(f'Unknown outputs {sorted(unknown)}, expected some of {list(OUTPUTS)}')
+    return outputs
+
+@timed('batch_case')
+def _solve_case(cache, airfoil, angles, outputs):
+    # Every angle of a case in one vectorized polar, from the cached
+    # factorization of its geometry
+    key = cache.add(airfoil)
+    entry = cache.get(key)
+    if entry is None:
+        # Evicted by a concurrent request in between
+        entry = cache.get(cache.add(airfoil))
+    _, solver = entry
+
+    polar = aerodynamic_polar(solver)
+    alphas = np.deg2rad(angles)
+    result = {'key': key}
+    if {'cl', 'cd', 'cm'} & set(outputs):
+        cl, cd, cm = polar.coefficients(alphas)
+        result.update(cl=cl, cd=cd, cm=cm)
+    if {'gammas', 'cp'} & set(outputs):
+        gammas = polar.gammas(alphas)
+        result.update(gammas=gammas, cp=1 - gammas**2)
+    return {name: (value.tolist() if isinstance(value, np.ndarray) else value)
+            for name, value in result.items() if name == 'key' or name in outputs}
+
+def _work(case):
+    # Work of a case for MAX_WORK, 0 when it is invalid and only gets an
+    # error line
+    try:
+        angles = _angles(case)
+        return sum(nb_panels**3 + nb_panels * len(angles) for nb_panels in _panel_counts(case))
+    except (ValueError, TypeError, AttributeError):
+        return 0
+
+def _results(cache, cases):
+    # One result line per case and panel count, or one error line per case
+    for index, case in enumerate(cases):
+        header = {'index': index}
+        if isinstance(case, dict) and 'id' in case:
+            header['id'] = case['id']
+        try:
+            if not isinstance(case, dict):
+                raise ValueError('A case must be a JSON object')
+            angles, outputs = _angles(case), _outputs(case)
+            panel_counts = _panel_counts(case)
+        except (ValueError, TypeError) as error:
+            yield json.dumps(dict(header, error=str(error))) + '\n'
+            continue
+
+        for nb_panels in panel_counts:
+            try:
+                airfoil = _load_geometry(case, nb_panels)
+                result = _solve_case(cache, airfoil, angles, outputs)
+            except (ValueError, TypeError, np.linalg.LinAlgError) as error:
+                yield json.dumps(dict(header, panels=nb_panels, error=str(error))) + '\n'
+                continue
+            yield json.dumps(dict(header, panels=nb_panels, angles=angles.tolist(),
+                                  **result)) + '\n'
+
+def register_batch_api(server, cache, route=BATCH_ROUTE):
+    """
+    Solve batches of cases over HTTP, without the Dash interface.
+
+    POST a JSON body {"cases": [case, ...]}, each case an object with one
+    geometry, 'vertices' ([[x, y], ...]), 'dat' (the text of a .dat file)
+    or 'naca' ("2412" or [m, p, t] chord fractions), and optionally an
+    'id', 'panels' (a count or a list of at most MAX_PANEL_COUNTS counts,
+    DEFAULT_PANELS by default), 'angles' (degrees) and 'outputs' (one or a
+    list of OUTPUTS, Cl, Cd and Cm by default). Requests above MAX_CASES
+    cases or MAX_WORK are rejected as a whole.
+
+    The response streams one JSON line (application/x-ndjson) per case
+    and panel count, as soon as it is solved, with its 'index' in the
+    batch, 'id', 'panels', 'angles', the cache 'key' of its geometry and
+    the outputs, one value or row per angle. A case that cannot be solved
+    gets a line with an 'error' instead. Geometries and their factorized
+    solvers are kept in cache, shared with the callbacks, so repeated
+    geometries are only factorized once and every angle of a case is a
+    vectorized superposition of two basis solutions.
+    """
+    def batch_endpoint():
+        body = request.get_json(silent=True)
+        cases = body.get('cases') if isinstance(body, dict) else None
+        if not isinstance(cases, list):
+            abort(400, description='Expected a JSON object with a list of cases')
+        if len(cases) > MAX_CASES:
+            abort(413, description=f'At most {MAX_CASES} cases per request')
+        if sum(_work(case) for case in cases) > MAX_WORK:
+            abort(413, description='Too many panels and angles for one request, '
+                                   'split the cases into several')
+        return Response(stream_with_context(_results(cache, cases)),
+                        mimetype='application/x-ndjson')
+
+    server.add_url_rule(route, 'batch_solve', batch_endpoint, methods=['POST'])
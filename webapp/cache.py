@@ -0,0 +1,104 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from src import geometry, linear_vortex_solver
+from src.profiling import timed
+
+# Memory allowed for the cached geometries and solvers
+DEFAULT_CACHE_MEMORY = 256 * 2**20
+
+def vertex_key(vertex):
+    """Content hash of a vertex array, the key of every server-side cache."""
+    vertex = np.ascontiguousarray(vertex, dtype=float)
+    return hashlib.sha1(vertex.tobytes() + str(vertex.shape).encode()).hexdigest()
+
+def _nbytes(*objects):
+    # Memory held by the numpy arrays attributes of objects
+    total = 0
+    for obj in objects:
+        for value in vars(obj).values():
+            if isinstance(value, tuple):
+                total += sum(np.asarray(item).nbytes for item in value)
+            elif isinstance(value, np.ndarray):
+                total += value.nbytes
+    return total
+
+class solver_cache:
+    """
+    Least recently used cache of geometries and factorized solvers.
+
+    Entries are keyed by the vertex_key of their geometry, so the browser
+    only has to keep that hash instead of the influence matrix. The least
+    recently used entries are evicted once the cached arrays exceed
+    max_memory bytes, the most recent entry is always kept. Hits, misses
+    and evictions are counted in `stats`.
+    """
+    def __init__(self, max_memory=DEFAULT_CACHE_MEMORY):
+        self.max_memory = max_memory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @timed('cache_add')
+    def add(self, airfoil, solver=None):
+        """
+        Cache airfoil with its solver, created and factorized when not
+        given. Returns the key of the entry.
+        """
+        key = vertex_key(airfoil.vertex)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return key
+
+        if solver is None:
+            solver = linear_vortex_solver(airfoil)
+        # Factorized once, every angle and callback reuses the LU factors
+        solver._factorize()
+        size = _nbytes(airfoil, solver)
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (airfoil, solver, size)
+                self.memory += size
+                self._evict()
+        return key
+
+    def add_vertex(self, vertex):
+        """Cache the geometry described by a vertex array."""
+        airfoil = geometry(nb_vertex=len(vertex))
+        airfoil.vertex = np.array(vertex, dtype=float)
+        airfoil._compute_parameters()
+        return self.add(airfoil)
+
+    def get(self, key):
+        """(geometry, solver) of key, None when it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[:2]
+
+    def _evict(self):
+        while self.memory > self.max_memory and len(self._entries) > 1:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.memory -= size
+            self.evictions += 1
+
+    @property
+    def stats(self):
+        return {'entries': len(self._entries), 'memory': self.memory,
+                'max_memory': self.max_memory, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
@@ -2,22 +2,90 @@ from dash import html
 from dash import Input, Output, State, callback_context, no_update
 from dash.exceptions import PreventUpdate
 import plotly.graph_objs as go
+import plotly.colors
 
 import numpy as np
 import base64
 import io
 import csv
-from copy import deepcopy
+import uuid
+from copy import copy
 
-from .utils import compute_flow
-from src import geometry, linear_vortex_solver, compute_coefficients
+from .utils import (get_basis_fields, has_basis_fields, progressive_levels, get_streamlines,
+                    MAX_RESOLUTION)
+from .cache import solver_cache, vertex_key
+from .jobs import job_queue, job_cancelled, checkpoint
+from .transport import quantizer, grid_options, typed, record_payload
+from src import geometry, compute_coefficients, aerodynamic_polar
+from src.profiling import span, timed
 
 # Constants
 ANGLE_RANGE = (-15, 15)
 NUM_ANGLES = 61
 DEFAULT_VERTICES = 4
 
-def register_callbacks(app, default_geometry, default_solver):
+# Flow fields are only plotted, float32 is visually identical unless its
+# estimated relative error exceeds MAX_PRECISION_ERROR. The error is
+# relative to the panel basis fields, whose streamfunction only spans a
+# few hundredths of the unit freestream that dominates the plot
+FIELD_DTYPE = np.float32
+MAX_PRECISION_ERROR = 1e-2
+
+# Velocity fields are sent as integer codes of their color range, 8 bits
+# are as fine as the colors of the heatmap. Any copy of the speed for the
+# hover would cost more than the codes, hovering shows the position only
+VELOCITY_CODES = quantizer(0, 2, np.uint8)
+
+# Streamlines are extracted on the server and sent as polylines, either
+# as iso-lines of the streamfunction ('contours') or traced through the
+# flow from upstream ('trace'), see get_streamlines
+STREAMLINE_METHOD = 'contours'
+STREAMFUNCTION_LEVELS = tuple(np.round(np.arange(-.9, .95, .1), 10))
+
+def velocity_heatmap(x_grid, y_grid, speed):
+    """
+    Heatmap of a speed field, sent as integer codes of its color range and
+    the grid as its origin and step. The NaN code is transparent, as NaN
+    are.
+    """
+    return go.Heatmap(
+        z=VELOCITY_CODES.encode(speed),
+        hovertemplate='x=%{x:.3f}<br>y=%{y:.3f}<extra></extra>',
+        **VELOCITY_CODES.trace_options('Viridis', "Velocity Magnitude"),
+        **grid_options(x_grid[0], y_grid[:, 0])
+    )
+
+def register_callbacks(app, default_geometry, default_solver, cache=None, jobs=None):
+    # Geometries and factorized solvers live on the server, the browser
+    # only keeps the key of its current geometry
+    if cache is None:
+        cache = solver_cache()
+    # Flow and polar computations run on a local job queue
+    if jobs is None:
+        jobs = job_queue()
+
+    @timed('session_solver')
+    def _current_solver(vertices, geometry_key):
+        """Cached geometry and solver of the session, rebuilt when evicted."""
+        if not vertices:
+            return default_geometry, default_solver
+        entry = cache.get(geometry_key)
+        if entry is None:
+            entry = cache.get(cache.add_vertex(vertices))
+        return entry
+
+    #region Session Callback
+    @app.callback(
+        Output('session-id', 'data'),
+        Input('session-id', 'data')
+    )
+    def assign_session_id(session_id):
+        """Identify the browser tab, a newer request of a tab supersedes its previous one."""
+        if session_id:
+            raise PreventUpdate
+        return uuid.uuid4().hex
+    #endregion
+
     #region Angle Synchronization Callback
     @app.callback(
         [Output('angle-slider', 'value'),
@@ -26,6 +94,7 @@ def register_callbacks(app, default_geometry, default_solver):
          Input('angle-input', 'value')],
         prevent_initial_call=True
     )
+    @timed('sync_angle_values')
     def sync_angle_values(slider_value, input_value):
         """Synchronize slider and input field for angle of attack control."""
         ctx = callback_context
@@ -58,6 +127,7 @@ def register_callbacks(app, default_geometry, default_solver):
         State('upload-data', 'filename'),
         prevent_initial_call=True
     )
+    @timed('handle_file_upload')
     def handle_file_upload(file_content, filename):
         """Process uploaded airfoil data files."""
         if not file_content:
@@ -81,24 +151,25 @@ def register_callbacks(app, default_geometry, default_solver):
 
     @app.callback(
         [Output('geometry-vertex', 'data', allow_duplicate=True),
-         Output('solver-rhs', 'data', allow_duplicate=True)],
+         Output('geometry-key', 'data', allow_duplicate=True)],
         [Input('geometry-store', 'data'),
          Input('nb-vertex-input', 'value')],
         prevent_initial_call=True
     )
+    @timed('update_airfoil_geometry')
     def update_airfoil_geometry(file_content, num_vertices):
         """Update stored geometry data from uploaded file."""
         num_vertices = num_vertices or DEFAULT_VERTICES
         airfoil = geometry(nb_vertex=num_vertices)
         airfoil.load_txt(io.StringIO(file_content))
-        solver = linear_vortex_solver(airfoil)
-        return airfoil.vertex.tolist(), solver.RHS.tolist()
+        return airfoil.vertex.tolist(), cache.add(airfoil)
     #endregion
 
     #region NACA Generation Callback
     @app.callback(
         [Output('geometry-vertex', 'data', allow_duplicate=True),
-         Output('solver-rhs', 'data', allow_duplicate=True)],
+         Output('geometry-key', 'data', allow_duplicate=True),
+         Output('upload-status', 'children', allow_duplicate=True)],
         Input('generate-naca-button', 'n_clicks'),
         [State('naca-m', 'value'),
          State('naca-p', 'value'),
@@ -106,6 +177,7 @@ def register_callbacks(app, default_geometry, default_solver):
          State('nb-vertex-input', 'value')],
         prevent_initial_call=True
     )
+    @timed('generate_naca_profile')
     def generate_naca_profile(click_count, m, p, t, num_vertices):
         """Generate NACA 4-digit airfoil profile from user inputs."""
         if not click_count:
@@ -119,19 +191,21 @@ def register_callbacks(app, default_geometry, default_solver):
 
             airfoil = geometry(nb_vertex=num_vertices)
             airfoil.load_naca(m/100, p/10, t/100)
-            
-            solver = linear_vortex_solver(airfoil)
-            return airfoil.vertex.tolist(), solver.RHS.tolist()
+            return airfoil.vertex.tolist(), cache.add(airfoil), no_update
             
         except Exception as e:
-            return [no_update, f"Generation error: {str(e)}"]
+            error_message = html.Div([
+                html.Span("Generation error: "),
+                html.B(str(e))
+            ])
+            return [no_update, no_update, error_message]
     #endregion
 
     #region Aerodynamic Visualization Callbacks
     def _create_aero_figure(x_data, y_data, title, y_label):
         """Helper to create standardized coefficient plots."""
         return go.Figure(
-            data=[go.Scatter(x=x_data, y=y_data, 
+            data=[go.Scatter(x=typed(x_data), y=typed(y_data), 
                         mode='lines+markers', name=y_label)],
             layout=go.Layout(
                 title=title,
@@ -141,46 +215,22 @@ def register_callbacks(app, default_geometry, default_solver):
             )
         )
 
-    @app.callback(
-        [Output('cl-graph', 'figure'),
-        Output('cd-graph', 'figure'),
-        Output('cm-graph', 'figure'),
-        Output('precomputed-aero-data', 'data')],
-        Input('geometry-vertex', 'data'),
-        [State('solver-rhs', 'data'),
-        State('nb-vertex-input', 'value')]
-    )
-    def update_aerodynamic_coefficients(vertices, solver_data, num_vertices):
-        """Update precomputed aerodynamic coefficient plots."""
-        # Handle default values
-        num_vertices = num_vertices or DEFAULT_VERTICES
-        
-        # Create geometry instance based on current state
-        if vertices:
-            current_geometry = geometry(nb_vertex=num_vertices)
-            current_geometry.vertex = np.array(vertices)
-            current_geometry._compute_parameters()
-        else:
-            current_geometry = deepcopy(default_geometry)
-        
-        # Configure solver with current geometry
-        current_solver = deepcopy(default_solver)
-        current_solver.geometry = current_geometry
-        if solver_data is not None:  # Preserve solver RHS if available
-            current_solver.RHS = np.array(solver_data)
-        current_solver._create_normals()  # Critical normalization step
+    def _geometry_id(vertices, geometry_key):
+        # Content hash of the session geometry, None for the default one
+        if not vertices:
+            return None
+        return geometry_key or vertex_key(vertices)
+
+    @timed('polar_job')
+    def _polar_figures(vertices, geometry_key):
+        current_geometry, current_solver = _current_solver(vertices, geometry_key)
         
         # Compute coefficients across angle range
         angles = np.linspace(*ANGLE_RANGE, NUM_ANGLES)
-        cl_values, cd_values, cm_values = [], [], []
-        
-        for angle in angles:
-            current_geometry.set_angle_deg(-angle)
-            vortex_strengths = current_solver.solve(-current_geometry.angle)
-            cl, cd, cm = compute_coefficients(current_geometry, vortex_strengths)
-            cl_values.append(cl)
-            cd_values.append(cd)
-            cm_values.append(cm)
+        polar = aerodynamic_polar(current_solver)
+        cl_values, cd_values, cm_values = (
+            values.tolist() for values in polar.coefficients(np.deg2rad(angles))
+        )
         
         # Package data for storage and return
         aero_data = {
@@ -190,70 +240,108 @@ def register_callbacks(app, default_geometry, default_solver):
             'Cm': cm_values
         }
 
-        return (
-            _create_aero_figure(angles, cl_values, 'Lift Coefficient', 'Cl'),
-            _create_aero_figure(angles, cd_values, 'Drag Coefficient', 'Cd'),
-            _create_aero_figure(angles, cm_values, 'Moment Coefficient', 'Cm'),
-            aero_data
-        )
+        checkpoint()
+        with span('figures'):
+            return (
+                record_payload('polar', _create_aero_figure(angles, cl_values, 'Lift Coefficient', 'Cl')),
+                record_payload('polar', _create_aero_figure(angles, cd_values, 'Drag Coefficient', 'Cd')),
+                record_payload('polar', _create_aero_figure(angles, cm_values, 'Moment Coefficient', 'Cm')),
+                aero_data
+            )
 
     @app.callback(
-        [Output('flow-graph', 'figure'),
-        Output('cp-graph', 'figure'),
-        Output('cl-value', 'children'),
-        Output('cd-value', 'children'),
-        Output('cm-value', 'children'),
-        Output('current-cp-data', 'data')],
-        [Input('angle-input', 'value'),
-        Input('plot-type', 'value'),
+        [Output('cl-graph', 'figure'),
+        Output('cd-graph', 'figure'),
+        Output('cm-graph', 'figure'),
+        Output('precomputed-aero-data', 'data')],
         Input('geometry-vertex', 'data'),
-        Input('resolution-input', 'value')],
-        [State('solver-rhs', 'data'),
-        State('nb-vertex-input', 'value')]
+        [State('geometry-key', 'data'),
+        State('session-id', 'data')]
     )
-    def update_flow_visualization(angle, plot_mode, vertices, 
-                                resolution, solver_data, num_vertices):
-        """Main visualization update for flow fields and coefficients."""
+    @timed('update_aerodynamic_coefficients')
+    def update_aerodynamic_coefficients(vertices, geometry_key, session_id=None):
+        """Update precomputed aerodynamic coefficient plots."""
+        key = ('polar', _geometry_id(vertices, geometry_key))
+        session = (session_id, 'polar') if session_id else None
+        try:
+            return jobs.run(session, key, _polar_figures, vertices, geometry_key)
+        except job_cancelled:
+            raise PreventUpdate
+
+    def _level_fields(vertex, solver, plot_mode, resolution, level):
+        # Basis fields of a progressive level, the previous level provides
+        # the samples it already evaluated while it is cached
+        levels = progressive_levels(resolution)
+        options = dict(dtype=FIELD_DTYPE, max_precision_error=MAX_PRECISION_ERROR)
+        coarse = None
+        if level > 0:
+            coarse_resolution, coarse_spacing = levels[level - 1]
+            if has_basis_fields(vertex, coarse_resolution, plot_mode, spacing=coarse_spacing,
+                                **options):
+                coarse = get_basis_fields(vertex, coarse_resolution, lambda: solver,
+                                          spacing=coarse_spacing, **options)
+        level_resolution, spacing = levels[level]
+        return get_basis_fields(vertex, level_resolution, lambda: solver, spacing=spacing,
+                                coarse=coarse, **options)
+
+    def _flow_figure(fields, plot_mode, alpha, numeric_angle, airfoil_points):
+        checkpoint()
+        if plot_mode == 'streamlines':
+            with span('streamlines'):
+                flow_data = get_streamlines(fields, alpha, airfoil_points, STREAMFUNCTION_LEVELS,
+                                            STREAMLINE_METHOD)
+        else:
+            # Points inside the airfoil are left blank
+            with span('interpolate_fields'):
+                x_grid, y_grid, speed = fields.evaluate(plot_mode, alpha)
+            flow_data = (x_grid, y_grid, speed.filled(np.nan))
+
+        checkpoint()
+        with span('figures'):
+            return record_payload('flow', _create_flow_plot(flow_data, plot_mode, numeric_angle,
+                                                            airfoil_points))
+
+    def _flow_inputs(angle, resolution):
         # Handle input validation and defaults
         try:
             numeric_angle = float(angle)
         except (ValueError, TypeError):
             numeric_angle = 0.0
-        
-        num_vertices = num_vertices or DEFAULT_VERTICES
         resolution = resolution or 200  # Default resolution if not provided
-        
-        # Create geometry instance based on current state
-        if vertices:
-            current_geometry = geometry(nb_vertex=num_vertices)
-            current_geometry.vertex = np.array(vertices)
-            current_geometry._compute_parameters()
-        else:
-            current_geometry = deepcopy(default_geometry)
-        
-        # Configure solver with current geometry
-        current_solver = deepcopy(default_solver)
-        current_solver.geometry = current_geometry
-        if solver_data is not None:
-            current_solver.RHS = np.array(solver_data)
-        current_solver._create_normals()  # Essential for accurate solutions
-        
+        return numeric_angle, min(resolution, MAX_RESOLUTION)
+
+    def _refinement(geometry_id, numeric_angle, plot_mode, resolution, level):
+        # Progressive level rendered after this one, None after the last
+        if level + 1 >= len(progressive_levels(resolution)):
+            return None
+        return {'geometry': geometry_id, 'angle': numeric_angle, 'mode': plot_mode,
+                'resolution': resolution, 'level': level + 1}
+
+    @timed('flow_job')
+    def _flow_frame(numeric_angle, plot_mode, vertices, resolution, geometry_key, level):
+        # The cached geometry is shared, the angle is set on a copy
+        cached_geometry, current_solver = _current_solver(vertices, geometry_key)
+        current_geometry = copy(cached_geometry)
+
+        # Basis fields of this geometry, only solved and evaluated once,
+        # every other angle is a weighted sum of them
+        fields = _level_fields(current_geometry.vertex, current_solver, plot_mode,
+                               resolution, level)
+
         # Compute aerodynamic properties
         current_geometry.set_angle_deg(-numeric_angle)
-        vortex_strengths = current_solver.solve(-current_geometry.angle)
+        vortex_strengths = fields.gammas(-current_geometry.angle)
         airfoil_points = current_geometry.get_rotated_vertex()
         cp_values = 1 - np.square(vortex_strengths)
         
         # Calculate coefficients and flow data
         cl, cd, cm = compute_coefficients(current_geometry, vortex_strengths)
-        x_grid, y_grid, flow_data = compute_flow(
-            plot_mode, vortex_strengths, airfoil_points, resolution
-        )
         
         # Generate visualization figures
-        flow_figure = _create_flow_plot(x_grid, y_grid, flow_data, 
-                                    plot_mode, numeric_angle, airfoil_points)
-        cp_figure = _create_cp_plot(airfoil_points, cp_values, numeric_angle)
+        flow_figure = _flow_figure(fields, plot_mode, -current_geometry.angle, numeric_angle,
+                                   airfoil_points)
+        with span('figures'):
+            cp_figure = record_payload('cp', _create_cp_plot(airfoil_points, cp_values, numeric_angle))
         
         return (
             flow_figure,
@@ -262,44 +350,141 @@ def register_callbacks(app, default_geometry, default_solver):
             {'x_pos': airfoil_points[1:-1, 0].tolist(),
             'Cp': cp_values[1:-1].tolist()}
         )
+
+    @app.callback(
+        [Output('flow-graph', 'figure'),
+        Output('cp-graph', 'figure'),
+        Output('cl-value', 'children'),
+        Output('cd-value', 'children'),
+        Output('cm-value', 'children'),
+        Output('current-cp-data', 'data'),
+        Output('flow-refinement', 'data')],
+        [Input('angle-input', 'value'),
+        Input('plot-type', 'value'),
+        Input('geometry-vertex', 'data'),
+        Input('resolution-input', 'value')],
+        [State('geometry-key', 'data'),
+        State('session-id', 'data')]
+    )
+    @timed('update_flow_visualization')
+    def update_flow_visualization(angle, plot_mode, vertices, 
+                                resolution, geometry_key, session_id=None):
+        """Main visualization update for flow fields and coefficients."""
+        numeric_angle, resolution = _flow_inputs(angle, resolution)
+
+        # A new frame starts from the coarsest level, refined by
+        # refine_flow_visualization, unless the full resolution basis
+        # fields are already evaluated
+        geometry_id = _geometry_id(vertices, geometry_key)
+        vertex = _current_solver(vertices, geometry_key)[0].vertex
+        level = len(progressive_levels(resolution)) - 1
+        if not has_basis_fields(vertex, resolution, plot_mode, dtype=FIELD_DTYPE,
+                                max_precision_error=MAX_PRECISION_ERROR):
+            level = 0
+
+        # Slider drags run in the background: a newer angle of the same
+        # session cancels this frame and the pending refinements, identical
+        # requests share one
+        key = ('flow', geometry_id, numeric_angle, plot_mode, resolution, level)
+        session = None
+        if session_id:
+            session = (session_id, 'flow')
+            jobs.cancel((session_id, 'refine'))
+        try:
+            outputs = jobs.run(session, key, _flow_frame, numeric_angle, plot_mode, vertices,
+                               resolution, geometry_key, level)
+        except job_cancelled:
+            raise PreventUpdate
+        return outputs + (_refinement(geometry_id, numeric_angle, plot_mode, resolution, level),)
+
+    @timed('refine_flow_job')
+    def _refined_flow(refinement, vertices, geometry_key):
+        cached_geometry, current_solver = _current_solver(vertices, geometry_key)
+        current_geometry = copy(cached_geometry)
+        fields = _level_fields(current_geometry.vertex, current_solver, refinement['mode'],
+                               refinement['resolution'], refinement['level'])
+        current_geometry.set_angle_deg(-refinement['angle'])
+        return _flow_figure(fields, refinement['mode'], -current_geometry.angle,
+                            refinement['angle'], current_geometry.get_rotated_vertex())
+
+    @app.callback(
+        [Output('flow-graph', 'figure', allow_duplicate=True),
+        Output('flow-refinement', 'data', allow_duplicate=True)],
+        Input('flow-refinement', 'data'),
+        [State('geometry-vertex', 'data'),
+        State('geometry-key', 'data'),
+        State('angle-input', 'value'),
+        State('plot-type', 'value'),
+        State('resolution-input', 'value'),
+        State('session-id', 'data')],
+        prevent_initial_call=True
+    )
+    @timed('refine_flow_visualization')
+    def refine_flow_visualization(refinement, vertices, geometry_key, current_angle,
+                                  current_mode, current_resolution, session_id=None):
+        """Replace the flow plot by the next level of the progressive rendering."""
+        if not refinement:
+            raise PreventUpdate
+        # A refinement of an older frame, e.g. still in flight when the
+        # slider moved on, must not overwrite the current one
+        current_angle, current_resolution = _flow_inputs(current_angle, current_resolution)
+        geometry_id = _geometry_id(vertices, geometry_key)
+        if (refinement['geometry'] != geometry_id or refinement['angle'] != current_angle
+                or refinement['mode'] != current_mode
+                or refinement['resolution'] != current_resolution):
+            raise PreventUpdate
+
+        angle, plot_mode = refinement['angle'], refinement['mode']
+        resolution, level = refinement['resolution'], refinement['level']
+        key = ('refine', geometry_id, angle, plot_mode, resolution, level)
+        session = (session_id, 'refine') if session_id else None
+        try:
+            flow_figure = jobs.run(session, key, _refined_flow, refinement, vertices, geometry_key)
+        except job_cancelled:
+            raise PreventUpdate
+        return flow_figure, _refinement(geometry_id, angle, plot_mode, resolution, level)
     #endregion
 
-    def _create_flow_plot(x_grid, y_grid, data, mode, angle, airfoil):
+    def _streamline_traces(lines):
+        # One trace per streamfunction level, colored by its value, its
+        # polylines separated by NaN
+        traces = []
+        for level, polylines in lines.items():
+            if not polylines:
+                continue
+            gap = np.full((1, 2), np.nan)
+            points = np.concatenate([part for line in polylines for part in (line, gap)][:-1])
+            color = plotly.colors.sample_colorscale('RdBu', (level + 1) / 2)[0]
+            traces.append(go.Scatter(
+                x=typed(points[:, 0]),
+                y=typed(points[:, 1]),
+                mode='lines',
+                line=dict(color=color, width=1.5),
+                name=f"ψ = {level:g}",
+                showlegend=False
+            ))
+        return traces
+
+    def _create_flow_plot(data, mode, angle, airfoil):
         """Create flow visualization plot (streamlines/velocities)."""
         # Create the appropriate trace type based on visualization mode
         if mode == 'streamlines':
-            flow_trace = go.Contour(
-                x=x_grid[0], 
-                y=y_grid[:,0], 
-                z=data,
-                zmin=-1, 
-                zmax=1, 
-                colorscale='RdBu',
-                contours=dict(showlines=True, showlabels=False),
-                colorbar=dict(title="Streamfunction", x=1.05)
-            )
+            # Polylines of every streamfunction level
+            flow_traces = _streamline_traces(data)
         else:  # velocities
-            flow_trace = go.Heatmap(
-                x=x_grid[0], 
-                y=y_grid[:,0], 
-                z=data,
-                zmin=0, 
-                zmax=2, 
-                colorscale='Viridis',
-                colorbar=dict(title="Velocity Magnitude", x=1.05)
-            )
+            flow_traces = [velocity_heatmap(*data)]
 
         # Airfoil overlay
         airfoil_trace = go.Scatter(
-            x=airfoil[:,0], 
-            y=airfoil[:,1],
+            x=typed(airfoil[:,0]), 
+            y=typed(airfoil[:,1]),
             mode='lines', 
             line=dict(color='black', width=2),
             fill='toself', 
             fillcolor='rgba(0,0,0,0.2)'
         )
 
-        return go.Figure(data=[flow_trace, airfoil_trace]).update_layout(
+        return go.Figure(data=flow_traces + [airfoil_trace]).update_layout(
             title=f"{mode.capitalize()} at {angle:.3f}°",
             xaxis_title="x-axis", 
             yaxis_title="y-axis",
@@ -313,7 +498,7 @@ def register_callbacks(app, default_geometry, default_solver):
         """Create pressure coefficient distribution plot."""
         return go.Figure(
             data=[go.Scatter(
-                x=airfoil[1:-1,0], y=cp_values[1:-1],
+                x=typed(airfoil[1:-1,0]), y=typed(cp_values[1:-1]),
                 mode='lines+markers',
                 line=dict(color='blue', width=2),
                 marker=dict(size=8, color='red')
@@ -336,6 +521,7 @@ def register_callbacks(app, default_geometry, default_solver):
          State('angle-input', 'value')],
         prevent_initial_call=True
     )
+    @timed('export_aerodynamic_data')
     def export_aerodynamic_data(click_count, cp_data, aero_data, current_angle):
         """Export current and precomputed data to CSV."""
         if not click_count:
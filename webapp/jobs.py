@@ -0,0 +1,110 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads running the flow and polar computations of every session
+DEFAULT_JOB_WORKERS = 2
+
+# The job running on the current worker thread, for checkpoint
+_current = threading.local()
+
+class job_cancelled(Exception):
+    """Raised in a job, and to its callers, once a newer request superseded it."""
+
+def checkpoint():
+    """Raise job_cancelled if the job running on this thread was superseded."""
+    job = getattr(_current, 'job', None)
+    if job is not None and job.cancelled.is_set():
+        raise job_cancelled(job.key)
+
+class _job:
+    def __init__(self, key):
+        self.key = key
+        self.cancelled = threading.Event()
+        # Callers still waiting for the result, with or without a session
+        self.waiters = 0
+        self.future = None
+
+class job_queue:
+    """
+    Local queue of background computations, shared by the callbacks.
+
+    run(session, key, function, *args) computes function(*args) on the
+    pool and waits for it. Requests with the key of a job that is still in
+    flight share its result instead of computing it again. A new request
+    of a session supersedes its previous one: the previous job is cancelled
+    when no other caller waits for it, at its next checkpoint() or before
+    it starts, and its callers get job_cancelled instead of a stale result.
+    Sessions are any hashable, e.g. (session id, callback name), and None
+    for requests that are never superseded.
+    """
+    def __init__(self, workers=DEFAULT_JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._latest = {}
+        self.submitted = self.coalesced = self.cancelled = 0
+
+    def _execute(self, job, function, args):
+        _current.job = job
+        try:
+            checkpoint()
+            return function(*args)
+        finally:
+            _current.job = None
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _release(self, job):
+        # A superseded caller no longer waits for job, cancel it if nobody does
+        job.waiters -= 1
+        if not job.waiters and not job.cancelled.is_set():
+            job.cancelled.set()
+            self.cancelled += 1
+
+    def cancel(self, session):
+        """Supersede the request of session in flight, if any, without a new one."""
+        with self._lock:
+            previous = self._latest.pop(session, None)
+            if previous is not None:
+                self._release(previous[1])
+
+    def run(self, session, key, function, *args):
+        with self._lock:
+            job = self._in_flight.get(key)
+            if job is not None and not job.cancelled.is_set():
+                self.coalesced += 1
+            else:
+                job = self._in_flight[key] = _job(key)
+                job.future = self._pool.submit(self._execute, job, function, args)
+                self.submitted += 1
+
+            # The latest request of every session, with the job it waits for
+            token = object()
+            job.waiters += 1
+            if session is not None:
+                previous = self._latest.get(session)
+                self._latest[session] = (token, job)
+                if previous is not None:
+                    self._release(previous[1])
+
+        try:
+            result = job.future.result()
+        finally:
+            with self._lock:
+                latest = self._latest.get(session)
+                superseded = session is not None and (latest is None or latest[0] is not token)
+                if not superseded:
+                    # Superseded callers were released by their successor
+                    job.waiters -= 1
+                    if session is not None:
+                        del self._latest[session]
+        if superseded:
+            # Finished, but a newer request of the session is on its way
+            raise job_cancelled(key)
+        return result
+
+    @property
+    def stats(self):
+        return {'submitted': self.submitted, 'coalesced': self.coalesced,
+                'cancelled': self.cancelled, 'in_flight': len(self._in_flight)}
@@ -1,4 +1,5 @@
 from dash import dcc, html
+from .utils import MAX_RESOLUTION
 
 def app_layout(app, cl_figure, cd_figure, cm_figure):
     # Reusable style components
@@ -39,10 +40,12 @@ def app_layout(app, cl_figure, cd_figure, cm_figure):
         
         # Data stores
         dcc.Store(id='geometry-vertex', storage_type='session'),
-        dcc.Store(id='solver-rhs', storage_type='session'),
+        dcc.Store(id='geometry-key', storage_type='session'),
+        dcc.Store(id='session-id', storage_type='session'),
         dcc.Store(id='geometry-store'),
         dcc.Store(id='precomputed-aero-data'),
         dcc.Store(id='current-cp-data'),
+        dcc.Store(id='flow-refinement'),
         
         # File upload section
         dcc.Upload(
@@ -71,6 +74,7 @@ def app_layout(app, cl_figure, cd_figure, cm_figure):
                     type='number',
                     value=200,
                     min=10,
+                    max=MAX_RESOLUTION,
                     step=1,
                     style={'width': '100px', 'marginRight': '20px'}
                 ),
@@ -0,0 +1,36 @@
+from flask import abort, jsonify, request
+from src import profiling
+
+PROFILING_ROUTE = '/_profiling'
+
+# Only the machine running the server may read or change the profiling
+_LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+def register_profiling_route(server, cache=None, jobs=None, route=PROFILING_ROUTE):
+    """
+    Expose the span histograms of src.profiling on the Flask server.
+
+    GET returns whether profiling is enabled and the histogram of every
+    span path and recorded quantity (e.g. payload_bytes/flow) as JSON,
+    with the stats of the solver_cache cache and of the job_queue jobs
+    when given. POST takes a JSON body {"enabled": bool, "reset": bool}
+    to toggle the spans and clear the histograms. Requests that do not
+    come from the local machine are refused.
+    """
+    def profiling_endpoint():
+        if request.remote_addr not in _LOCAL_ADDRESSES:
+            abort(403)
+        if request.method == 'POST':
+            options = request.get_json(silent=True) or {}
+            if 'enabled' in options:
+                profiling.enable() if options['enabled'] else profiling.disable()
+            if options.get('reset'):
+                profiling.reset()
+        response = {'enabled': profiling.is_enabled(), 'spans': profiling.stats()}
+        if cache is not None:
+            response['solver_cache'] = cache.stats
+        if jobs is not None:
+            response['jobs'] = jobs.stats
+        return jsonify(response)
+
+    server.add_url_rule(route, 'profiling', profiling_endpoint, methods=['GET', 'POST'])
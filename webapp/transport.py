@@ -0,0 +1,61 @@
+import numpy as np
+import plotly.colors
+import plotly.io
+from src import profiling
+
+# Colour of the NaN sentinel code, the plot background shows through
+TRANSPARENT = 'rgba(0,0,0,0)'
+
+class quantizer:
+    """
+    Linear map of [vmin, vmax] onto the codes of an unsigned integer dtype,
+    sent to the browser as a compact typed array (plotly encodes numpy
+    arrays in base64). Values are clipped to the range and NaN takes the
+    largest code, which colorscale makes transparent. The colour of a code
+    is that of its value, the colorbar is labelled in values.
+    """
+    def __init__(self, vmin, vmax, dtype=np.uint16):
+        self.vmin, self.vmax = vmin, vmax
+        self.dtype = np.dtype(dtype)
+        self.nan_code = np.iinfo(self.dtype).max
+        self.scale = (self.nan_code - 1) / (vmax - vmin)
+
+    def code(self, value):
+        # Fractional code of a value, for contour levels and ticks
+        return (value - self.vmin) * self.scale
+
+    def encode(self, values, fill=None):
+        """Codes of values, NaN take the code of fill if given."""
+        values = np.asarray(values)
+        nan = np.isnan(values)
+        codes = np.rint(self.code(np.clip(values, self.vmin, self.vmax)))
+        codes[nan] = self.nan_code if fill is None else np.rint(self.code(fill))
+        return codes.astype(self.dtype)
+
+    def colorscale(self, name):
+        """Colorscale over the codes, transparent for the NaN code."""
+        top = (self.nan_code - 1) / self.nan_code
+        return ([[fraction * top, colour] for fraction, colour in plotly.colors.get_colorscale(name)]
+                + [[1, TRANSPARENT]])
+
+    def trace_options(self, name, title, nb_ticks=5):
+        """Color range, colorscale and colorbar of a trace plotting codes."""
+        ticks = np.linspace(self.vmin, self.vmax, nb_ticks)
+        return dict(zmin=0, zmax=self.nan_code, colorscale=self.colorscale(name),
+                    colorbar=dict(title=title, x=1.05, tickvals=self.code(ticks),
+                                  ticktext=[f'{tick:g}' for tick in ticks]))
+
+def grid_options(x_points, y_points):
+    """Regular grid coordinates as origin and step instead of two arrays."""
+    return dict(x0=float(x_points[0]), dx=float(x_points[1] - x_points[0]),
+                y0=float(y_points[0]), dy=float(y_points[1] - y_points[0]))
+
+def typed(values, dtype=np.float32):
+    """Values as a typed array of dtype, float32 halves the float64 payload."""
+    return np.ascontiguousarray(values, dtype=dtype)
+
+def record_payload(name, figure):
+    """Record the serialized size of a figure when profiling is enabled."""
+    if profiling.is_enabled():
+        profiling.record(f'payload_bytes/{name}', len(plotly.io.to_json(figure, validate=False)))
+    return figure
@@ -1,8 +1,59 @@
+import threading
+from collections import OrderedDict
+
 import numpy as np
-from src.flows import freestream, linear_vortex
-from src import compute_streamlines, compute_velocities
+from scipy.ndimage import map_coordinates, binary_erosion, binary_dilation
+from src.flows import freestream, panel_set
+from src import (compute_fields, compute_adaptive_fields, create_mask_poly, extract_contours,
+                 trace_streamlines, simplify_polyline)
+from .cache import vertex_key, _nbytes
+from .jobs import checkpoint
+from src.profiling import timed
+
+# Plot window, in normalized airfoil coordinates
+X_RANGE = (-0.5, 1.5)
+Y_RANGE = (-1.0, 1.0)
+
+# Largest plot resolution, the basis fields of a geometry grow with its
+# square
+MAX_RESOLUTION = 600
+
+# Memory allowed for the cached basis fields, every progressive level of
+# a plot resolution is an entry of its own
+BASIS_CACHE_MEMORY = 256 * 2**20
+
+# Number of (geometry, angle, resolution) streamline sets kept in memory
+STREAMLINE_CACHE_SIZE = 64
+# Largest distance of the streamline polylines to the extracted ones, a
+# fraction of a pixel of the plot
+STREAMLINE_TOLERANCE = 1e-3
+_streamline_cache = OrderedDict()
+_streamline_lock = threading.Lock()
+
+# Body grid rows of the basis fields evaluated between two checkpoints of
+# their job
+BASIS_BAND_ROWS = 64
+
+# Coarsest plot resolution of the progressive flow rendering
+PROGRESSIVE_MIN_RESOLUTION = 50
+_basis_cache = OrderedDict()
+_basis_lock = threading.Lock()
 
-def compute_flow(visualization_mode, vortex_strengths, airfoil_points, resolution=200):
+def _create_grid(resolution):
+    x_points = np.linspace(*X_RANGE, resolution)
+    y_points = np.linspace(*Y_RANGE, resolution)
+    return np.meshgrid(x_points, y_points)
+
+def _closed_panels(vortex_strengths, airfoil_points):
+    # One linear vortex per segment, the last one closing the contour
+    vortex_strengths = np.asarray(vortex_strengths)
+    airfoil_points = np.asarray(airfoil_points)
+    return [panel_set(airfoil_points, np.roll(airfoil_points, -1, axis=0),
+                      vortex_strengths, np.roll(vortex_strengths, -1))]
+
+def compute_flow(visualization_mode, vortex_strengths, airfoil_points, resolution=200,
+                 tolerance=None, workers=None, skip_interior=True, adaptive_threshold=None,
+                 dtype=np.float64, max_precision_error=None):
     """
     Compute flow field data for visualization.
     
@@ -11,35 +62,334 @@ def compute_flow(visualization_mode, vortex_strengths, airfoil_points, resolutio
         vortex_strengths: Array of vortex strengths along airfoil
         airfoil_points: Coordinates defining the airfoil geometry
         resolution: Grid resolution for flow computation (default: 200)
+        tolerance: Relative accuracy of the tree code, None for direct sums
+        workers: Number of threads evaluating the grid tiles, None for serial
+        skip_interior: Do not evaluate the points inside the airfoil
+        adaptive_threshold: Sample the grid by an adaptive quadtree with this
+            interpolation error threshold, None to evaluate every point
+        dtype: Precision of the panel kernels, float32 is about 1.3x to 1.5x as fast
+        max_precision_error: Relative error of dtype, estimated on a sample,
+            above which the field is evaluated in float64 instead
     
     Returns:
-        Tuple of (x_grid, y_grid, flow_data) for plotting
+        Tuple of (x_grid, y_grid, flow_data) for plotting, flow_data is
+        a masked array when skip_interior is set
     """
-    # Initialize flow components with freestream
-    flow_components = [freestream(u_inf=1)]
-    
-    # Add linear vortex components for each airfoil segment
-    num_segments = len(vortex_strengths)
-    for i in range(num_segments):
-        start_point = airfoil_points[i]
-        end_point = airfoil_points[(i + 1) % num_segments]
-        current_strength = vortex_strengths[i]
-        next_strength = vortex_strengths[(i + 1) % num_segments]
-        
-        flow_components.append(
-            linear_vortex(current_strength, next_strength, start_point, end_point)
-        )
+    # Freestream plus the linear vortex panels of the airfoil
+    flow_components = [freestream(u_inf=1)] + _closed_panels(vortex_strengths, airfoil_points)
 
     # Create computation grid
-    x_points = np.linspace(-0.5, 1.5, resolution)  # Normalized airfoil coordinates
-    y_points = np.linspace(-1.0, 1.0, resolution)
-    x_grid, y_grid = np.meshgrid(x_points, y_points)
+    x_grid, y_grid = _create_grid(resolution)
+    mask = create_mask_poly(np.asarray(airfoil_points), x_grid, y_grid) if skip_interior else None
+
+    # Compute requested flow visualization, the velocity magnitude or
+    # the streamfunction
+    quantity = 'psi' if visualization_mode == 'streamlines' else 'speed'
+    options = dict(tolerance=tolerance, workers=workers, mask=mask, dtype=dtype,
+                   max_precision_error=max_precision_error)
+    if adaptive_threshold is not None:
+        fields, _ = compute_adaptive_fields(flow_components, x_grid[0], y_grid[:, 0], (quantity,),
+                                            threshold=adaptive_threshold, body=airfoil_points,
+                                            **options)
+    else:
+        fields = compute_fields(flow_components, x_grid, y_grid, (quantity,), **options)
+
+    return x_grid, y_grid, fields[quantity]
+
+def progressive_levels(resolution, min_resolution=PROGRESSIVE_MIN_RESOLUTION):
+    """
+    (plot resolution, body grid spacing) of the levels rendered up to
+    resolution, coarsest first. Each level halves the body grid spacing of
+    the previous one, so that its grid contains the previous points. The
+    last level has the spacing of its plot grid, given as None.
+    """
+    spacing = (X_RANGE[1] - X_RANGE[0]) / (resolution - 1)
+    levels = [(resolution, None)]
+    factor = 2
+    while (resolution - 1) / factor >= min_resolution - 1:
+        levels.append((int(np.ceil((resolution - 1) / factor)) + 1, spacing * factor))
+        factor *= 2
+    return levels[::-1]
+
+class basis_fields:
+    """
+    Flow fields of the two basis solutions of a geometry, for any angle.
+
+    The panel field is linear in gammas, and gammas are linear in
+    (cos(alpha), sin(alpha)), so the field at any angle is a weighted sum
+    of the fields of gamma_c and gamma_s. Both are evaluated once, in the
+    body frame, on a grid that covers the plot window at every angle.
+    Each angle then only costs that sum and a bilinear interpolation at
+    the plot points rotated into the body frame.
+
+    Body grid points deep inside the airfoil are never evaluated, and the
+    plot points inside it come back masked. The basis fields are evaluated
+    and stored in dtype, see compute_fields for max_precision_error.
+
+    The body grid spacing defaults to the plot grid spacing. When coarse
+    is the basis_fields of the same geometry on a grid of twice the
+    spacing (see progressive_levels), the points it already evaluated are
+    copied instead of evaluated again.
+    """
+    def __init__(self, vertex, gamma_c, gamma_s, resolution=200, tolerance=None,
+                 workers=None, dtype=np.float64, max_precision_error=None, spacing=None,
+                 coarse=None):
+        self.vertex = vertex
+        self.gamma_c, self.gamma_s = gamma_c, gamma_s
+        self.tolerance = tolerance
+        self.workers = workers
+        self.dtype = dtype
+        self.max_precision_error = max_precision_error
+        self.x_grid, self.y_grid = _create_grid(resolution)
+
+        # The airfoil rotates around (0.5, 0), the body grid is centered
+        # there with the spacing of the plot grid
+        radius = np.max(np.hypot(self.x_grid - .5, self.y_grid))
+        self.spacing = spacing or self.x_grid[0, 1] - self.x_grid[0, 0]
+        nb_points = int(np.ceil(2 * radius / self.spacing)) + 3
+        # An odd number of points puts one on the center, the grid of half
+        # the spacing then contains every point of this one
+        nb_points += 1 - nb_points % 2
+        self.origin = np.array((.5, 0)) - (nb_points - 1) / 2 * self.spacing
+        body_points = np.arange(nb_points) * self.spacing
+        self._body_grid = tuple(np.meshgrid(self.origin[0] + body_points,
+                                           self.origin[1] + body_points))
+
+        # Interior points more than two cells away from the contour are
+        # never needed by the interpolation of exterior points
+        self._inside = create_mask_poly(vertex, *self._body_grid)
+        self._body_mask = binary_erosion(self._inside, structure=np.ones((3, 3)), iterations=2)
+        # Plot points interpolate the inside mask, only the ones in a cell
+        # crossed by the contour need an exact point in polygon test
+        self._inside_fraction = self._inside.astype(np.float32)
+        self._contour_cells = self._crossed_cells(vertex).astype(np.float32)
+
+        # Computed on first use, one entry per visualization mode, once
+        # even when callbacks ask for it concurrently
+        self._fields = {}
+        self._lock = threading.Lock()
+        self._coarse = coarse
+
+    def _crossed_cells(self, vertex):
+        # Body grid points at the corners of the cells the contour crosses,
+        # and their neighbours, from samples every half cell along it
+        start, end = vertex, np.roll(vertex, -1, axis=0)
+        steps = np.ceil(2 * np.hypot(*(end - start).T) / self.spacing).astype(int) + 1
+        points = np.concatenate([np.linspace(a, b, n) for a, b, n in zip(start, end, steps)])
+        columns, rows = np.floor((points - self.origin) / self.spacing).astype(int).T
+        crossed = np.zeros(self._inside.shape, dtype=bool)
+        size = len(crossed)
+        for row_offset in (0, 1):
+            for column_offset in (0, 1):
+                crossed[np.clip(rows + row_offset, 0, size - 1),
+                        np.clip(columns + column_offset, 0, size - 1)] = True
+        return binary_dilation(crossed)
+
+    def _coarse_samples(self, visualization_mode):
+        # Indices in this body grid and in the coarse one of the points the
+        # coarse level evaluated, None when the grids are not nested
+        coarse = self._coarse
+        if coarse is None or visualization_mode not in coarse._fields:
+            return None
+        step = coarse.spacing / self.spacing
+        offset = (coarse.origin - self.origin) / self.spacing
+        if not (np.isclose(step, round(step)) and np.allclose(offset, np.round(offset))):
+            return None
+
+        def nested(offset):
+            indices = int(round(offset)) + round(step) * np.arange(len(coarse._body_mask))
+            inside = (indices >= 0) & (indices < len(self._body_mask))
+            return indices[inside], np.flatnonzero(inside)
+
+        (rows, coarse_rows), (columns, coarse_columns) = nested(offset[1]), nested(offset[0])
+        evaluated = ~coarse._body_mask[np.ix_(coarse_rows, coarse_columns)]
+        return np.ix_(rows, columns), np.ix_(coarse_rows, coarse_columns), evaluated
+
+    def _basis(self, visualization_mode):
+        with self._lock:
+            if visualization_mode not in self._fields:
+                self._fields[visualization_mode] = self._compute(visualization_mode)
+                # Its samples are copied, the coarse level and the ones it
+                # refers to can be dropped from the cache
+                self._coarse = None
+            return self._fields[visualization_mode]
+
+    @timed('basis_fields')
+    def _compute(self, visualization_mode):
+        x_body, y_body = self._body_grid
+        quantities = ('psi',) if visualization_mode == 'streamlines' else ('u', 'v')
+
+        # Points of the coarse level are skipped, then copied
+        mask = self._body_mask
+        samples = self._coarse_samples(visualization_mode)
+        if samples is not None:
+            indices, coarse_indices, evaluated = samples
+            mask = mask.copy()
+            mask[indices] |= evaluated
+
+        fields = []
+        for index, gammas in enumerate((self.gamma_c, self.gamma_s)):
+            flows = _closed_panels(gammas, self.vertex)
+            # In bands of rows, a superseded job stops at the next one
+            bands = []
+            for start in range(0, len(x_body), BASIS_BAND_ROWS):
+                checkpoint()
+                rows = slice(start, start + BASIS_BAND_ROWS)
+                basis = compute_fields(flows, x_body[rows], y_body[rows], quantities,
+                                       tolerance=self.tolerance, workers=self.workers,
+                                       mask=mask[rows], dtype=self.dtype,
+                                       max_precision_error=self.max_precision_error)
+                bands.append(np.stack([basis[name].filled(0) for name in quantities]))
+            field = np.concatenate(bands, axis=1)
+            if samples is not None:
+                coarse = self._coarse._fields[visualization_mode][index]
+                coarse = coarse.reshape((len(quantities),) + coarse.shape[-2:])
+                for component, coarse_component in zip(field, coarse):
+                    component[indices] = np.where(evaluated, coarse_component[coarse_indices],
+                                                  component[indices])
+            fields.append(field[0] if visualization_mode == 'streamlines' else field)
+        return fields
+
+    @property
+    def nbytes(self):
+        """Memory held by the grids and the fields evaluated so far."""
+        # Not under the lock, which is held while a mode is evaluated
+        fields = [field for mode_fields in tuple(self._fields.values()) for field in mode_fields]
+        return _nbytes(self) + sum(field.nbytes for field in fields)
+
+    def gammas(self, alpha):
+        return np.cos(alpha) * self.gamma_c + np.sin(alpha) * self.gamma_s
+
+    def evaluate(self, visualization_mode, alpha):
+        """
+        Same output as compute_flow for the airfoil rotated by -alpha
+        in a unit freestream.
+        """
+        cos_a, sin_a = np.cos(alpha), np.sin(alpha)
+        field_c, field_s = self._basis(visualization_mode)
+
+        # Plot points in the body frame, as fractional body grid indices
+        dx, dy = self.x_grid - .5, self.y_grid
+        x_body = cos_a * dx - sin_a * dy + .5
+        y_body = sin_a * dx + cos_a * dy
+        columns = (x_body - self.origin[0]) / self.spacing
+        rows = (y_body - self.origin[1]) / self.spacing
+
+        def interpolate(field):
+            return map_coordinates(field, (rows, columns), order=1, mode='nearest')
+
+        panels = cos_a * field_c + sin_a * field_s
+        if visualization_mode == 'streamlines':
+            # The streamfunction does not depend on the frame orientation
+            flow_data = self.y_grid + interpolate(panels)
+        else:
+            # The freestream is (cos(alpha), sin(alpha)) in the body frame,
+            # and a rotation keeps the magnitude
+            flow_data = np.hypot(cos_a + interpolate(panels[0]), sin_a + interpolate(panels[1]))
+
+        # The inside mask of the body grid holds away from the contour
+        inside = interpolate(self._inside_fraction)
+        mask = inside > .5
+        crossed = interpolate(self._contour_cells) > 0
+        mask[crossed] = create_mask_poly(self.vertex, x_body[crossed], y_body[crossed])
+        if visualization_mode != 'streamlines':
+            # The velocity jumps across the vortex sheet, unlike the
+            # streamfunction, so exterior points next to the surface would
+            # mix in the interior samples: they are evaluated directly
+            near = ~mask & (inside > 0)
+            flows = _closed_panels(self.gammas(alpha), self.vertex)
+            direct = compute_fields(flows, x_body[near], y_body[near], ('u', 'v'))
+            flow_data[near] = np.hypot(cos_a + direct['u'], sin_a + direct['v'])
+        return self.x_grid, self.y_grid, np.ma.masked_array(flow_data, mask=mask)
+
+def _basis_key(vertex, resolution, tolerance, dtype, max_precision_error, spacing):
+    return (vertex_key(vertex), resolution, tolerance, np.dtype(dtype).name, max_precision_error,
+            spacing)
+
+def has_basis_fields(vertex, resolution, visualization_mode, tolerance=None,
+                     dtype=np.float64, max_precision_error=None, spacing=None):
+    """Whether the cached basis_fields already evaluated visualization_mode."""
+    key = _basis_key(vertex, resolution, tolerance, dtype, max_precision_error, spacing)
+    with _basis_lock:
+        fields = _basis_cache.get(key)
+    return fields is not None and visualization_mode in fields._fields
+
+@timed('get_basis_fields')
+def get_basis_fields(vertex, resolution, create_solver, tolerance=None, workers=None,
+                     dtype=np.float64, max_precision_error=None, spacing=None, coarse=None):
+    """
+    Cached basis_fields of a geometry, the least recently used entries are
+    dropped once the cached fields exceed BASIS_CACHE_MEMORY bytes, the most
+    recent entry is always kept. create_solver is only called on a miss,
+    coarse is only used by a new entry.
+    """
+    key = _basis_key(vertex, resolution, tolerance, dtype, max_precision_error, spacing)
+    with _basis_lock:
+        if key in _basis_cache:
+            _basis_cache.move_to_end(key)
+            # Fields are evaluated after their entry is cached, the memory
+            # is measured again on every access
+            _evict_basis_fields()
+            return _basis_cache[key]
+
+    gamma_c, gamma_s = create_solver().solve_basis()
+    fields = basis_fields(vertex, gamma_c, gamma_s, resolution, tolerance, workers, dtype,
+                          max_precision_error, spacing, coarse)
+    with _basis_lock:
+        # A concurrent miss may have cached its own, every caller shares
+        # that one so that its fields are evaluated once
+        fields = _basis_cache.setdefault(key, fields)
+        _basis_cache.move_to_end(key)
+        _evict_basis_fields()
+    return fields
+
+def _evict_basis_fields():
+    # Called with _basis_lock held
+    memory = sum(fields.nbytes for fields in _basis_cache.values())
+    while memory > BASIS_CACHE_MEMORY and len(_basis_cache) > 1:
+        _, fields = _basis_cache.popitem(last=False)
+        memory -= fields.nbytes
+
+@timed('get_streamlines')
+def get_streamlines(fields, alpha, airfoil_points, levels, method='contours'):
+    """
+    Cached streamlines of basis_fields at alpha, as a dict of the (n, 2)
+    polylines of every streamfunction level, the least recently used
+    entries are dropped beyond STREAMLINE_CACHE_SIZE.
+
+    'contours' extracts the iso-lines of the interpolated streamfunction
+    grid. 'trace' integrates the streamlines of the flow around
+    airfoil_points, the airfoil rotated by -alpha, from the points of the
+    upstream edge where the streamfunction takes the levels, with a step
+    of one grid cell. Both are simplified within STREAMLINE_TOLERANCE.
+    """
+    key = (vertex_key(fields.vertex), fields.x_grid.shape, fields.spacing, float(alpha),
+           tuple(levels), method)
+    with _streamline_lock:
+        if key in _streamline_cache:
+            _streamline_cache.move_to_end(key)
+            return _streamline_cache[key]
 
-    # Compute requested flow visualization
-    if visualization_mode == 'streamlines':
-        flow_data = compute_streamlines(flow_components, x_grid, y_grid)
+    x_grid, y_grid, psi = fields.evaluate('streamlines', alpha)
+    psi = psi.filled(np.nan)
+    if method == 'contours':
+        lines = extract_contours(x_grid[0], y_grid[:, 0], psi, levels, STREAMLINE_TOLERANCE)
+    elif method == 'trace':
+        flows = [freestream(u_inf=1)] + _closed_panels(fields.gammas(alpha), airfoil_points)
+        seeds = np.column_stack((np.full(len(levels), X_RANGE[0]),
+                                 np.interp(levels, psi[:, 0], y_grid[:, 0])))
+        step = x_grid[0, 1] - x_grid[0, 0]
+        nb_steps = int(4 * (X_RANGE[1] - X_RANGE[0]) / step)
+        traced = trace_streamlines(flows, seeds, step, nb_steps, bounds=(X_RANGE, Y_RANGE),
+                                   body=airfoil_points)
+        lines = {level: [simplify_polyline(line, STREAMLINE_TOLERANCE)]
+                 for level, line in zip(levels, traced)}
     else:
-        velocity_x, velocity_y = compute_velocities(flow_components, x_grid, y_grid)
-        flow_data = np.sqrt(velocity_x**2 + velocity_y**2)  # Velocity magnitude
+        raise ValueError(f"method must be 'contours' or 'trace', not {method!r}")
 
-    return x_grid, y_grid, flow_data
+    with _streamline_lock:
+        _streamline_cache[key] = lines
+        _streamline_cache.move_to_end(key)
+        if len(_streamline_cache) > STREAMLINE_CACHE_SIZE:
+            _streamline_cache.popitem(last=False)
+    return lines